@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Teste de carga da API local (scripts/api_server.py)
+
+Abre N conexões keep-alive (asyncio, só biblioteca padrão) e dispara as
+requisições de uma mistura de rotas, medindo a latência de cada uma.
+Informa requisições/s, p50/p90/p99 por rota e no total, erros e bytes
+recebidos. Sem --url, sobe a API em uma thread sobre --store.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+def log_message(message):
+    """Log com timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}")
+    sys.stdout.flush()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def default_targets(periods, ufs):
+    """Mistura de rotas: agregados (repetidos, saem do cache), páginas e fatias"""
+    targets = ['/saude', '/periodos', '/agregados?por=uf', '/agregados?por=mes,incentivo']
+    for uf in ufs:
+        targets.append(f"/agregados?por=municipio&uf={uf}")
+    for period in periods:
+        targets.append(f"/agregados?por=uf,incentivo&mes={period}")
+    for page in range(1, 6):
+        targets.append(f"/linhas?tamanho=100&pagina={page}")
+        targets.append(f"/linhas?tamanho=100&pagina={page}&uf={ufs[0]}&formato=jsonl")
+    return targets
+
+
+async def read_response(reader):
+    """(status, corpo) de uma resposta HTTP/1.1 (Content-Length ou chunked)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("conexão encerrada pelo servidor")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        parts = []
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            if size == 0:
+                await reader.readline()
+                break
+            parts.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b''.join(parts)
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, body, headers
+
+
+async def worker(host, port, targets, deadline, results):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for target in targets:
+            if time.perf_counter() > deadline:
+                break
+            started = time.perf_counter()
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+            status, body, headers = await read_response(reader)
+            results.append((target.split('?')[0], time.perf_counter() - started, status,
+                            len(body), headers.get('x-cache')))
+    finally:
+        writer.close()
+
+
+async def run_load(base_url, targets, connections, requests, duration):
+    parts = urlsplit(base_url)
+    deadline = time.perf_counter() + duration if duration else float('inf')
+    cycle = itertools.cycle([quote(t, safe='/?=&,*') for t in targets])
+    plans = [[next(cycle) for _ in range(requests // connections + (i < requests % connections))]
+             for i in range(connections)]
+    results = []
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(parts.hostname, parts.port, plan, deadline, results)
+                           for plan in plans))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    def stats(rows):
+        latencies = [r[1] * 1000 for r in rows]
+        return {
+            'requisicoes': len(rows),
+            'erros': sum(1 for r in rows if r[2] >= 400),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p90_ms': round(percentile(latencies, 0.90), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'cache_hits': sum(1 for r in rows if r[4] == 'HIT'),
+        }
+
+    summary = stats(results)
+    summary['segundos'] = round(elapsed, 3)
+    summary['req_por_s'] = round(len(results) / elapsed, 1) if elapsed else None
+    summary['mb_recebidos'] = round(sum(r[3] for r in results) / 1024 / 1024, 2)
+    summary['rotas'] = {route: stats([r for r in results if r[0] == route])
+                        for route in sorted({r[0] for r in results})}
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default=None, help='URL base de uma API já em execução')
+    parser.add_argument('--store', default=None,
+                        help='armazenamento particionado (sobe a API em uma thread)')
+    parser.add_argument('--conexoes', type=int, default=16)
+    parser.add_argument('--requisicoes', type=int, default=2000)
+    parser.add_argument('--duracao', type=float, default=0, help='limite em segundos (0 = sem)')
+    parser.add_argument('--rotas', default=None,
+                        help='arquivo com um alvo por linha (padrão: mistura gerada)')
+    parser.add_argument('--saida', default=None, help='arquivo JSON de resultados')
+    args = parser.parse_args(argv)
+
+    import partition_store
+    server = None
+    store_root = args.store or partition_store.default_root()
+    base_url = args.url
+    if base_url is None:
+        import api_server
+        server = api_server.ApiServer(api_server.Store(store_root))
+        base_url = server.start_background()
+        log_message(f"API local em {base_url} ({store_root})")
+
+    if args.rotas:
+        with open(args.rotas, 'r', encoding='utf-8') as f:
+            targets = [line.strip() for line in f if line.strip()]
+    else:
+        periods = partition_store.list_periods(store_root) or ['202401']
+        targets = default_targets(periods, ['SP', 'MG', 'BA'])
+
+    log_message(f"{args.requisicoes:,} requisições em {args.conexoes} conexões, "
+                f"{len(targets)} alvos distintos")
+    results, elapsed = asyncio.run(run_load(base_url, targets, args.conexoes,
+                                            args.requisicoes, args.duracao))
+    summary = summarize(results, elapsed)
+    if server is not None:
+        server.shutdown()
+
+    log_message(f"Total: {summary['requisicoes']:,} em {summary['segundos']}s, "
+                f"{summary['req_por_s']} req/s, p50 {summary['p50_ms']} ms, "
+                f"p99 {summary['p99_ms']} ms, {summary['erros']} erro(s), "
+                f"{summary['cache_hits']} acerto(s) de cache, {summary['mb_recebidos']} MB")
+    for route, stats in summary['rotas'].items():
+        log_message(f"  {route}: {stats['requisicoes']:,} req, p50 {stats['p50_ms']} ms, "
+                    f"p90 {stats['p90_ms']} ms, p99 {stats['p99_ms']} ms, {stats['erros']} erro(s)")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        log_message(f"Resultados: {args.saida}")
+    return summary['erros'] == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Gerador de dados sintéticos no formato dos arquivos mensais do Portal
+
+Produz um ZIP por mês (AAAAMM.zip) contendo um CSV latin-1, separado por ';',
+com as 17 colunas publicadas pelo Portal da Transparência. A escala é
+configurável (de 100 mil a dezenas de milhões de linhas) e a geração é
+determinística para uma mesma semente.
+"""
+
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+HEADER = [
+    'MÊS FOLHA', 'MÊS REFERÊNCIA', 'UF', 'CÓDIGO MUNICÍPIO SIAFI', 'NOME MUNICÍPIO',
+    'NIS BENEFICIÁRIO', 'CPF BENEFICIÁRIO', 'NOME BENEFICIÁRIO',
+    'NIS RESPONSÁVEL', 'CPF RESPONSÁVEL', 'NOME RESPONSÁVEL',
+    'CÓDIGO ETAPA ENSINO', 'ETAPA ENSINO', 'CÓDIGO TIPO INCENTIVO', 'TIPO INCENTIVO',
+    'DATA DO PAGAMENTO', 'VALOR PARCELA',
+]
+
+# UF e peso aproximado no número de beneficiários
+UFS = {
+    'SP': 14.0, 'MG': 9.0, 'BA': 8.5, 'RJ': 6.5, 'PE': 5.5, 'CE': 5.5, 'PA': 5.5,
+    'MA': 4.5, 'PR': 4.0, 'RS': 3.5, 'GO': 3.0, 'AM': 3.0, 'PB': 2.5, 'PI': 2.2,
+    'AL': 2.0, 'RN': 2.0, 'SC': 2.0, 'MT': 1.7, 'SE': 1.3, 'ES': 1.5, 'MS': 1.2,
+    'TO': 0.9, 'RO': 0.9, 'AC': 0.6, 'AP': 0.6, 'RR': 0.4, 'DF': 1.0,
+}
+
+FIRST_NAMES = [
+    'ANA', 'MARIA', 'JOAO', 'JOSÉ', 'PEDRO', 'LUCAS', 'GABRIEL', 'JÚLIA', 'BEATRIZ',
+    'LETÍCIA', 'MATHEUS', 'RAFAEL', 'LARISSA', 'CAMILA', 'VITÓRIA', 'GUSTAVO',
+    'FELIPE', 'AMANDA', 'BRUNA', 'CAIO', 'DAVI', 'ÉRICA', 'FÁBIO', 'IGOR', 'ÍSIS',
+    'KAUÃ', 'LÍVIA', 'MIGUEL', 'NICOLAS', 'OTÁVIO', 'SÂMIA', 'THAÍS', 'YASMIN',
+    'ARTHUR', 'BERNARDO', 'HEITOR', 'ENZO', 'LORENZO', 'SAMUEL', 'GUILHERME',
+    'VINÍCIUS', 'JOÃO VITOR', 'EDUARDO', 'DANIEL', 'LEONARDO', 'HELENA', 'ALICE',
+    'LAURA', 'MANUELA', 'SOFIA', 'ISABELLA', 'LUÍSA', 'GIOVANNA', 'MARIANA',
+    'RAQUEL', 'ESTER', 'DÉBORA', 'ANDRÉIA', 'PATRÍCIA', 'CLÁUDIO', 'RENÊ',
+]
+LAST_NAMES = [
+    'SILVA', 'SANTOS', 'OLIVEIRA', 'SOUZA', 'RODRIGUES', 'FERREIRA', 'ALVES',
+    'PEREIRA', 'LIMA', 'GOMES', 'COSTA', 'RIBEIRO', 'MARTINS', 'CARVALHO',
+    'ARAÚJO', 'MELO', 'BARBOSA', 'CONCEIÇÃO', 'GONÇALVES', 'ASSUNÇÃO', 'DAMIÃO',
+    'ROCHA', 'DIAS', 'NASCIMENTO', 'ANDRADE', 'MOREIRA', 'NUNES', 'MARQUES',
+    'MACHADO', 'MENDES', 'FREITAS', 'CARDOSO', 'RAMOS', 'SANTANA', 'TEIXEIRA',
+    'CAVALCANTI', 'MONTEIRO', 'MOURA', 'CORREIA', 'PINTO', 'LOPES', 'VIEIRA',
+    'BEZERRA', 'FONSECA', 'BRAGA', 'FARIAS', 'MIRANDA', 'BATISTA', 'AZEVEDO',
+    'PAIXÃO', 'SIMÕES', 'MAGALHÃES', 'JESUS', 'LEÃO', 'BRANDÃO', 'GUIMARÃES',
+    'FALCÃO', 'ROMÃO', 'QUEIRÓS', 'PIMENTEL',
+]
+# Combinações distintas de _names(): primeiro nome x segundo nome (ou nenhum)
+# x dois sobrenomes (~13 milhões, acima dos ~4 milhões de alunos do programa)
+NAME_SPACE = len(FIRST_NAMES) * (len(FIRST_NAMES) + 1) * len(LAST_NAMES) ** 2
+ETAPAS = [('1', 'ENSINO MÉDIO REGULAR'), ('2', 'EDUCAÇÃO DE JOVENS E ADULTOS')]
+INCENTIVOS = [
+    ('1', 'INCENTIVO MATRÍCULA', '200,00', 0.15),
+    ('2', 'INCENTIVO FREQUÊNCIA', '200,00', 0.75),
+    ('3', 'INCENTIVO CONCLUSÃO', '1000,00', 0.07),
+    ('4', 'INCENTIVO ENEM', '200,00', 0.03),
+]
+
+
+def build_municipios(rng, per_uf=60):
+    """Tabela sintética de municípios: (uf, código SIAFI, nome)"""
+    municipios = []
+    code = 1000
+    for uf in UFS:
+        for i in range(per_uf):
+            name = f"{rng.choice(['SÃO', 'SANTA', 'NOVA', 'BOM JESUS DO', 'CONCEIÇÃO DO'])} " \
+                   f"{rng.choice(LAST_NAMES)} {uf}{i:02d}"
+            municipios.append((uf, f"{code:04d}", name))
+            code += 1
+    return municipios
+
+
+def _names(keys):
+    """
+    Nome determinístico por chave (o mesmo aluno tem o mesmo nome todo mês).
+
+    A chave é embaralhada por uma bijeção em [0, NAME_SPACE) e lida em base
+    mista (primeiro nome, segundo nome, dois sobrenomes): chaves distintas
+    abaixo de NAME_SPACE dão nomes distintos, então a cardinalidade de nomes
+    acompanha a de alunos (--linhas / --populacao).
+    """
+    # 2654435761 é primo e não divide NAME_SPACE
+    mixed = (keys.astype(np.uint64) * np.uint64(2654435761) + np.uint64(97)) % np.uint64(NAME_SPACE)
+    mixed = mixed.astype(np.int64)
+    first_names = np.array(FIRST_NAMES, dtype=object)
+    second_names = np.array([''] + [f"{n} " for n in FIRST_NAMES], dtype=object)
+    last_names = np.array(LAST_NAMES, dtype=object)
+
+    first = first_names[mixed % len(FIRST_NAMES)]
+    mixed //= len(FIRST_NAMES)
+    second = second_names[mixed % len(second_names)]
+    mixed //= len(second_names)
+    mid = last_names[mixed % len(LAST_NAMES)]
+    last = last_names[mixed // len(LAST_NAMES) % len(LAST_NAMES)]
+    return first + ' ' + second + mid + ' ' + last
+
+
+def _masked_cpf(ids):
+    middle = (ids * 7919) % 1000000
+    return np.array([f"***.{m // 1000:03d}.{m % 1000:03d}-**" for m in middle], dtype=object)
+
+
+def generate_chunk(rng, year_month, ids, municipios, muni_cdf, duplicate_rate):
+    """Gera as linhas (strings já formatadas) dos alunos `ids` para um mês"""
+    n = len(ids)
+
+    # Uma fração das linhas repete um aluno já presente no chunk
+    ids = ids.copy()
+    dup_mask = rng.random(n) < duplicate_rate
+    if dup_mask.any() and n > 1:
+        ids[dup_mask] = ids[rng.integers(0, n, dup_mask.sum())]
+
+    # Município estável por aluno, respeitando o peso de cada UF
+    u = ((ids.astype(np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)) / 2 ** 32
+    muni_idx = np.minimum(np.searchsorted(muni_cdf, u), len(municipios) - 1)
+    inc_idx = rng.choice(len(INCENTIVOS), n, p=[i[3] for i in INCENTIVOS])
+    etapa_idx = (ids % 10 == 0).astype(int)
+
+    names = _names(ids)
+    rep_names = _names(ids // 2 + 1000003)
+    cpfs = _masked_cpf(ids)
+    rep_cpfs = _masked_cpf(ids // 2 + 5000000)
+
+    year, month = year_month[:4], year_month[4:]
+    day = rng.integers(1, 28, n)
+
+    lines = []
+    for i in range(n):
+        uf, code, muni = municipios[muni_idx[i]]
+        etapa_code, etapa = ETAPAS[etapa_idx[i]]
+        inc_code, inc_name, value, _ = INCENTIVOS[inc_idx[i]]
+        nis = 10000000000 + int(ids[i])
+        lines.append(
+            f'"{year_month}";"{year_month}";"{uf}";"{code}";"{muni}";"{nis}";"{cpfs[i]}";'
+            f'"{names[i]}";"{nis + 5000000000}";"{rep_cpfs[i]}";"{rep_names[i]}";'
+            f'"{etapa_code}";"{etapa}";"{inc_code}";"{inc_name}";'
+            f'"{day[i]:02d}/{month}/{year}";"{value}"'
+        )
+    return lines
+
+
+def generate_month(output_dir, year_month, rows, seed=0, population=None,
+                   duplicate_rate=0.01, members=1, chunk_rows=200000):
+    """
+    Gera AAAAMM.zip com `rows` linhas (divididas em `members` CSVs).
+    Retorna o caminho do ZIP.
+    """
+    rng = np.random.default_rng([seed, int(year_month)])
+    municipios = build_municipios(np.random.default_rng(seed))
+    os.makedirs(output_dir, exist_ok=True)
+    zip_path = os.path.join(output_dir, f"{year_month}.zip")
+
+    header = ';'.join(f'"{h}"' for h in HEADER)
+    per_member = [rows // members + (1 if i < rows % members else 0) for i in range(members)]
+
+    # Alunos do mês: amostra sem reposição de uma população fixa, para que os
+    # mesmos alunos apareçam em vários meses
+    population = population or rows
+    ids = rng.choice(population, rows, replace=population < rows).astype(np.int64)
+
+    weights = np.array([UFS[m[0]] for m in municipios], dtype=float)
+    muni_cdf = np.cumsum(weights / weights.sum())
+
+    offset = 0
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for m, member_rows in enumerate(per_member):
+            suffix = f"_{m + 1:02d}" if members > 1 else ""
+            name = f"{year_month}_PeDeMeia{suffix}.csv"
+            with zf.open(name, 'w', force_zip64=True) as out:
+                out.write((header + '\r\n').encode('latin-1'))
+                end = offset + member_rows
+                while offset < end:
+                    n = min(chunk_rows, end - offset)
+                    lines = generate_chunk(rng, year_month, ids[offset:offset + n],
+                                           municipios, muni_cdf, duplicate_rate)
+                    out.write(('\r\n'.join(lines) + '\r\n').encode('latin-1'))
+                    offset += n
+    return zip_path
+
+
+def month_list(start, count):
+    """['202401', '202402', ...] a partir de AAAAMM"""
+    year, month = int(start[:4]), int(start[4:])
+    months = []
+    for _ in range(count):
+        months.append(f"{year}{month:02d}")
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return months
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--saida', default='benchmarks/dados', help='diretório dos ZIPs')
+    parser.add_argument('--linhas', type=int, default=100000,
+                        help='total de linhas (dividido entre os meses)')
+    parser.add_argument('--meses', type=int, default=1)
+    parser.add_argument('--inicio', default='202401', help='primeiro mês (AAAAMM)')
+    parser.add_argument('--membros', type=int, default=1, help='CSVs por ZIP')
+    parser.add_argument('--duplicatas', type=float, default=0.01,
+                        help='fração de linhas duplicadas dentro do mês')
+    parser.add_argument('--populacao', type=int, default=None,
+                        help='número de alunos distintos (padrão: linhas por mês)')
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--processos', type=int, default=os.cpu_count(),
+                        help='meses gerados em paralelo')
+    args = parser.parse_args(argv)
+
+    months = month_list(args.inicio, args.meses)
+    per_month = args.linhas // len(months)
+    population = args.populacao or per_month
+
+    # Um processo por mês (a geração de cada mês é independente)
+    with ProcessPoolExecutor(max_workers=args.processos) as pool:
+        futures = {
+            pool.submit(generate_month, args.saida, year_month, per_month, args.semente,
+                        population, args.duplicatas, args.membros): year_month
+            for year_month in months
+        }
+        start = time.perf_counter()
+        for future in as_completed(futures):
+            path = future.result()
+            print(f"{path}: {per_month:,} linhas, {os.path.getsize(path) / 1e6:.1f} MB "
+                  f"({time.perf_counter() - start:.1f}s)")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Executa um script e grava o pico de memória do próprio processo
+
+Uso: processo_medido.py RELATORIO.json SCRIPT.py [argumentos...]
+
+O ru_maxrss que o processo pai obtém com wait4() (e o RUSAGE_SELF do filho)
+herda o pico do processo que fez o fork, então não serve para comparar
+estratégias. Aqui o pico vem de /proc/self/status (VmHWM), que é do espaço de
+endereçamento criado pelo exec. Os processos filhos (ProcessPoolExecutor com
+'spawn') são amostrados periodicamente pelo mesmo VmHWM.
+"""
+
+import json
+import os
+import runpy
+import sys
+import threading
+
+SAMPLE_INTERVAL = 0.2
+
+
+def vm_hwm_kb(pid='self'):
+    """VmHWM do processo em kB (None se o processo já terminou)"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    return None
+
+
+def child_pids(parent):
+    """PIDs cujo processo pai é `parent` (varredura de /proc/*/stat)"""
+    pids = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # o nome do comando (2º campo) pode conter espaços: o ppid vem após o ')'
+        if int(stat.rsplit(')', 1)[1].split()[1]) == parent:
+            pids.append(int(name))
+    return pids
+
+
+def sample_children(peaks, stop):
+    """Guarda o maior VmHWM visto de cada processo filho até `stop`"""
+    me = os.getpid()
+    while not stop.wait(SAMPLE_INTERVAL):
+        for pid in child_pids(me):
+            hwm = vm_hwm_kb(pid)
+            if hwm is not None:
+                peaks[pid] = max(peaks.get(pid, 0), hwm)
+
+
+def main():
+    report_path, script = sys.argv[1], sys.argv[2]
+    sys.argv = sys.argv[2:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+
+    peaks = {}
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_children, args=(peaks, stop), daemon=True)
+    sampler.start()
+
+    exit_code = 0
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        exit_code = e.code
+    finally:
+        stop.set()
+        sampler.join()
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({'peak_rss_kb': vm_hwm_kb(),
+                       'workers': len(peaks),
+                       'workers_peak_rss_kb': sum(peaks.values())}, f)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Benchmarks reprodutíveis da coleta, sem acesso ao Portal
+
+Gera (ou reaproveita) meses sintéticos, sobe o servidor local que imita o
+Portal e mede:
+  - as etapas da coleta (download, unzip, parse, validate, transform, write, dedup,
+    dedup_shards, dedup_prefilter, export, export_fanout, timeline, anomalies,
+    representatives, names, revision, groupby_strings, groupby_ids, query)
+    usando as funções reais de coletar_pe_de_meia_memoria_otimizada.py;
+  - o download do maior mês com banda limitada por conexão (DOWNLOAD_RATE):
+    GET único (download_single) e faixas paralelas (download_ranged);
+  - as quatro estratégias coletar_pe_de_meia_* executadas de ponta a ponta,
+    cada uma em um processo separado (tempo total, pico de memória medido
+    dentro do processo e número de linhas gerado, que precisa coincidir).
+
+O resultado é gravado em JSON e pode ser comparado com uma execução anterior
+(--comparar) para acompanhar regressões.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import gerar_dados_sinteticos
+import servidor_portal_local
+
+STRATEGIES = {
+    'completo': 'coletar_pe_de_meia_completo.py',
+    'final': 'coletar_pe_de_meia_final.py',
+    'otimizado': 'coletar_pe_de_meia_otimizado.py',
+    'memoria': 'coletar_pe_de_meia_memoria_otimizada.py',
+}
+DOWNLOAD_RATE = 10_000_000  # bytes/s por conexão no servidor das etapas de download
+MIN_RANGED_PART = 64 << 10  # menor faixa do download_ranged
+
+
+def log_message(message):
+    """Log com timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}")
+    sys.stdout.flush()
+
+
+def ensure_data(data_dir, rows, months, members, regenerate=False):
+    """Gera os meses sintéticos se ainda não existirem"""
+    month_ids = gerar_dados_sinteticos.month_list('202401', months)
+    missing = [m for m in month_ids if not os.path.exists(os.path.join(data_dir, f"{m}.zip"))]
+    if missing or regenerate:
+        log_message(f"Gerando {rows:,} linhas em {months} mês(es) em {data_dir}...")
+        gerar_dados_sinteticos.main(['--saida', data_dir, '--linhas', str(rows),
+                                     '--meses', str(months), '--membros', str(members)])
+    return [(int(m[:4]), int(m[4:])) for m in month_ids]
+
+
+def bench_downloads(data_dir, periods, work_dir):
+    """GET único x faixas paralelas do maior mês, com banda limitada por conexão"""
+    import http_transport
+    import instrumentation
+    import ranged_download
+
+    sizes = {f"{y}{m:02d}": os.path.getsize(os.path.join(data_dir, f"{y}{m:02d}.zip"))
+             for y, m in periods}
+    year_month = max(sizes, key=sizes.get)
+    server, base_url = servidor_portal_local.start_server(data_dir, rate=DOWNLOAD_RATE)
+    url = f"{base_url}/{year_month}"
+    path = os.path.join(work_dir, 'etapas_download.zip')
+    try:
+        with instrumentation.stage('download_single', year_month) as m:
+            m['bytes'] = len(http_transport.fetch(url).content)
+        # faixas proporcionais ao arquivo, para que os meses sintéticos
+        # pequenos também sejam divididos entre todas as conexões
+        part_bytes = max(MIN_RANGED_PART,
+                         -(-sizes[year_month] // ranged_download.DEFAULT_CONNECTIONS))
+        if sizes[year_month] < 2 * part_bytes:
+            log_message(f"download_ranged ignorada: {year_month}.zip tem "
+                        f"{sizes[year_month]:,} bytes (menos de duas faixas)")
+            return
+        with instrumentation.stage('download_ranged', year_month) as m:
+            result = ranged_download.download(url, path, min_part_bytes=part_bytes)
+            if result is None:
+                raise RuntimeError("o servidor local não aceitou o download em faixas")
+            m['bytes'] = result['bytes']
+    finally:
+        server.shutdown()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def bench_stages(periods, work_dir, data_dir):
+    """Mede as etapas da coleta com as funções do coletor otimizado"""
+    import numpy as np
+    import pandas as pd
+
+    import anomalies
+    import coletar_pe_de_meia_memoria_otimizada as coletor
+    import export_engine
+    import instrumentation
+    import name_search
+    import partition_delta
+    import partition_store
+    import pe_de_meia
+    import representative_index
+    import sharded_dedup
+    import timeline
+
+    instrumentation.reset()
+    temp_file = os.path.join(work_dir, 'etapas_temp.csv')
+    store_root = os.path.join(work_dir, 'etapas_particoes')
+    final_file = os.path.join(work_dir, 'etapas_final.csv')
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+    partition_store.clear(store_root)
+
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        for year, month in periods:
+            coletor.process_period_to_file(year, month, temp_file)
+        coletor.remove_duplicates_from_file(temp_file, store_root)
+
+    # Mesma remoção dividida em 2 shards deduplicados em processos separados
+    with instrumentation.stage('dedup_shards') as m:
+        with contextlib.redirect_stdout(quiet), \
+                partition_store.PartitionWriter(os.path.join(work_dir, 'etapas_shards')) as writer:
+            m['rows'] = sharded_dedup.remove_duplicates(temp_file, writer, max_workers=2)[0]
+
+    # Remoção serial com o pré-filtro de Bloom (medida à parte da etapa 'dedup')
+    serial_dedup = instrumentation.snapshot()['stages']['dedup']
+    with instrumentation.stage('dedup_prefilter') as m:
+        with contextlib.redirect_stdout(quiet):
+            coletor.remove_duplicates_from_file(
+                temp_file, os.path.join(work_dir, 'etapas_prefiltro'), max_workers=1,
+                prefilter=True)
+        m['rows'] = serial_dedup['rows']
+
+    with instrumentation.stage('export') as m:
+        m['rows'] = partition_store.export_legacy(store_root, final_file)
+        m['bytes'] = os.path.getsize(final_file)
+
+    with instrumentation.stage('export_fanout') as m:
+        engine = export_engine.ExportEngine(store_root)
+        fanout_dir = os.path.join(work_dir, 'etapas_entregas')
+        for name in ('legado', 'legado_bom', 'jsonl', 'uf'):
+            engine.add(export_engine.deliverable_sink(name, fanout_dir))
+        os.makedirs(fanout_dir, exist_ok=True)
+        m['rows'] = engine.run()['rows']
+
+    with instrumentation.stage('timeline') as m:
+        meta = timeline.build(store_root, os.path.join(work_dir, 'etapas_linha_do_tempo'))
+        m['rows'] = meta['payments']
+
+    with instrumentation.stage('anomalies') as m:
+        scanner = anomalies.scan_store(store_root)
+        m['rows'] = scanner.rows
+
+    with instrumentation.stage('representatives') as m:
+        index_root = os.path.join(work_dir, 'etapas_representantes')
+        m['rows'] = representative_index.rebuild(index_root, store_root)['edges']
+
+    with instrumentation.stage('names') as m:
+        index_root = os.path.join(work_dir, 'etapas_nomes')
+        m['rows'] = name_search.rebuild(index_root, store_root)['names']
+
+    # Republicação do primeiro mês com ~1% de linhas incluídas, alteradas e excluídas
+    year_month = partition_store.list_periods(store_root)[0]
+    release = pd.concat(partition_store.read_chunks(store_root, year_month), ignore_index=True)
+    changed = release.index % 100
+    release.loc[changed == 1, 'Valor Disponibilizado'] = '0,01'
+    added = release[changed == 2].assign(**{'CPF do Beneficiário': lambda f: f.index.astype(str)})
+    release = pd.concat([release[changed != 3], added])
+    release_file = os.path.join(work_dir, 'etapas_revisao.csv')
+    release.to_csv(release_file, sep=';', index=False)
+    with instrumentation.stage('revision') as m:
+        summary = partition_delta.revise(store_root, year_month, release_file)
+        m['rows'] = summary['inserts'] + summary['updates'] + summary['deletes']
+
+    # Pagamentos por representante legal em todos os meses: strings decodificadas x ids
+    periods_stored = partition_store.list_periods(store_root)
+    with instrumentation.stage('groupby_strings') as m:
+        counts = pd.concat([
+            chunk for ym in periods_stored
+            for chunk in partition_store.read_chunks(store_root, ym, ['Representante Legal'])
+        ])['Representante Legal'].value_counts()
+        m['rows'] = int(counts.sum())
+    with instrumentation.stage('groupby_ids') as m:
+        ids = np.concatenate([
+            chunk['Representante Legal'].to_numpy()
+            for ym in periods_stored
+            for chunk in partition_store.read_chunks(store_root, ym, ['Representante Legal'],
+                                                     decode=False)])
+        counts = np.bincount(ids)
+        m['rows'] = len(ids)
+        m['bytes'] = int(ids.nbytes)
+
+    with instrumentation.stage('query') as m:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            pe_de_meia.main(['query', '--csv', store_root, '--uf', 'SP', '--contar'])
+        m['rows'] = int(out.getvalue().strip() or 0)
+
+    bench_downloads(data_dir, periods, work_dir)
+
+    stages = instrumentation.snapshot()['stages']
+    stages['dedup'] = serial_dedup
+    return stages
+
+
+def bench_strategy(name, script, base_url, work_dir):
+    """Executa uma estratégia de ponta a ponta em um processo separado"""
+    data_dir = os.path.join(work_dir, f"estrategia_{name}")
+    os.makedirs(data_dir, exist_ok=True)
+    env = dict(os.environ,
+               PE_DE_MEIA_PORTAL_URL=base_url,
+               PE_DE_MEIA_DATA_DIR=data_dir,
+               PE_DE_MEIA_PAUSA='0')
+
+    # O pico de memória é medido dentro do filho (ver processo_medido.py)
+    report_path = os.path.join(work_dir, f"memoria_{name}.json")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(BENCH_DIR, 'processo_medido.py'),
+                           report_path, os.path.join(SCRIPTS_DIR, script)],
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
+    elapsed = time.perf_counter() - start
+    memory = {}
+    if os.path.exists(report_path):
+        with open(report_path, 'r', encoding='utf-8') as f:
+            memory = json.load(f)
+
+    output_file = os.path.join(data_dir, 'dados_portal_transparencia_completo.csv')
+    store_root = os.path.join(data_dir, 'pe_de_meia_particoes')
+    rows = 0
+    if os.path.exists(output_file):
+        with open(output_file, 'rb') as f:
+            rows = max(0, sum(1 for _ in f) - 1)
+    elif os.path.isdir(store_root):
+        import partition_store
+        rows = partition_store.total_rows(store_root)
+
+    return {
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round((memory.get('peak_rss_kb') or 0) / 1024, 1),
+        'workers': memory.get('workers', 0),
+        'workers_peak_rss_mb': round(memory.get('workers_peak_rss_kb', 0) / 1024, 1),
+        'exit_code': proc.returncode,
+        'output_rows': rows,
+        'log_tail': proc.stdout.decode('utf-8', errors='replace').splitlines()[-3:],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    """Mostra a variação em relação a uma execução anterior"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    log_message(f"=== COMPARAÇÃO COM {baseline_path} ({baseline.get('commit')}) ===")
+    for name, stage in results.get('stages', {}).items():
+        old = baseline.get('stages', {}).get(name)
+        if old and old['seconds'] > 0:
+            change = (stage['seconds'] / old['seconds'] - 1) * 100
+            log_message(f"etapa {name}: {old['seconds']:.2f}s -> {stage['seconds']:.2f}s ({change:+.1f}%)")
+    for name, run in results.get('strategies', {}).items():
+        old = baseline.get('strategies', {}).get(name)
+        if old and old['seconds'] > 0:
+            change = (run['seconds'] / old['seconds'] - 1) * 100
+            log_message(f"estratégia {name}: {old['seconds']:.2f}s -> {run['seconds']:.2f}s "
+                        f"({change:+.1f}%), memória {old['peak_rss_mb']} -> {run['peak_rss_mb']} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dados', default=os.path.join(BENCH_DIR, 'dados'))
+    parser.add_argument('--linhas', type=int, default=100000, help='total de linhas geradas')
+    parser.add_argument('--meses', type=int, default=1)
+    parser.add_argument('--membros', type=int, default=1, help='CSVs por ZIP')
+    parser.add_argument('--regerar', action='store_true', help='gera os dados novamente')
+    parser.add_argument('--estrategias', default=','.join(STRATEGIES),
+                        help='lista separada por vírgulas (vazio para pular)')
+    parser.add_argument('--sem-etapas', action='store_true', help='não mede as etapas')
+    parser.add_argument('--saida', default=None, help='arquivo JSON de resultados')
+    parser.add_argument('--comparar', default=None, help='JSON de uma execução anterior')
+    args = parser.parse_args(argv)
+
+    periods = ensure_data(args.dados, args.linhas, args.meses, args.membros, args.regerar)
+    server, base_url = servidor_portal_local.start_server(args.dados)
+    os.environ['PE_DE_MEIA_PORTAL_URL'] = base_url
+    import config
+    config.PORTAL_DOWNLOAD_URL = base_url
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'rows': args.linhas,
+        'months': args.meses,
+        'members': args.membros,
+    }
+
+    with tempfile.TemporaryDirectory(prefix='pe_de_meia_bench_') as work_dir:
+        if not args.sem_etapas:
+            log_message("=== ETAPAS ===")
+            results['stages'] = bench_stages(periods, work_dir, args.dados)
+            for name, stage in results['stages'].items():
+                rate = f", {stage['rows_per_s']:,.0f} linhas/s" if 'rows_per_s' in stage else ""
+                rate += f", {stage['mb_per_s']:.1f} MB/s" if 'mb_per_s' in stage else ""
+                log_message(f"{name}: {stage['seconds']:.3f}s{rate}")
+
+        names = [n for n in args.estrategias.split(',') if n]
+        if names:
+            log_message("=== ESTRATÉGIAS ===")
+            results['strategies'] = {}
+            for name in names:
+                run = bench_strategy(name, STRATEGIES[name], base_url, work_dir)
+                results['strategies'][name] = run
+                workers = (f" (+{run['workers_peak_rss_mb']} MB em {run['workers']} processo(s))"
+                           if run['workers'] else "")
+                log_message(f"{name}: {run['seconds']:.2f}s, pico {run['peak_rss_mb']} MB{workers}, "
+                            f"{run['output_rows']:,} linhas, código {run['exit_code']}")
+
+            # Tempos só são comparáveis se todas as estratégias produziram a mesma saída
+            row_counts = {run['output_rows'] for run in results['strategies'].values()}
+            results['strategies_comparable'] = len(row_counts) == 1
+            if len(row_counts) > 1:
+                log_message("⚠️  Estratégias com número de linhas diferente; tempos NÃO comparáveis: "
+                            + ", ".join(f"{n}={run['output_rows']:,}"
+                                        for n, run in results['strategies'].items()))
+
+    server.shutdown()
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        log_message(f"Resultados: {args.saida}")
+    if args.comparar:
+        compare(results, args.comparar)
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
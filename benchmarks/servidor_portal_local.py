@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Servidor HTTP local que imita o endpoint de download do Portal
+
+Serve /download-de-dados/pe-de-meia/AAAAMM a partir de AAAAMM.zip em um
+diretório local (404 para meses ausentes). Suporta requisições com Range
+(anunciando ETag e o SHA-256 em Repr-Digest) e pode injetar latência, falhas
+503 e um limite de banda por conexão, para exercitar as novas tentativas e o
+download em faixas paralelas.
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+URL_PREFIX = "/download-de-dados/pe-de-meia/"
+
+
+def make_handler(data_dir, latency=0.0, failure_rate=0.0, rate=None, ranges=True):
+    """
+    Cria a classe de handler ligada ao diretório de dados. `rate` limita cada
+    conexão a tantos bytes/s; com ranges=False, o cabeçalho Range é ignorado
+    """
+    digests = {}
+    digests_lock = threading.Lock()
+
+    def file_digest(path):
+        """(ETag, Repr-Digest) do arquivo, calculados uma vez por versão"""
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with digests_lock:
+            if key not in digests:
+                with open(path, 'rb') as f:
+                    sha256 = hashlib.sha256(f.read()).digest()
+                digests[key] = (f'"{sha256[:8].hex()}"',
+                                f"sha-256=:{base64.b64encode(sha256).decode('ascii')}:")
+            return digests[key]
+
+    class PortalHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_empty(self, status, headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def _resolve(self):
+            match = re.fullmatch(re.escape(URL_PREFIX) + r"(\d{6})/?", self.path)
+            if not match:
+                return None
+            path = os.path.join(data_dir, f"{match.group(1)}.zip")
+            return path if os.path.exists(path) else None
+
+        def do_HEAD(self):
+            self._serve(send_body=False)
+
+        def do_GET(self):
+            self._serve(send_body=True)
+
+        def _serve(self, send_body):
+            if latency:
+                time.sleep(latency)
+            if failure_rate and random.random() < failure_rate:
+                self._send_empty(503, {'Retry-After': '0'})
+                return
+
+            path = self._resolve()
+            if path is None:
+                self._send_empty(404)
+                return
+
+            size = os.path.getsize(path)
+            start, end = 0, size - 1
+            status = 200
+
+            etag, digest = file_digest(path)
+            range_header = self.headers.get('Range') if ranges else None
+            if_range = self.headers.get('If-Range')
+            if range_header and if_range and if_range != etag:
+                range_header = None
+            if range_header:
+                match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+                if not match or (not match.group(1) and not match.group(2)):
+                    self._send_empty(416, {'Content-Range': f"bytes */{size}"})
+                    return
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else size - 1
+                else:
+                    start = max(0, size - int(match.group(2)))
+                end = min(end, size - 1)
+                if start > end:
+                    self._send_empty(416, {'Content-Range': f"bytes */{size}"})
+                    return
+                status = 206
+
+            length = end - start + 1
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/zip')
+            if ranges:
+                self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Repr-Digest', digest)
+            self.send_header('Content-Length', str(length))
+            if status == 206:
+                self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+            self.end_headers()
+
+            if send_body:
+                with open(path, 'rb') as f:
+                    f.seek(start)
+                    remaining = length
+                    block_size = min(1 << 20, max(rate // 10, 1 << 14)) if rate else 1 << 20
+                    started = time.perf_counter()
+                    while remaining > 0:
+                        block = f.read(min(block_size, remaining))
+                        if not block:
+                            break
+                        self.wfile.write(block)
+                        remaining -= len(block)
+                        if rate:
+                            ahead = (length - remaining) / rate - (time.perf_counter() - started)
+                            if ahead > 0:
+                                time.sleep(ahead)
+
+    return PortalHandler
+
+
+def start_server(data_dir, host='127.0.0.1', port=0, latency=0.0, failure_rate=0.0,
+                 rate=None, ranges=True):
+    """
+    Inicia o servidor em uma thread e retorna (servidor, URL base para
+    PE_DE_MEIA_PORTAL_URL)
+    """
+    handler = make_handler(data_dir, latency, failure_rate, rate, ranges)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_port}{URL_PREFIX.rstrip('/')}"
+    return server, base_url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dados', default='benchmarks/dados', help='diretório com AAAAMM.zip')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--latencia', type=float, default=0.0, help='segundos por requisição')
+    parser.add_argument('--falhas', type=float, default=0.0, help='fração de respostas 503')
+    parser.add_argument('--banda', type=float, default=None,
+                        help='limite por conexão, em MB/s')
+    parser.add_argument('--sem-range', action='store_true',
+                        help='ignora Range (respostas sempre completas)')
+    args = parser.parse_args(argv)
+
+    rate = int(args.banda * 1e6) if args.banda else None
+    server, base_url = start_server(args.dados, port=args.porta, latency=args.latencia,
+                                    failure_rate=args.falhas, rate=rate,
+                                    ranges=not args.sem_range)
+    print(f"Servindo {args.dados} em {base_url}")
+    print(f"Use: export PE_DE_MEIA_PORTAL_URL={base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -124,4 +124,13 @@ extractAllData().then(result => {
     // Salvar resultado no localStorage para recuperar depois
     localStorage.setItem('portalTransparenciaData', JSON.stringify(result));
     console.log('Dados salvos no localStorage com a chave "portalTransparenciaData"');
+    
+    // Baixar também como arquivo JSON (para o diretório observado por scripts/ingest_watch.py)
+    const blob = new Blob([JSON.stringify(result)], { type: 'application/json' });
+    const link = document.createElement('a');
+    link.href = URL.createObjectURL(blob);
+    link.download = `portal_transparencia_${Date.now()}.json`;
+    link.click();
+    // Revogar só depois que o navegador iniciar o download
+    setTimeout(() => URL.revokeObjectURL(link.href), 1000);
 });
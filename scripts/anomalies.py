@@ -0,0 +1,367 @@
+"""
+Detecção de anomalias nos pagamentos em uma única passada
+
+Três verificações, acumuladas chunk a chunk e fechadas a cada período:
+
+  pagamento_repetido  beneficiário pago mais de uma vez pelo mesmo incentivo
+                      no mês: cada chunk é comparado (searchsorted) com as
+                      chaves já vistas no período, mantidas ordenadas; só as
+                      linhas repetidas têm a identidade guardada.
+  representante       representante legal ligado a muitos beneficiários no mês
+                      (contagem exata dos pares representante/beneficiário por
+                      hash); um count-min sketch guarda a identidade só dos
+                      representantes que passam do limite.
+  municipio           município cujo total mensal salta em relação ao mês
+                      anterior (soma por município), com os beneficiários
+                      distintos de cada mês estimados por HyperLogLog.
+
+A memória fica limitada a um período (hashes de 8 bytes por linha) mais os
+sketches, qualquer que seja o número de meses. Os chunks devem chegar em
+ordem de período, como nas partições e no arquivo temporário da coleta.
+
+Sobre o armazenamento já deduplicado (CPF + período) não sobram pagamentos
+repetidos; essa verificação só encontra casos quando alimentada com as linhas
+brutas, durante a remoção de duplicatas da coleta (--anomalias).
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+import chunking
+import config
+import csv_writer
+import partition_store
+import validation
+
+COLUMNS = [
+    'CPF do Beneficiário', 'Beneficiário', 'UF', 'Município', 'Representante Legal',
+    'CPF do Representante', 'Valor Disponibilizado', 'Código Tipo Incentivo',
+]
+FINDING_COLUMNS = ['tipo', 'posicao', 'score', 'periodo', 'chave', 'descricao', 'valor',
+                   'referencia']
+KINDS = ['pagamento_repetido', 'representante', 'municipio']
+
+REPRESENTATIVE_MIN = 6         # beneficiários no mês para sinalizar um representante
+JUMP_RATIO = 2.0               # variação do total mensal (para cima ou para baixo)
+JUMP_MIN_TOTAL = 10000.0       # R$ no maior dos dois meses
+TOP_PER_KIND = 1000
+
+CMS_DEPTH = 2
+CMS_MIN_WIDTH = 1 << 16
+CMS_MAX_WIDTH = 1 << 22
+HLL_PRECISION = 10
+
+_ODD = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                 0xD6E8FEB86659FD93], dtype=np.uint64)
+
+
+def default_output():
+    return config.data_path("pe_de_meia_anomalias.csv")
+
+
+def _hash(*columns):
+    """Hash de 64 bits das colunas (arrays de strings) combinadas"""
+    result = np.zeros(len(columns[0]), dtype=np.uint64)
+    for i, values in enumerate(columns):
+        result ^= pd.util.hash_array(np.asarray(values, dtype=object)) * _ODD[i % len(_ODD)]
+    return result
+
+
+class CountMinSketch:
+    """Contagens aproximadas (nunca abaixo da real) em `depth` x `width` contadores"""
+
+    def __init__(self, width, depth=CMS_DEPTH):
+        self.bits = max(1, int(width - 1).bit_length())
+        self.table = np.zeros((depth, 1 << self.bits), dtype=np.uint32)
+
+    def _indexes(self, keys):
+        shift = np.uint64(64 - self.bits)
+        return [((keys * _ODD[d]) >> shift).astype(np.intp) for d in range(len(self.table))]
+
+    def add(self, keys):
+        """Soma 1 para cada chave e devolve as estimativas já atualizadas"""
+        indexes = self._indexes(keys)
+        for row, index in zip(self.table, indexes):
+            np.add.at(row, index, 1)
+        return np.min([row[index] for row, index in zip(self.table, indexes)], axis=0)
+
+    def clear(self):
+        self.table[:] = 0
+
+    @classmethod
+    def for_rows(cls, rows):
+        """Um contador por linha esperada (limitado); basta para os mais frequentes"""
+        return cls(min(max(rows, CMS_MIN_WIDTH), CMS_MAX_WIDTH))
+
+
+class HyperLogLogs:
+    """Um HyperLogLog por grupo (linhas de uma matriz de registradores)"""
+
+    def __init__(self, precision=HLL_PRECISION, groups=1024):
+        self.precision = precision
+        self.registers = np.zeros((groups, 1 << precision), dtype=np.uint8)
+
+    def add(self, groups, keys):
+        if len(groups) and groups.max() >= len(self.registers):
+            grown = np.zeros((max(groups.max() + 1, 2 * len(self.registers)),
+                              self.registers.shape[1]), dtype=np.uint8)
+            grown[:len(self.registers)] = self.registers
+            self.registers = grown
+        p = self.precision
+        index = (keys >> np.uint64(64 - p)).astype(np.intp)
+        rest = keys & np.uint64((1 << (64 - p)) - 1)
+        bit_length = np.frexp(rest.astype(np.float64))[1]  # 0 para rest == 0
+        rank = (64 - p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, (groups, index), rank)
+
+    def counts(self):
+        m = self.registers.shape[1]
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.power(2.0, -self.registers.astype(np.float64)).sum(axis=1)
+        zeros = (self.registers == 0).sum(axis=1)
+        small = (estimate <= 2.5 * m) & (zeros > 0)
+        estimate[small] = m * np.log(m / zeros[small])
+        return estimate
+
+
+class AnomalyScanner:
+    """
+    Acumula as verificações chunk a chunk:
+
+        scanner = AnomalyScanner()
+        for chunk in chunks:          # com a coluna 'periodo' (ou period=...)
+            scanner.update(chunk)
+        findings = scanner.findings()
+    """
+
+    def __init__(self, expected_rows=None, representative_min=REPRESENTATIVE_MIN,
+                 jump_ratio=JUMP_RATIO, jump_min_total=JUMP_MIN_TOTAL):
+        self.representative_min = representative_min
+        self.jump_ratio = jump_ratio
+        self.jump_min_total = jump_min_total
+        self.rows = 0
+        self.periods = []
+        self._found = {kind: [] for kind in KINDS}
+        self._representative_cms = CountMinSketch.for_rows(expected_rows or CMS_MAX_WIDTH)
+        self._municipalities = {}        # (UF, Município) -> id
+        self._municipal_totals = {}      # período -> array de centavos por id
+        self._municipal_people = {}      # período -> beneficiários distintos (HLL) por id
+        self._period = None
+
+    # --- período corrente -------------------------------------------------
+
+    def _start_period(self, period):
+        self._period = period
+        self.periods.append(period)
+        self._payment_seen = np.empty(0, dtype=np.uint64)
+        self._payment_repeats = []
+        self._pair_keys = []
+        self._representative_keys = []
+        self._representative_candidates = {}
+        self._totals = np.zeros(len(self._municipalities) + 1024, dtype=np.int64)
+        self._people = HyperLogLogs(groups=len(self._totals))
+        self._representative_cms.clear()
+
+    def _finish_period(self):
+        if self._period is None:
+            return
+        period = self._period
+        self._close_payments(period)
+        self._close_representatives(period)
+        count = len(self._municipalities)
+        self._municipal_totals[period] = self._totals[:count].copy()
+        self._municipal_people[period] = self._people.counts()[:count]
+        self._period = None
+
+    def _close_payments(self, period):
+        self._payment_seen = np.empty(0, dtype=np.uint64)
+        if not self._payment_repeats:
+            return
+        repeats = pd.concat(self._payment_repeats)
+        times = repeats.groupby('chave', sort=False).size() + 1
+        for row in repeats.drop_duplicates('chave').itertuples(index=False):
+            times_paid = int(times[row.chave])
+            self._found['pagamento_repetido'].append({
+                'score': float(times_paid),
+                'periodo': period,
+                'chave': f"{row.cpf} {row.nome}",
+                'descricao': f"incentivo {row.incentivo or '?'} pago {times_paid} vezes no mês "
+                             f"({row.municipio}/{row.uf})",
+                'valor': times_paid,
+                'referencia': 1,
+            })
+
+    def _close_representatives(self, period):
+        if not self._pair_keys:
+            return
+        pairs, first = np.unique(np.concatenate(self._pair_keys), return_index=True)
+        representatives = np.concatenate(self._representative_keys)[first]
+        keys, fanout = np.unique(representatives, return_counts=True)
+        if not len(keys):
+            return
+        median = float(np.median(fanout))
+        flagged = fanout >= self.representative_min
+        for key, count in zip(keys[flagged].tolist(), fanout[flagged].tolist()):
+            identity = self._representative_candidates.get(key)
+            if identity is None:
+                continue
+            cpf, name, uf, municipality = identity
+            self._found['representante'].append({
+                'score': round(count / max(median, 1.0), 2),
+                'periodo': period,
+                'chave': f"{cpf} {name}".strip(),
+                'descricao': f"{count} beneficiários no mês (mediana {median:g}) "
+                             f"- {municipality}/{uf}",
+                'valor': count,
+                'referencia': median,
+            })
+
+    # --- chunks -----------------------------------------------------------
+
+    def _municipality_ids(self, chunk):
+        codes, uniques = pd.factorize(chunk['UF'].astype(str) + '|' +
+                                      chunk['Município'].astype(str))
+        ids = np.array([self._municipalities.setdefault(value, len(self._municipalities))
+                        for value in uniques], dtype=np.intp)
+        if len(self._municipalities) > len(self._totals):
+            self._totals = np.append(self._totals,
+                                     np.zeros(len(self._municipalities), dtype=np.int64))
+        return ids[codes]
+
+    def update(self, chunk, period=None):
+        """Acrescenta um chunk (de um ou mais períodos consecutivos)"""
+        if period is None and partition_store.PERIOD_COLUMN in chunk:
+            for value, group in chunk.groupby(partition_store.PERIOD_COLUMN, sort=False):
+                self._update_period(group, str(value))
+        else:
+            self._update_period(chunk, str(period))
+
+    def _update_period(self, chunk, period):
+        if period != self._period:
+            self._finish_period()
+            self._start_period(period)
+        self.rows += len(chunk)
+
+        def column(name):
+            if name in chunk:
+                return chunk[name].to_numpy(dtype=object, na_value='')
+            return np.full(len(chunk), '', dtype=object)
+
+        cpf, name = column('CPF do Beneficiário'), column('Beneficiário')
+        incentive = column('Código Tipo Incentivo')
+        representative_cpf, representative = column('CPF do Representante'), \
+            column('Representante Legal')
+        beneficiary = _hash(cpf, name)
+
+        # Pagamentos repetidos: chaves já vistas no período ou repetidas no chunk
+        payment = beneficiary ^ (_hash(incentive) * _ODD[3])
+        seen = self._payment_seen
+        repeated = pd.Series(payment).duplicated().to_numpy()
+        if len(seen):
+            position = np.minimum(np.searchsorted(seen, payment), len(seen) - 1)
+            repeated = repeated | (seen[position] == payment)
+        if repeated.any():
+            self._payment_repeats.append(pd.DataFrame({
+                'chave': payment[repeated], 'cpf': cpf[repeated], 'nome': name[repeated],
+                'incentivo': incentive[repeated], 'uf': column('UF')[repeated],
+                'municipio': column('Município')[repeated],
+            }))
+        self._payment_seen = np.union1d(seen, payment)
+
+        # Representantes: pares distintos no período + identidade dos mais frequentes
+        has_representative = (representative != '') | (representative_cpf != '')
+        if has_representative.any():
+            rep = _hash(representative_cpf[has_representative], representative[has_representative])
+            self._representative_keys.append(rep)
+            self._pair_keys.append(rep ^ (beneficiary[has_representative] * _ODD[2]))
+            heavy = self._representative_cms.add(rep) >= self.representative_min
+            if heavy.any():
+                rows = np.flatnonzero(has_representative)
+                keys, first = np.unique(rep[heavy], return_index=True)
+                for key, i in zip(keys.tolist(), rows[np.flatnonzero(heavy)[first]]):
+                    if key not in self._representative_candidates:
+                        self._representative_candidates[key] = (
+                            representative_cpf[i], representative[i],
+                            column('UF')[i], column('Município')[i])
+
+        # Municípios: total em centavos e beneficiários distintos (HLL)
+        ids = self._municipality_ids(chunk)
+        cents = np.nan_to_num(np.rint(validation.parse_amounts(chunk['Valor Disponibilizado'])
+                                      * 100)).astype(np.int64)
+        np.add.at(self._totals, ids, cents)
+        self._people.add(ids, beneficiary)
+
+    # --- resultado --------------------------------------------------------
+
+    def _municipal_jumps(self):
+        names = {i: key for key, i in self._municipalities.items()}
+        for previous, current in zip(self.periods, self.periods[1:]):
+            before = self._municipal_totals.get(previous)
+            after = self._municipal_totals.get(current)
+            if before is None or after is None:
+                continue
+            count = min(len(before), len(after))
+            before_reais = before[:count] / 100
+            after_reais = after[:count] / 100
+            valid = (before_reais > 0) & (after_reais > 0) & \
+                (np.maximum(before_reais, after_reais) >= self.jump_min_total)
+            ratio = np.divide(after_reais, before_reais, out=np.ones(count), where=valid)
+            jumps = valid & ((ratio >= self.jump_ratio) | (ratio <= 1 / self.jump_ratio))
+            people_before = self._municipal_people[previous]
+            people_after = self._municipal_people[current]
+            for i in np.flatnonzero(jumps):
+                uf, municipality = names[i].split('|', 1)
+                self._found['municipio'].append({
+                    'score': round(abs(math.log2(ratio[i])), 3),
+                    'periodo': current,
+                    'chave': f"{municipality}/{uf}",
+                    'descricao': f"total R$ {before_reais[i]:,.2f} -> R$ {after_reais[i]:,.2f} "
+                                 f"(~{people_before[i]:,.0f} -> ~{people_after[i]:,.0f} "
+                                 f"beneficiários)",
+                    'valor': round(after_reais[i], 2),
+                    'referencia': round(before_reais[i], 2),
+                })
+
+    def findings(self, top=TOP_PER_KIND):
+        """Tabela ordenada por tipo e, dentro do tipo, pelo score (maior primeiro)"""
+        self._finish_period()
+        self._found['municipio'] = []
+        self._municipal_jumps()
+        frames = []
+        for kind in KINDS:
+            rows = sorted(self._found[kind], key=lambda r: -r['score'])[:top]
+            frame = pd.DataFrame(rows, columns=[c for c in FINDING_COLUMNS
+                                                if c not in ('tipo', 'posicao')])
+            frame.insert(0, 'posicao', range(1, len(frame) + 1))
+            frame.insert(0, 'tipo', kind)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+    def summary(self):
+        found = {kind: len(rows) for kind, rows in self._found.items()}
+        return (f"{self.rows:,} linhas em {len(self.periods)} período(s): "
+                + ", ".join(f"{kind}={count}" for kind, count in found.items()))
+
+
+def write_findings(findings, output_file):
+    with csv_writer.CsvWriter(output_file, columns=FINDING_COLUMNS) as writer:
+        writer.write(findings.astype(str))
+    return len(findings)
+
+
+def scan_store(root=None, periods=None, log=None):
+    """Passada sobre o armazenamento particionado; retorna o scanner"""
+    root = root or partition_store.default_root()
+    periods = periods if periods is not None else partition_store.list_periods(root)
+    expected = max([partition_store.read_metadata(root, ym)['rows'] for ym in periods] or [0])
+    scanner = AnomalyScanner(expected_rows=expected)
+    read_stats = {}
+    for year_month in periods:
+        for chunk in partition_store.read_chunks(root, year_month, COLUMNS, stats=read_stats):
+            scanner.update(chunk, year_month)
+    scanner.findings()
+    if log:
+        log(f"Anomalias: {scanner.summary()} - {chunking.describe(read_stats)}")
+    return scanner
@@ -0,0 +1,673 @@
+#!/usr/bin/env python3
+"""
+API HTTP local, somente leitura, sobre o armazenamento particionado
+
+Servidor asyncio (apenas biblioteca padrão + pandas) com as rotas:
+
+  GET /saude                      situação do serviço e do cache
+  GET /periodos                   partições disponíveis (linhas, bytes)
+  GET /agregados?por=uf,municipio,mes,incentivo[&uf=&municipio=&mes=&incentivo=]
+                                  pagamentos e valor total agrupados
+  GET /beneficiario?cpf=&nome=    pagamentos de um beneficiário (linha do tempo)
+  GET /nomes?q=[&limite=&papel=]  busca aproximada de nomes (índice de nomes)
+  GET /linhas?[mes=&uf=&municipio=&pagina=&tamanho=&formato=csv|jsonl]
+                                  fatia paginada das linhas, enviada em streaming
+
+As respostas JSON ficam em um cache LRU com validade (TTL), chaveado pela
+consulta normalizada (parâmetros em ordem, UF em maiúsculas, nomes dobrados
+etc.); requisições simultâneas para a mesma chave esperam um único cálculo.
+O cache é descartado quando o conjunto de partições muda (verificado no
+máximo uma vez por segundo). As fatias de
+/linhas não entram no cache: são lidas e enviadas em blocos, com
+Transfer-Encoding: chunked.
+
+Os agregados usam uma tabela por período (UF, município, incentivo ->
+pagamentos, centavos), calculada uma vez e mantida em memória; as consultas
+só reagrupam essas tabelas pequenas. O trabalho de disco/CPU roda em threads
+(asyncio.to_thread), sem bloquear o laço de eventos.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import config
+import partition_store
+
+DIMENSIONS = {'uf': 'UF', 'municipio': 'Município', 'mes': 'periodo', 'incentivo': 'incentivo'}
+FORMATS = ('csv', 'jsonl')
+PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1_000_000
+STREAM_BATCH_ROWS = 5000
+CACHE_ENTRIES = 512
+CACHE_TTL = 300.0
+IDLE_TIMEOUT = 30.0
+STORE_CHECK_INTERVAL = 1.0
+MAX_HEADERS = 100
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error'}
+
+
+def log_message(message):
+    """Log com timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}")
+    sys.stdout.flush()
+
+
+class ApiError(Exception):
+    """Erro com status HTTP e mensagem para o cliente"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseCache:
+    """LRU com validade (TTL) para respostas prontas"""
+
+    def __init__(self, max_entries=CACHE_ENTRIES, ttl=CACHE_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > self.clock():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (self.clock() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'entradas': len(self.entries), 'acertos': self.hits, 'faltas': self.misses,
+                'taxa_acerto': round(self.hits / total, 3) if total else None}
+
+
+# --- Parâmetros ---------------------------------------------------------------
+
+def _fold(text):
+    import schema_registry
+    return schema_registry.fold(text)
+
+
+def _month(value):
+    """MM/AAAA ou AAAAMM -> AAAAMM"""
+    value = value.strip()
+    if len(value) == 7 and value[2] == '/' and (value[:2] + value[3:]).isdigit():
+        return value[3:] + value[:2]
+    if len(value) == 6 and value.isdigit():
+        return value
+    raise ApiError(400, f"mês inválido: {value!r} (use MM/AAAA)")
+
+
+def _positive(name, limit):
+    def parse(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise ApiError(400, f"{name} deve ser inteiro") from None
+        if number < 1 or number > limit:
+            raise ApiError(400, f"{name} deve estar entre 1 e {limit}")
+        return number
+    return parse
+
+
+def _dimensions(value):
+    names = sorted({v.strip().lower() for v in value.split(',') if v.strip()})
+    unknown = [v for v in names if v not in DIMENSIONS]
+    if unknown:
+        raise ApiError(400, f"dimensão desconhecida: {', '.join(unknown)} "
+                            f"(use {', '.join(DIMENSIONS)})")
+    return ','.join(names)
+
+
+def _choice(name, choices):
+    def parse(value):
+        value = value.strip().lower()
+        if value not in choices:
+            raise ApiError(400, f"{name} deve ser um de: {', '.join(choices)}")
+        return value
+    return parse
+
+
+PARAMETERS = {
+    'uf': lambda v: v.strip().upper(),
+    'municipio': _fold,
+    'mes': _month,
+    'incentivo': _positive('incentivo', 99),
+    'por': _dimensions,
+    'cpf': lambda v: v.strip(),
+    'nome': lambda v: ' '.join(v.upper().split()),
+    'q': lambda v: ' '.join(v.split()),
+    'limite': _positive('limite', 1000),
+    'papel': _choice('papel', ('beneficiario', 'representante')),
+    'pagina': _positive('pagina', 10 ** 9),
+    'tamanho': _positive('tamanho', MAX_PAGE_SIZE),
+    'formato': _choice('formato', FORMATS),
+}
+
+
+def normalize(target, allowed):
+    """
+    (caminho, parâmetros normalizados, chave de cache) de um alvo como
+    '/agregados?por=UF&uf=sp'. Parâmetros fora de `allowed` são erro 400.
+    """
+    parts = urlsplit(target)
+    params = {}
+    for name, values in parse_qs(parts.query, keep_blank_values=True).items():
+        if name not in allowed:
+            raise ApiError(400, f"parâmetro desconhecido: {name}")
+        value = values[-1]
+        if value.strip():
+            params[name] = PARAMETERS[name](value)
+    path = parts.path.rstrip('/') or '/'
+    key = path + '?' + urlencode(sorted(params.items()))
+    return path, params, key
+
+
+# --- Dados ---------------------------------------------------------------------
+
+class Store:
+    """Acesso ao armazenamento particionado e aos índices derivados"""
+
+    def __init__(self, root=None, timeline_root=None, names_root=None):
+        self.root = root or partition_store.default_root()
+        self.timeline_root = timeline_root or config.data_path("pe_de_meia_linha_do_tempo")
+        self.names_root = names_root or config.data_path("pe_de_meia_nomes")
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._tables = {}
+        self._version = None
+        self._names = None
+
+    def version(self):
+        """Muda quando partições são incluídas, removidas ou regravadas"""
+        periods = partition_store.list_periods(self.root)
+        stamps = [os.stat(os.path.join(partition_store.partition_dir(self.root, ym),
+                                       partition_store.METADATA_FILE)).st_mtime_ns
+                  for ym in periods]
+        return tuple(zip(periods, stamps))
+
+    def refresh(self):
+        """Descarta as tabelas em memória se o armazenamento mudou; True se mudou"""
+        version = self.version()
+        with self._lock:
+            if version == self._version:
+                return False
+            self._version = version
+            self._tables.clear()
+            self._names = None
+            return True
+
+    def periods(self, month=None):
+        periods = [ym for ym, _ in self._version or ()]
+        return [ym for ym in periods if ym == month] if month else periods
+
+    def period_table(self, year_month):
+        """Pagamentos e centavos por (UF, município, incentivo) em um período"""
+        with self._lock:
+            table = self._tables.get(year_month)
+        if table is not None:
+            return table
+        with self._build_lock:
+            with self._lock:
+                table = self._tables.get(year_month)
+            if table is None:
+                table = self._build_table(year_month)
+                with self._lock:
+                    self._tables[year_month] = table
+            return table
+
+    def _build_table(self, year_month):
+        import pandas as pd
+        import validation
+
+        meta = partition_store.read_metadata(self.root, year_month)
+        # Com os ids dos dicionários (string_pool), agrupa pelo id do município
+        # e só decodifica os municípios da tabela final
+        encoded = 'Município' in meta.get('string_pools', {})
+        columns = ['UF', 'Município', 'Valor Disponibilizado', 'Código Tipo Incentivo']
+        parts = []
+        for chunk in partition_store.read_chunks(self.root, year_month, columns, meta=meta,
+                                                 decode=False):
+            amounts = validation.parse_amounts(chunk['Valor Disponibilizado'])
+            incentive = chunk['Código Tipo Incentivo'] if 'Código Tipo Incentivo' in chunk \
+                else pd.Series('', index=chunk.index)
+            frame = pd.DataFrame({
+                'UF': chunk['UF'],
+                'Município': chunk['Município'],
+                'incentivo': pd.to_numeric(incentive, errors='coerce').fillna(0).astype('int16'),
+                'centavos': (pd.Series(amounts, index=chunk.index).fillna(0) * 100)
+                .round().astype('int64'),
+            })
+            parts.append(frame.groupby(['UF', 'Município', 'incentivo'], sort=False)
+                         .agg(pagamentos=('centavos', 'size'), centavos=('centavos', 'sum')))
+        table = pd.concat(parts).groupby(level=[0, 1, 2]).sum().reset_index()
+        if encoded:
+            import string_pool
+            pool = string_pool.open_pools(self.root)[meta['string_pools']['Município']]
+            table['Município'] = pool.decode(table['Município'].to_numpy())
+        table['municipio_dobrado'] = [_fold(name) for name in table['Município']]
+        table['periodo'] = year_month
+        return table
+
+    def warm(self):
+        """Calcula antecipadamente as tabelas de agregados de todos os períodos"""
+        self.refresh()
+        started = time.perf_counter()
+        for year_month in self.periods():
+            self.period_table(year_month)
+        log_message(f"Agregados prontos: {len(self.periods())} período(s) em "
+                    f"{time.perf_counter() - started:.1f}s")
+
+    def aggregates(self, params):
+        import pandas as pd
+
+        periods = self.periods(params.get('mes'))
+        if not periods:
+            return []
+        table = pd.concat([self.period_table(ym) for ym in periods], ignore_index=True)
+        if 'uf' in params:
+            table = table[table['UF'] == params['uf']]
+        if 'municipio' in params:
+            table = table[table['municipio_dobrado'] == params['municipio']]
+        if 'incentivo' in params:
+            table = table[table['incentivo'] == params['incentivo']]
+
+        keys = [DIMENSIONS[d] for d in params.get('por', '').split(',') if d]
+        if keys:
+            grouped = table.groupby(keys, sort=True)[['pagamentos', 'centavos']].sum() \
+                .reset_index()
+        else:
+            grouped = pd.DataFrame({'pagamentos': [table['pagamentos'].sum()],
+                                    'centavos': [table['centavos'].sum()]})
+        names = {column: dimension for dimension, column in DIMENSIONS.items()}
+        result = []
+        for row in grouped.to_dict('records'):
+            item = {names[k]: (int(v) if k == 'incentivo' else v)
+                    for k, v in row.items() if k in names}
+            item['pagamentos'] = int(row['pagamentos'])
+            item['valor'] = int(row['centavos']) / 100
+            result.append(item)
+        return result
+
+    def beneficiary(self, params):
+        import timeline
+
+        if not os.path.exists(os.path.join(self.timeline_root, timeline.METADATA_FILE)):
+            raise ApiError(404, "linha do tempo não encontrada "
+                                "(pe_de_meia.py timeline --construir)")
+        if 'cpf' not in params and 'nome' not in params:
+            raise ApiError(400, "informe cpf e/ou nome")
+        if 'cpf' in params and 'nome' in params:
+            index = timeline.lookup(self.timeline_root, params['cpf'], params['nome'])
+            found = [] if index is None else [(index, {'CPF do Beneficiário': params['cpf'],
+                                                       'Beneficiário': params['nome']})]
+        else:
+            found = timeline.find(self.timeline_root, params.get('cpf'), params.get('nome'),
+                                  params.get('limite', 20))
+        result = []
+        for index, row in found:
+            payments = timeline.payments_of(self.timeline_root, index)
+            result.append({
+                'cpf': row['CPF do Beneficiário'],
+                'nome': row['Beneficiário'],
+                'pagamentos': [{
+                    'periodo': str(int(p['periodo'])),
+                    'etapa': int(p['etapa']),
+                    'incentivo': int(p['incentivo']),
+                    'valor': int(p['centavos']) / 100,
+                    'data': int(p['data']),
+                } for p in payments],
+            })
+        return result
+
+    def names(self, params):
+        import name_search
+
+        if 'q' not in params:
+            raise ApiError(400, "informe q")
+        if not os.path.exists(os.path.join(self.names_root, name_search.METADATA_FILE)):
+            raise ApiError(404, "índice de nomes não encontrado "
+                                "(pe_de_meia.py nomes --atualizar)")
+        with self._lock:
+            if self._names is None:
+                self._names = name_search.NameIndex(self.names_root)
+            index = self._names
+        role = {'beneficiario': 'Beneficiário',
+                'representante': 'Representante Legal'}.get(params.get('papel'))
+        return [{'nome': name, 'score': score, 'papeis': roles}
+                for name, score, roles in index.search(params['q'], params.get('limite', 10),
+                                                       role=role)]
+
+    def rows(self, params):
+        """Iterador das linhas da página pedida (listas no layout RECORD_COLUMNS)"""
+        size = params.get('tamanho', PAGE_SIZE)
+        skip = (params.get('pagina', 1) - 1) * size
+        periods = self.periods(params.get('mes'))
+        uf = params.get('uf')
+        municipio = params.get('municipio')
+
+        if uf is None and municipio is None:
+            # Sem filtro por linha, as contagens do metadata pulam partições inteiras
+            while periods:
+                rows = partition_store.read_metadata(self.root, periods[0])['rows']
+                if rows > skip:
+                    break
+                skip -= rows
+                periods = periods[1:]
+
+        sent = 0
+        # Com filtro, só os grupos de linhas que podem conter a UF/município são lidos
+        for row in partition_store.iter_records(self.root, periods, uf=uf, municipio=municipio):
+            if skip:
+                skip -= 1
+                continue
+            yield row
+            sent += 1
+            if sent >= size:
+                return
+
+
+def _encode_batch(rows, fmt, batch_rows):
+    """Próximo bloco de até batch_rows linhas já codificado (b'' no fim)"""
+    lines = []
+    for row in rows:
+        if fmt == 'jsonl':
+            lines.append(json.dumps(dict(zip(partition_store.RECORD_COLUMNS, row)),
+                                    ensure_ascii=False))
+        else:
+            lines.append(';'.join(row))
+        if len(lines) >= batch_rows:
+            break
+    return ''.join(line + '\n' for line in lines).encode('utf-8')
+
+
+# --- HTTP ------------------------------------------------------------------------
+
+ROUTES = {
+    '/saude': ((), False),
+    '/periodos': ((), True),
+    '/agregados': (('por', 'uf', 'municipio', 'mes', 'incentivo'), True),
+    '/beneficiario': (('cpf', 'nome', 'limite'), True),
+    '/nomes': (('q', 'limite', 'papel'), True),
+    '/linhas': (('mes', 'uf', 'municipio', 'pagina', 'tamanho', 'formato'), False),
+}
+
+
+class ApiServer:
+    """Servidor HTTP/1.1 (keep-alive) sobre asyncio.start_server"""
+
+    def __init__(self, store, cache_entries=CACHE_ENTRIES, ttl=CACHE_TTL):
+        self.store = store
+        self.cache = ResponseCache(cache_entries, ttl)
+        self.requests = 0
+        self._inflight = {}
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._warming = None
+        self._store_checked = float('-inf')
+
+    # Conexões
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                headers = {}
+                for _ in range(MAX_HEADERS):
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    await self.send_json(writer, 400, {'erro': 'requisição inválida'}, False)
+                    break
+                method, target, version = parts
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() \
+                    != 'close'
+                await self.respond(method, target, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def respond(self, method, target, writer, keep_alive):
+        self.requests += 1
+        if method not in ('GET', 'HEAD'):
+            await self.send_json(writer, 405, {'erro': 'apenas GET'}, keep_alive)
+            return
+        try:
+            path = urlsplit(target).path.rstrip('/') or '/'
+            if path not in ROUTES:
+                raise ApiError(404, f"rota desconhecida: {path} (rotas: {', '.join(ROUTES)})")
+            allowed, cacheable = ROUTES[path]
+            path, params, key = normalize(target, allowed)
+            now = time.monotonic()
+            if now - self._store_checked >= STORE_CHECK_INTERVAL:
+                self._store_checked = now
+                if await asyncio.to_thread(self.store.refresh):
+                    self.cache.clear()
+
+            if path == '/linhas':
+                await self.stream_rows(writer, params, keep_alive, send_body=method == 'GET')
+                return
+            if path == '/saude':
+                body = self.encode({'status': 'ok', 'periodos': len(self.store.periods()),
+                                    'requisicoes': self.requests, 'cache': self.cache.stats()})
+                await self.send(writer, 200, body, keep_alive, send_body=method == 'GET')
+                return
+
+            body = self.cache.get(key) if cacheable else None
+            cache_status = 'HIT' if body is not None else 'MISS'
+            if body is None:
+                body = await self.compute(key, path, params)
+            await self.send(writer, 200, body, keep_alive, {'X-Cache': cache_status},
+                            send_body=method == 'GET')
+        except ApiError as e:
+            await self.send_json(writer, e.status, {'erro': str(e)}, keep_alive)
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            log_message(f"Erro em {target}: {e}")
+            await self.send_json(writer, 500, {'erro': str(e)}, keep_alive)
+
+    async def compute(self, key, path, params):
+        """Calcula a resposta uma única vez por chave, mesmo com pedidos simultâneos"""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            handler = {
+                '/periodos': self.list_periods,
+                '/agregados': self.store.aggregates,
+                '/beneficiario': self.store.beneficiary,
+                '/nomes': self.store.names,
+            }[path]
+            body = self.encode(await asyncio.to_thread(handler, params))
+            self.cache.put(key, body)
+            future.set_result(body)
+            return body
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # marca como lida quando ninguém mais espera
+            raise
+        finally:
+            del self._inflight[key]
+
+    def list_periods(self, params):
+        result = []
+        for year_month in self.store.periods():
+            meta = partition_store.read_metadata(self.store.root, year_month)
+            result.append({'periodo': year_month,
+                           'mes': meta['constants']['Mês Referência'],
+                           'linhas': meta['rows'], 'bytes': meta['bytes']})
+        return result
+
+    @staticmethod
+    def encode(payload):
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    # Respostas
+
+    @staticmethod
+    def _head(status, keep_alive, headers):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def send(self, writer, status, body, keep_alive, headers=None, send_body=True,
+                   content_type='application/json; charset=utf-8'):
+        head = {'Content-Type': content_type, 'Content-Length': str(len(body))}
+        head.update(headers or {})
+        writer.write(self._head(status, keep_alive, head))
+        if send_body:
+            writer.write(body)
+        await writer.drain()
+
+    async def send_json(self, writer, status, payload, keep_alive):
+        await self.send(writer, status, self.encode(payload), keep_alive)
+
+    async def stream_rows(self, writer, params, keep_alive, send_body=True):
+        fmt = params.get('formato', 'csv')
+        content_type = 'text/csv; charset=utf-8' if fmt == 'csv' \
+            else 'application/x-ndjson; charset=utf-8'
+        writer.write(self._head(200, keep_alive, {'Content-Type': content_type,
+                                                  'Transfer-Encoding': 'chunked'}))
+        if not send_body:
+            await writer.drain()
+            return
+        rows = self.store.rows(params)
+        if fmt == 'csv':
+            header = ';'.join(partition_store.RECORD_COLUMNS) + '\n'
+            self._write_chunk(writer, header.encode('utf-8'))
+        while True:
+            try:
+                block = await asyncio.to_thread(_encode_batch, rows, fmt, STREAM_BATCH_ROWS)
+            except Exception as e:
+                # O 200 já foi enviado: sem o chunk final (0\r\n\r\n) e com a conexão
+                # fechada, o cliente vê a resposta incompleta em vez de um 2º cabeçalho
+                log_message(f"Erro durante /linhas, conexão encerrada: {e}")
+                raise ConnectionAbortedError(str(e)) from e
+            if not block:
+                break
+            self._write_chunk(writer, block)
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer, data):
+        writer.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+
+    # Ciclo de vida
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self._server = await asyncio.start_server(self.handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    def serve(self, host='127.0.0.1', port=8080, warm=False):
+        """Atende até Ctrl+C (com `warm`, calcula os agregados em segundo plano)"""
+        async def run():
+            bound = await self.start(host, port)
+            log_message(f"API em http://{host}:{bound} (armazenamento: {self.store.root})")
+            if warm:
+                self._warming = asyncio.create_task(asyncio.to_thread(self.store.warm))
+            async with self._server:
+                await self._server.serve_forever()
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+
+    def start_background(self, host='127.0.0.1', port=0):
+        """Inicia em uma thread (benchmarks); retorna a URL base"""
+        ready = threading.Event()
+        bound = {}
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            bound['port'] = self._loop.run_until_complete(self.start(host, port))
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return f"http://{host}:{bound['port']}"
+
+    def shutdown(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--store', default=partition_store.default_root(),
+                        help='diretório do armazenamento particionado')
+    parser.add_argument('--linha-do-tempo', default=None, help='diretório da linha do tempo')
+    parser.add_argument('--nomes', default=None, help='diretório do índice de nomes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--cache', type=int, default=CACHE_ENTRIES,
+                        help='respostas mantidas no cache (0 desliga)')
+    parser.add_argument('--ttl', type=float, default=CACHE_TTL, help='validade do cache (s)')
+    parser.add_argument('--aquecer', action='store_true',
+                        help='calcula os agregados de todos os períodos ao iniciar')
+    args = parser.parse_args(argv)
+
+    store = Store(args.store, args.linha_do_tempo, args.nomes)
+    ApiServer(store, args.cache, args.ttl).serve(args.host, args.porta, warm=args.aquecer)
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -1,9 +1,10 @@
-import pandas as pd
 import json
-import sys
-from datetime import datetime
 
-def get_data_from_browser():
+import page_sink
+
+OUTPUT_FILE = "/home/ubuntu/dados_portal_transparencia.csv"
+
+def get_data_from_browser(output_file=OUTPUT_FILE):
     """
     Este script deve ser executado após navegar para uma nova página no navegador.
     Ele irá extrair os dados da página atual e adicionar ao arquivo CSV existente.
@@ -62,71 +63,45 @@ def get_data_from_browser():
         
         print(f"✅ Dados encontrados: {len(page_data)} registros")
         
-        # Carregar dados existentes
+        # Carregar apenas o estado incremental (sem reler o CSV inteiro)
         try:
-            existing_df = pd.read_csv("/home/ubuntu/dados_portal_transparencia.csv")
-            print(f"📊 Registros existentes: {len(existing_df):,}")
+            state = page_sink.load_state(output_file)
+            print(f"📊 Registros existentes: {state['row_count']:,}")
         except FileNotFoundError:
             print("❌ Arquivo CSV principal não encontrado. Execute primeiro: python collect_all_data.py")
             return False
         
         # Verificar se já atingiu o limite
-        if len(existing_df) >= 20000:
+        if state['row_count'] >= page_sink.MAX_RECORDS:
             print("⚠️  Limite de 20.000 registros já atingido!")
             return False
         
-        # Preparar novos dados
-        headers = existing_df.columns.tolist()
-        
         # Filtrar e limpar novos dados
-        clean_data = []
-        for row in page_data:
-            if len(row) >= len(headers) and any(cell.strip() for cell in row):
-                # Ajustar tamanho da linha
-                if len(row) > len(headers):
-                    row = row[:len(headers)]
-                elif len(row) < len(headers):
-                    row.extend([''] * (len(headers) - len(row)))
-                clean_data.append(row)
+        clean_data = page_sink.clean_rows(page_data, state['headers'])
         
         if not clean_data:
             print("❌ Nenhum dado válido encontrado")
             return False
         
-        # Criar DataFrame com novos dados
-        new_df = pd.DataFrame(clean_data, columns=headers)
-        
-        # Combinar com dados existentes
-        combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-        
-        # Aplicar limite de 20.000 registros
-        if len(combined_df) > 20000:
-            combined_df = combined_df.head(20000)
+        # Acrescentar ao final do arquivo (limite de 20.000 aplicado pelo estado)
+        state, added = page_sink.append_rows(output_file, clean_data)
+        if added < len(clean_data):
             print(f"⚠️  Dados limitados a 20.000 registros")
         
-        # Salvar arquivo atualizado
-        output_file = "/home/ubuntu/dados_portal_transparencia.csv"
-        combined_df.to_csv(output_file, index=False, encoding='utf-8-sig')
-        
         print(f"✅ Dados atualizados com sucesso!")
         print(f"📁 Arquivo: {output_file}")
-        print(f"📊 Total de registros: {len(combined_df):,}")
-        print(f"📈 Novos registros adicionados: {len(new_df):,}")
-        print(f"🎯 Progresso: {len(combined_df)/20000*100:.1f}% do limite máximo")
+        print(f"📊 Total de registros: {state['row_count']:,}")
+        print(f"📈 Novos registros adicionados: {added:,}")
+        print(f"🎯 Progresso: {state['row_count']/page_sink.MAX_RECORDS*100:.1f}% do limite máximo")
         
-        # Mostrar estatísticas atualizadas
+        # Mostrar estatísticas atualizadas (mantidas no arquivo de estado)
         print(f"\n📈 ESTATÍSTICAS ATUALIZADAS:")
         print(f"Distribuição por UF (Top 10):")
-        uf_counts = combined_df['UF'].value_counts().head(10)
-        for uf, count in uf_counts.items():
+        for uf, count in page_sink.top_ufs(state):
             print(f"  {uf}: {count:,} registros")
         
         # Valor total
-        df_temp = combined_df.copy()
-        df_temp['Valor_Numerico'] = df_temp['Valor Disponibilizado (R$)'].str.replace(',', '.').str.replace('R$', '').str.strip()
-        df_temp['Valor_Numerico'] = pd.to_numeric(df_temp['Valor_Numerico'], errors='coerce')
-        total_valor = df_temp['Valor_Numerico'].sum()
-        print(f"\n💰 Valor total acumulado: R$ {total_valor:,.2f}")
+        print(f"\n💰 Valor total acumulado: R$ {state['total_valor']:,.2f}")
         
         # Remover arquivo temporário
         import os
@@ -152,5 +127,6 @@ if __name__ == "__main__":
     if success:
         print("\n🎉 Página processada com sucesso!")
         print("➡️  Para continuar: navegue para a próxima página e execute este script novamente")
+        print("💡 Para várias páginas, use: python ingest_watch.py (ingestão contínua de arquivos JSON)")
     else:
         print("\n❌ Falha ao processar a página")
@@ -0,0 +1,146 @@
+"""
+Leitura dos arquivos mensais do Portal com todos os membros CSV
+
+O Portal pode publicar um mês dividido em vários CSVs dentro do mesmo ZIP.
+Este módulo enumera todos os membros (nenhum é ignorado em silêncio), lê cada
+um em streaming direto do ZIP (descompressão e parse sem extrair para o disco)
+e, quando há vários membros e mais de um núcleo, processa os membros em
+paralelo em processos separados, cada um gravando um arquivo parcial.
+"""
+
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import schema_registry
+
+CSV_SUFFIX = '.csv'
+
+
+def is_zip(content):
+    return content[:2] == b'PK'
+
+
+def list_members(zip_file):
+    """(membros CSV em ordem, demais arquivos do ZIP)"""
+    csv_members, others = [], []
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+        if info.filename.lower().endswith(CSV_SUFFIX):
+            csv_members.append(info.filename)
+        else:
+            others.append(info.filename)
+    return csv_members, others
+
+
+def open_member(zip_file, name, encoding='utf-8', errors='ignore'):
+    """Texto de um membro em streaming (sem carregar o CSV inteiro)"""
+    return io.TextIOWrapper(zip_file.open(name), encoding=encoding, errors=errors, newline='')
+
+
+def combined_csv_text(zip_file, members, encoding='utf-8', errors='ignore', log=None):
+    """
+    Texto único com todos os membros (cabeçalho apenas do primeiro), para os
+    coletores que processam o mês inteiro em memória
+    """
+    parts = []
+    header = None
+    for name in members:
+        text = zip_file.read(name).decode(encoding, errors=errors)
+        first_line, _, body = text.partition('\n')
+        if header is None:
+            header = first_line
+            parts.append(text)
+        else:
+            if first_line.strip() != header.strip():
+                raise ValueError(f"cabeçalho de {name} difere do primeiro membro")
+            parts.append(body)
+        if parts[-1] and not parts[-1].endswith('\n'):
+            parts[-1] += '\n'
+        if log:
+            log(f"Membro {name}: {len(text):,} caracteres")
+    return ''.join(parts)
+
+
+def read_period_text(content, period=None, log=None):
+    """
+    Texto CSV completo de um download (ZIP com um ou mais membros ou CSV
+    direto), com o esquema verificado e a codificação detectada antes de
+    decodificar tudo. Lança schema_registry.SchemaRejected; retorna None se
+    o ZIP não tiver nenhum CSV.
+    """
+    if not is_zip(content):
+        schema = schema_registry.check_head(content[:schema_registry.HEAD_BYTES], period)
+        if log:
+            log(schema_registry.describe(schema))
+        schema_registry.require(schema, period or '')
+        return content.decode(schema['encoding'], errors='replace')
+
+    with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
+        members, others = list_members(zip_file)
+        if others and log:
+            log(f"Arquivos não-CSV ignorados no ZIP: {others}")
+        if not members:
+            return None
+        schema = schema_registry.check_zip_member(zip_file, members[0], period)
+        if log:
+            log(schema_registry.describe(schema))
+        schema_registry.require(schema, period or '')
+        return combined_csv_text(zip_file, members, schema['encoding'], 'replace', log)
+
+
+def member_workers(member_count, max_workers=None):
+    """Processos a usar: um por membro, limitado aos núcleos disponíveis"""
+    cpus = max_workers or os.cpu_count() or 1
+    return max(1, min(member_count, cpus))
+
+
+def spool_to_file(source, directory=None):
+    """
+    Grava o ZIP baixado (arquivo binário, lido desde o início) em um arquivo
+    temporário, para os processos o abrirem
+    """
+    fd, path = tempfile.mkstemp(suffix='.zip', dir=directory)
+    source.seek(0)
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(source, f)
+    return path
+
+
+def _run_member(worker, zip_path, name, part_path, args):
+    start = time.perf_counter()
+    result = worker(zip_path, name, part_path, *args)
+    result.setdefault('seconds', time.perf_counter() - start)
+    result['member'] = name
+    result['part_path'] = part_path
+    return result
+
+
+def process_members_parallel(zip_path, members, worker, part_dir, args=(), max_workers=None):
+    """
+    Executa worker(zip_path, membro, arquivo_parcial, *args) para cada membro
+    em um pool de processos, com os arquivos parciais em `part_dir`. `args` é
+    uma tupla comum a todos os membros ou uma lista com uma tupla por membro.
+    O worker deve ser uma função de módulo (picklable) e retornar um
+    dicionário de estatísticas. Retorna os resultados na ordem dos membros,
+    com 'member' e 'part_path' preenchidos.
+
+    `part_dir` é do chamador, que o remove depois de usar as partes, também
+    quando um worker falha (as partes já gravadas ficam nele).
+    """
+    member_args = args if isinstance(args, list) else [args] * len(members)
+    workers = member_workers(len(members), max_workers)
+    part_paths = [os.path.join(part_dir, f"parte_{i:04d}.csv") for i in range(len(members))]
+
+    # spawn: os processos não herdam o estado de instrumentação/tracemalloc do pai
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(_run_member, worker, zip_path, name, part, extra)
+                   for name, part, extra in zip(members, part_paths, member_args)]
+        return [future.result() for future in futures]
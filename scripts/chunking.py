@@ -0,0 +1,105 @@
+"""
+Leitura de CSV em chunks de tamanho adaptativo
+
+Em vez de um número fixo de linhas por chunk, o tamanho é calculado a partir
+de um orçamento de memória e do custo medido por linha (memory_usage do
+DataFrame). Máquinas com mais memória usam chunks maiores (menos overhead
+por chunk); máquinas menores usam chunks menores (sem risco de OOM).
+"""
+
+import os
+
+import pandas as pd
+
+INITIAL_ROWS = 50000
+MIN_ROWS = 5000
+MAX_ROWS = 5000000
+
+# O chunk lido convive com cópias intermediárias (mapeamento, chave de
+# deduplicação, buffer de escrita); o orçamento cobre esse conjunto todo
+WORKING_SET_FACTOR = 3.0
+
+_budget_bytes = None
+
+
+def available_memory_mb():
+    """Memória física disponível em MB (None se não for possível medir)"""
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_budget_mb(memory_limit_mb=None):
+    """
+    Orçamento padrão por chunk: 10% da memória disponível (ou do limite
+    configurado para o processo), entre 64 MB e 1 GB
+    """
+    reference = memory_limit_mb or available_memory_mb() or 2048
+    return max(64.0, min(1024.0, reference * 0.10))
+
+
+def configure(budget_mb=None):
+    """Define o orçamento de memória por chunk (None = padrão da máquina)"""
+    global _budget_bytes
+    _budget_bytes = (budget_mb or default_budget_mb()) * 1e6
+
+
+def budget_mb():
+    if _budget_bytes is None:
+        configure()
+    return _budget_bytes / 1e6
+
+
+def rows_for_budget(bytes_per_row, budget_bytes=None):
+    """Número de linhas que cabe no orçamento dado o custo por linha"""
+    budget_bytes = budget_bytes or budget_mb() * 1e6
+    rows = int(budget_bytes / (bytes_per_row * WORKING_SET_FACTOR))
+    return max(MIN_ROWS, min(MAX_ROWS, rows))
+
+
+def read_csv_chunks(source, stats=None, initial_rows=INITIAL_ROWS, **read_csv_kwargs):
+    """
+    Gera DataFrames lidos de `source` com tamanho ajustado ao orçamento.
+
+    `stats`, se fornecido, recebe: chunks, rows, min_rows, max_rows, bytes_per_row,
+    budget_mb.
+    """
+    budget_bytes = budget_mb() * 1e6
+    reader = pd.read_csv(source, iterator=True, **read_csv_kwargs)
+    rows = initial_rows
+
+    if stats is not None:
+        stats.update(chunks=0, rows=0, min_rows=None, max_rows=0, bytes_per_row=None,
+                     budget_mb=round(budget_bytes / 1e6, 1))
+
+    try:
+        while True:
+            try:
+                chunk = reader.get_chunk(rows)
+            except StopIteration:
+                break
+            if len(chunk) == 0:
+                break
+
+            bytes_per_row = chunk.memory_usage(deep=True, index=False).sum() / len(chunk)
+            if stats is not None:
+                stats['chunks'] += 1
+                stats['rows'] += len(chunk)
+                stats['min_rows'] = min(stats['min_rows'] or len(chunk), len(chunk))
+                stats['max_rows'] = max(stats['max_rows'], len(chunk))
+                stats['bytes_per_row'] = round(bytes_per_row, 1)
+
+            rows = rows_for_budget(bytes_per_row, budget_bytes)
+            yield chunk
+    finally:
+        reader.close()
+
+
+def describe(stats):
+    """Resumo de uma leitura para o log"""
+    if not stats.get('chunks'):
+        return "nenhum chunk lido"
+    return (f"{stats['chunks']} chunk(s) de {stats['min_rows']:,} a {stats['max_rows']:,} linhas "
+            f"(~{stats['bytes_per_row']:.0f} bytes/linha, "
+            f"orçamento {stats.get('budget_mb', budget_mb()):.0f} MB)")
@@ -4,15 +4,18 @@ Script para coletar TODOS os dados do Programa Pé-de-Meia do Portal da Transpar
 Baseado na análise das requisições de rede identificadas
 """
 
-import requests
 import pandas as pd
 import time
 import os
 from datetime import datetime, timedelta
-import zipfile
 import io
 import sys
 
+import archive_reader
+import config
+import http_transport
+import schema_registry
+
 def log_message(message):
     """Log com timestamp"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -23,24 +26,12 @@ def download_pe_de_meia_data(year, month):
     Baixa dados do Pé-de-Meia para um ano/mês específico
     Baseado no padrão identificado: /download-de-dados/pe-de-meia/YYYYMM
     """
-    # Formatar ano/mês no padrão YYYYMM
-    year_month = f"{year}{month:02d}"
-    
-    # URL baseada no padrão identificado
-    url = f"https://portaldatransparencia.gov.br/download-de-dados/pe-de-meia/{year_month}"
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
+    # URL baseada no padrão identificado (/pe-de-meia/YYYYMM)
+    url = http_transport.period_url(year, month)
     
     try:
         log_message(f"Baixando dados para {year}/{month:02d}...")
-        response = requests.get(url, headers=headers, timeout=60, stream=True)
+        response = http_transport.fetch(url, log=log_message)
         
         if response.status_code == 200:
             # Verificar se é um arquivo ZIP ou CSV
@@ -53,25 +44,12 @@ def download_pe_de_meia_data(year, month):
             # Ler o conteúdo
             content = response.content
             
-            # Se for um arquivo ZIP, extrair
-            if 'zip' in content_type or content.startswith(b'PK'):
-                log_message("Arquivo ZIP detectado, extraindo...")
-                with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
-                    # Listar arquivos no ZIP
-                    file_list = zip_file.namelist()
-                    log_message(f"Arquivos no ZIP: {file_list}")
-                    
-                    # Procurar por arquivo CSV
-                    csv_files = [f for f in file_list if f.endswith('.csv')]
-                    if csv_files:
-                        csv_content = zip_file.read(csv_files[0])
-                        return csv_content.decode('utf-8', errors='ignore')
-                    else:
-                        log_message("Nenhum arquivo CSV encontrado no ZIP")
-                        return None
-            else:
-                # Assumir que é CSV direto
-                return content.decode('utf-8', errors='ignore')
+            # ZIP (todos os CSVs) ou CSV direto, com o esquema verificado antes do parse
+            csv_content = archive_reader.read_period_text(content, f"{year}{month:02d}",
+                                                          log=log_message)
+            if csv_content is None:
+                log_message("Nenhum arquivo CSV encontrado no ZIP")
+            return csv_content
                 
         else:
             log_message(f"Erro ao baixar {year}/{month:02d}: Status {response.status_code}")
@@ -92,31 +70,9 @@ def process_csv_data(csv_content, year, month):
         log_message(f"Dados carregados: {len(df)} registros, {len(df.columns)} colunas")
         log_message(f"Colunas encontradas: {list(df.columns)}")
         
-        # Mapear colunas para o formato padrão (8 colunas)
-        # Baseado no formato já estabelecido
-        column_mapping = {
-            # Possíveis variações de nomes de colunas
-            'MES_REFERENCIA': 'Mês Referência',
-            'MÊS_REFERÊNCIA': 'Mês Referência',
-            'MES_REF': 'Mês Referência',
-            'MESREFERENCIA': 'Mês Referência',
-            'UF': 'UF',
-            'ESTADO': 'UF',
-            'MUNICIPIO': 'Município',
-            'MUNICÍPIO': 'Município',
-            'NOME_BENEFICIARIO': 'Beneficiário',
-            'BENEFICIARIO': 'Beneficiário',
-            'NOME_BENEFICIÁRIO': 'Beneficiário',
-            'CPF_BENEFICIARIO': 'CPF do Beneficiário',
-            'CPF_BENEFICIÁRIO': 'CPF do Beneficiário',
-            'CPF': 'CPF do Beneficiário',
-            'REPRESENTANTE_LEGAL': 'Representante Legal',
-            'VALOR_DISPONIBILIZADO': 'Valor Disponibilizado',
-            'VALOR': 'Valor Disponibilizado',
-        }
-        
-        # Renomear colunas
-        df_renamed = df.rename(columns=column_mapping)
+        # Mapear colunas para o formato padrão (8 colunas) a partir dos nomes
+        # canônicos do Portal (acentos e '_' normalizados)
+        df_renamed = df.rename(columns=schema_registry.columns_rename(df.columns))
         
         # Garantir que temos as 8 colunas necessárias
         required_columns = [
@@ -196,7 +152,9 @@ def main():
             log_message(f"✗ Falha no download para {year}/{month:02d}")
         
         # Pausa entre requisições para não sobrecarregar o servidor
-        time.sleep(2)
+        time.sleep(config.pause(2))
+    
+    http_transport.log_metrics(log_message)
     
     # Consolidar todos os dados
     if all_data:
@@ -213,7 +171,7 @@ def main():
         log_message(f"Duplicatas removidas: {initial_count - final_count}")
         
         # Salvar arquivo final
-        output_file = "/home/ubuntu/dados_portal_transparencia_completo.csv"
+        output_file = config.data_path("dados_portal_transparencia_completo.csv")
         final_df.to_csv(output_file, index=False, encoding='utf-8', sep=';')
         
         log_message(f"=== COLETA CONCLUÍDA ===")
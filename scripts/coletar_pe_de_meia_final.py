@@ -4,15 +4,17 @@ Script final corrigido para coletar TODOS os dados do Programa Pé-de-Meia
 Versão com correção do mapeamento de colunas
 """
 
-import requests
 import pandas as pd
 import time
 import os
 from datetime import datetime
-import zipfile
 import io
 import sys
 
+import archive_reader
+import config
+import http_transport
+
 def log_message(message):
     """Log com timestamp"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -24,33 +26,20 @@ def download_and_process_period(year, month):
     Baixa e processa dados para um período específico
     """
     year_month = f"{year}{month:02d}"
-    url = f"https://portaldatransparencia.gov.br/download-de-dados/pe-de-meia/{year_month}"
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
-        'Connection': 'keep-alive',
-    }
+    url = http_transport.period_url(year, month)
     
     try:
         log_message(f"Processando {year}/{month:02d}...")
-        response = requests.get(url, headers=headers, timeout=120, stream=True)
+        response = http_transport.fetch(url, log=log_message)
         
         if response.status_code == 200:
             content = response.content
             
-            # Verificar se é ZIP
-            if content.startswith(b'PK'):
-                with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
-                    csv_files = [f for f in zip_file.namelist() if f.endswith('.csv')]
-                    if csv_files:
-                        csv_content = zip_file.read(csv_files[0]).decode('utf-8', errors='ignore')
-                    else:
-                        log_message(f"✗ Nenhum CSV encontrado no ZIP para {year}/{month:02d}")
-                        return None
-            else:
-                csv_content = content.decode('utf-8', errors='ignore')
+            # ZIP (todos os CSVs) ou CSV direto, com o esquema verificado antes do parse
+            csv_content = archive_reader.read_period_text(content, year_month, log=log_message)
+            if csv_content is None:
+                log_message(f"✗ Nenhum CSV encontrado no ZIP para {year}/{month:02d}")
+                return None
             
             # Processar CSV diretamente
             df = pd.read_csv(io.StringIO(csv_content), 
@@ -165,7 +154,9 @@ def main():
             log_message(f"✗ Falha para {year}/{month:02d}")
         
         # Pausa entre requisições
-        time.sleep(2)
+        time.sleep(config.pause(2))
+    
+    http_transport.log_metrics(log_message)
     
     # Consolidar todos os dados
     if all_data:
@@ -182,7 +173,7 @@ def main():
         log_message(f"Duplicatas removidas: {initial_count - final_count}")
         
         # Salvar arquivo final
-        output_file = "/home/ubuntu/dados_portal_transparencia_completo.csv"
+        output_file = config.data_path("dados_portal_transparencia_completo.csv")
         final_df.to_csv(output_file, index=False, encoding='utf-8', sep=';')
         
         log_message(f"=== COLETA CONCLUÍDA COM SUCESSO ===")
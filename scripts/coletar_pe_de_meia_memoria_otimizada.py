@@ -4,14 +4,34 @@ Script ultra-otimizado para coletar dados do Programa Pé-de-Meia
 Versão com processamento chunk-by-chunk para economizar memória
 """
 
-import requests
 import pandas as pd
 import time
 import os
+import shutil
+import tempfile
 from datetime import datetime
 import zipfile
 import io
 import sys
+import argparse
+
+import anomalies
+import chunking
+import archive_reader
+import config
+import csv_writer
+import dedup_prefilter
+import http_transport
+import instrumentation
+import memory_tracking
+import name_search
+import partition_store
+import ranged_download
+import representative_index
+import schema_registry
+import sharded_dedup
+import timeline
+import validation
 
 def log_message(message):
     """Log com timestamp"""
@@ -19,154 +39,520 @@ def log_message(message):
     print(f"[{timestamp}] {message}")
     sys.stdout.flush()
 
-def process_period_to_file(year, month, output_file):
+def transform_chunk(chunk, year, month, rename=None):
     """
-    Baixa e processa dados para um período específico, salvando diretamente no arquivo final
+    Mapeia um chunk do CSV do Portal para as colunas de dados do armazenamento
+    particionado. Detalhar e Mês Referência são constantes no período e ficam
+    apenas nos metadados da partição; cada linha leva só o período (AAAAMM).
+
+    `rename` (coluna do arquivo -> coluna consolidada) vem da verificação do
+    esquema; sem ele, o mapeamento é deduzido das colunas do chunk.
     """
     year_month = f"{year}{month:02d}"
-    url = f"https://portaldatransparencia.gov.br/download-de-dados/pe-de-meia/{year_month}"
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
-        'Connection': 'keep-alive',
-    }
+    # Criar DataFrame resultado com o mesmo índice do chunk (senão a coluna
+    # constante fica vazia quando as demais são atribuídas)
+    result_chunk = pd.DataFrame(index=chunk.index)
+    
+    # Mapear colunas
+    result_chunk[partition_store.PERIOD_COLUMN] = year_month
+    sources = {target: source
+               for source, target in (rename or schema_registry.columns_rename(chunk.columns)).items()}
+    for column in partition_store.DATA_COLUMNS:
+        result_chunk[column] = chunk[sources[column]] if column in sources else ''
+    
+    return result_chunk
+
+def process_stream(text_stream, year, month, writer, schema, rejects=None):
+    """
+    Lê um CSV do Portal (texto em streaming) em chunks, valida, transforma e
+    escreve. Só as colunas usadas no consolidado (e na validação) são
+    convertidas pelo parser. Com a validação ligada, as linhas reprovadas vão
+    para `rejects` (CsvWriter) com os códigos dos motivos.
+    Retorna (registros, estatísticas da leitura, resumo da validação).
+    """
+    year_month = f"{year}{month:02d}"
+    total_processed = 0
+    read_stats = {}
+    quality = validation.new_summary()
+    rename = schema_registry.consolidated_rename(schema, extras=True)
+    fields = validation.fields_from_schema(schema) if validation.is_enabled() else {}
+    usecols = list(rename) + [c for c in fields.values() if c not in rename]
+    
+    # Processar CSV em chunks (tamanho ajustado ao orçamento de memória)
+    csv_reader = chunking.read_csv_chunks(text_stream,
+                                          stats=read_stats,
+                                          sep=schema['sep'],
+                                          usecols=usecols,
+                                          dtype=str)
+    
+    for chunk in instrumentation.timed_iter(csv_reader, 'parse', year_month):
+        if fields:
+            with instrumentation.stage('validate', year_month) as m:
+                valid, flags = validation.validate(chunk, fields, validation.municipios())
+                validation.update_summary(quality, flags)
+                m['rows'] = len(chunk)
+                if not valid.all():
+                    if rejects is not None:
+                        rejects.write(validation.reject_frame(chunk[~valid], flags[~valid],
+                                                              year_month, schema['rename']))
+                    chunk = chunk[valid]
+        
+        with instrumentation.stage('transform', year_month) as m:
+            result_chunk = transform_chunk(chunk, year, month, rename)
+            m['rows'] = len(result_chunk)
+        
+        # Salvar chunk no arquivo final
+        with instrumentation.stage('write', year_month) as m:
+            m['bytes'] = writer.write(result_chunk)
+            m['rows'] = len(result_chunk)
+        
+        total_processed += len(result_chunk)
+        
+        # Limpar memória
+        del result_chunk, chunk
+    
+    return total_processed, read_stats, quality
+
+def process_member_to_part(zip_path, member, part_path, year, month, budget_mb, schema,
+                           validation_settings=(True, None)):
+    """
+    Worker do pool de membros: processa um CSV do ZIP em um arquivo parcial
+    (sem cabeçalho), com os rejeitados em outro arquivo parcial, e devolve os
+    tempos por etapa para o processo principal
+    """
+    chunking.configure(budget_mb)
+    validation.configure(*validation_settings)
+    instrumentation.reset()  # o processo do pool é reutilizado entre membros
+    rejects_path = part_path + '.rejeitados'
+    with zipfile.ZipFile(zip_path) as zip_file, \
+            csv_writer.CsvWriter(part_path, header=False) as writer, \
+            csv_writer.CsvWriter(rejects_path, columns=validation.REJECT_COLUMNS,
+                                 header=False) as rejects:
+        rows, read_stats, quality = process_stream(
+            archive_reader.open_member(zip_file, member, schema['encoding'], 'replace'),
+            year, month, writer, schema, rejects)
+        columns = writer.columns
+    
+    stages = instrumentation.snapshot()['stages']
+    return {'rows': rows, 'columns': columns, 'read_stats': read_stats, 'quality': quality,
+            'rejects_path': rejects_path,
+            'stages': {name: stages[name] for name in ('parse', 'validate', 'transform', 'write')
+                       if name in stages}}
+
+def process_zip_members_parallel(zip_path, members, schemas, year, month, writer, max_workers,
+                                 rejects=None):
+    """
+    Processa os membros do ZIP em `zip_path` em paralelo e acrescenta as
+    partes ao arquivo de saída (e os rejeitados ao arquivo de rejeitados) na
+    ordem dos membros. Retorna (registros, resumo da validação).
+    """
+    year_month = f"{year}{month:02d}"
+    work_dir = os.path.dirname(os.path.abspath(writer.path))
+    workers = archive_reader.member_workers(len(members), max_workers)
+    part_dir = tempfile.mkdtemp(prefix='membros_', dir=work_dir)
+    quality = validation.new_summary()
+    
+    try:
+        results = archive_reader.process_members_parallel(
+            zip_path, members, process_member_to_part, part_dir,
+            args=[(year, month, chunking.budget_mb() / workers, schemas[name],
+                   validation.settings()) for name in members],
+            max_workers=workers)
+        
+        total_processed = 0
+        for result in results:
+            for name, stage in result['stages'].items():
+                instrumentation.record(name, year_month, stage['seconds'],
+                                       rows=stage['rows'], nbytes=stage['bytes'])
+            with instrumentation.stage('write', year_month) as m:
+                if result['rows']:
+                    m['bytes'] = writer.append_file(result['part_path'], result['rows'],
+                                                    result['columns'])
+            if rejects is not None and result['quality']['rejected']:
+                rejects.append_file(result['rejects_path'], result['quality']['rejected'])
+            validation.update_summary(quality, result['quality'])
+            total_processed += result['rows']
+            log_message(f"Membro {result['member']}: {result['rows']} registros "
+                        f"- {chunking.describe(result['read_stats'])}")
+        return total_processed, quality
+    
+    finally:
+        # Inclusive as partes já gravadas quando um worker falhou
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+def download_period(url, connections=ranged_download.DEFAULT_CONNECTIONS):
+    """
+    Baixa o arquivo de um período: em faixas paralelas (ranged_download) se o
+    servidor aceitar Range e `connections` > 1, senão (ou se o download em
+    faixas falhar) com o GET único de http_transport.
+
+    Retorna (status, arquivo binário aberto no início, caminho). O download
+    em faixas fica no disco: o arquivo é o próprio `.part` e o caminho é o
+    dele, que o chamador fecha e remove depois de processar. No GET único o
+    arquivo é o corpo em memória e o caminho é None.
+    """
+    if connections > 1:
+        part_path = config.data_path("dados_pe_de_meia_download.part")
+        result = None
+        try:
+            result = ranged_download.download(url, part_path, connections, log=log_message)
+        except (ranged_download.DownloadError, OSError) as e:
+            log_message(f"Download em faixas falhou ({e}), usando GET único")
+        finally:
+            if result is None and os.path.exists(part_path):
+                os.remove(part_path)
+        if result is not None:
+            log_message(f"Download em faixas: {ranged_download.describe(result)}")
+            return 200, open(part_path, 'rb'), part_path
+    response = http_transport.fetch(url, log=log_message)
+    return response.status_code, io.BytesIO(response.content), None
+
+def process_period_to_file(year, month, output_file, max_workers=None, rejects=None,
+                           connections=ranged_download.DEFAULT_CONNECTIONS):
+    """
+    Baixa e processa dados para um período específico, salvando diretamente no arquivo final
+
+    `output_file` pode ser um caminho (aberto em modo append só para este
+    período) ou um csv_writer.CsvWriter já aberto e compartilhado entre períodos
+    (ou um sharded_dedup.ShardWriter, que grava as linhas direto nos shards da
+    remoção de duplicatas em paralelo).
+    Todos os CSVs do ZIP são processados, em streaming; havendo vários membros
+    e mais de um núcleo, em paralelo (até `max_workers` processos). As linhas
+    reprovadas na validação vão para `rejects` (CsvWriter), se informado. O
+    download usa até `connections` conexões (download_period); o arquivo
+    baixado em faixas é lido direto do disco e removido ao final.
+    """
+    year_month = f"{year}{month:02d}"
+    url = http_transport.period_url(year, month)
+    source = download_path = None
     
     try:
         log_message(f"Processando {year}/{month:02d}...")
-        response = requests.get(url, headers=headers, timeout=120, stream=True)
+        with instrumentation.stage('download', year_month) as m:
+            status, source, download_path = download_period(url, connections)
+            m['bytes'] = source.seek(0, io.SEEK_END)
+            source.seek(0)
+        head = source.read(schema_registry.HEAD_BYTES)
+        source.seek(0)
         
-        if response.status_code == 200:
-            content = response.content
-            
-            # Verificar se é ZIP
-            if content.startswith(b'PK'):
-                with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
-                    csv_files = [f for f in zip_file.namelist() if f.endswith('.csv')]
-                    if csv_files:
-                        csv_content = zip_file.read(csv_files[0]).decode('utf-8', errors='ignore')
-                    else:
-                        log_message(f"✗ Nenhum CSV encontrado no ZIP para {year}/{month:02d}")
-                        return 0
-            else:
-                csv_content = content.decode('utf-8', errors='ignore')
-            
-            # Processar em chunks para economizar memória
-            chunk_size = 50000  # Processar 50k registros por vez
-            total_processed = 0
+        if status == 200:
             
-            # Verificar se arquivo de saída já existe para determinar se precisa escrever cabeçalho
-            write_header = not os.path.exists(output_file)
+            # Um único handle de escrita para todos os chunks (cabeçalho só em arquivo novo)
+            owns_writer = not isinstance(output_file, (csv_writer.CsvWriter,
+                                                       sharded_dedup.ShardWriter))
+            writer = csv_writer.CsvWriter(output_file, append=True) if owns_writer else output_file
             
-            # Processar CSV em chunks
-            csv_reader = pd.read_csv(io.StringIO(csv_content), 
-                                   sep=';', 
-                                   encoding='utf-8', 
-                                   dtype=str,
-                                   chunksize=chunk_size)
+            try:
+                if archive_reader.is_zip(head):
+                    # Listar os membros; a descompressão acontece durante o parse
+                    with instrumentation.stage('unzip', year_month) as m:
+                        zip_file = zipfile.ZipFile(source)
+                        members, others = archive_reader.list_members(zip_file)
+                        m['bytes'] = sum(zip_file.getinfo(name).file_size for name in members)
+                    
+                    if others:
+                        log_message(f"Arquivos não-CSV ignorados no ZIP de {year}/{month:02d}: {others}")
+                    if not members:
+                        log_message(f"✗ Nenhum CSV encontrado no ZIP para {year}/{month:02d}")
+                        return 0
+                    if len(members) > 1:
+                        log_message(f"{len(members)} CSVs no ZIP de {year}/{month:02d}: {members}")
+                    
+                    # Verificar o esquema de todos os membros antes do parse
+                    with instrumentation.stage('schema', year_month):
+                        schemas = {name: schema_registry.check_zip_member(zip_file, name, year_month)
+                                   for name in members}
+                    for name, schema in schemas.items():
+                        log_message(f"Membro {name}: {schema_registry.describe(schema)}")
+                        schema_registry.require(schema, f"{name} ({year}/{month:02d})")
+                    
+                    if archive_reader.member_workers(len(members), max_workers) > 1:
+                        if download_path is None:
+                            # GET único: os processos abrem o ZIP por um caminho
+                            download_path = archive_reader.spool_to_file(
+                                source, os.path.dirname(os.path.abspath(writer.path)))
+                        total_processed, quality = process_zip_members_parallel(
+                            download_path, members, schemas, year, month, writer, max_workers,
+                            rejects)
+                    else:
+                        total_processed = 0
+                        quality = validation.new_summary()
+                        for name in members:
+                            schema = schemas[name]
+                            rows, read_stats, member_quality = process_stream(
+                                archive_reader.open_member(zip_file, name, schema['encoding'],
+                                                           'replace'),
+                                year, month, writer, schema, rejects)
+                            validation.update_summary(quality, member_quality)
+                            total_processed += rows
+                            log_message(f"Membro {name}: {rows} registros "
+                                        f"- {chunking.describe(read_stats)}")
+                else:
+                    with instrumentation.stage('schema', year_month):
+                        schema = schema_registry.check_head(head, year_month)
+                    log_message(schema_registry.describe(schema))
+                    schema_registry.require(schema, f"{year}/{month:02d}")
+                    total_processed, read_stats, quality = process_stream(
+                        io.TextIOWrapper(source, encoding=schema['encoding'], errors='replace',
+                                         newline=''),
+                        year, month, writer, schema, rejects)
+                    log_message(f"Leitura: {chunking.describe(read_stats)}")
             
-            for chunk_num, chunk in enumerate(csv_reader):
-                log_message(f"Processando chunk {chunk_num + 1} de {year}/{month:02d} ({len(chunk)} registros)")
-                
-                # Criar DataFrame resultado para este chunk
-                result_chunk = pd.DataFrame()
-                
-                # Mapear colunas
-                result_chunk['Detalhar'] = f"https://portaldatransparencia.gov.br/beneficios/pe-de-meia/{year_month}"
-                result_chunk['Mês Referência'] = f"{month:02d}/{year}"
-                result_chunk['UF'] = chunk.get('UF', '')
-                result_chunk['Município'] = chunk.get('NOME MUNICPIO', chunk.get('NOME MUNICÍPIO', ''))
-                result_chunk['Beneficiário'] = chunk.get('NOME BENEFICIRIO', chunk.get('NOME BENEFICIÁRIO', ''))
-                result_chunk['CPF do Beneficiário'] = chunk.get('CPF BENEFICIRIO', chunk.get('CPF BENEFICIÁRIO', ''))
-                result_chunk['Representante Legal'] = chunk.get('NOME RESPONSVEL', chunk.get('NOME RESPONSÁVEL', ''))
-                result_chunk['Valor Disponibilizado'] = chunk.get('VALOR PARCELA', chunk.get('VALOR_DISPONIBILIZADO', ''))
-                
-                # Salvar chunk no arquivo final
-                result_chunk.to_csv(output_file, 
-                                  mode='a',  # Append mode
-                                  header=write_header,  # Escrever cabeçalho apenas na primeira vez
-                                  index=False, 
-                                  encoding='utf-8', 
-                                  sep=';')
-                
-                write_header = False  # Não escrever cabeçalho nos próximos chunks
-                total_processed += len(result_chunk)
-                
-                # Limpar memória
-                del result_chunk, chunk
+            finally:
+                if owns_writer:
+                    writer.close()
             
+            if validation.is_enabled():
+                log_message(f"Validação: {validation.describe(quality)}")
+            memory_tracking.capture_top_allocators(year_month)
             log_message(f"✓ Processado: {total_processed} registros para {year}/{month:02d}")
             return total_processed
             
         else:
-            log_message(f"✗ Erro {response.status_code} para {year}/{month:02d}")
+            log_message(f"✗ Erro {status} para {year}/{month:02d}")
             return 0
             
+    except memory_tracking.MemoryBudgetExceeded:
+        raise
+    except schema_registry.SchemaRejected as e:
+        log_message(f"✗ {e}")
+        return 0
     except Exception as e:
         log_message(f"✗ Erro ao processar {year}/{month:02d}: {e}")
         return 0
+    finally:
+        if source is not None:
+            source.close()
+        if download_path is not None and os.path.exists(download_path):
+            os.remove(download_path)
 
-def remove_duplicates_from_file(input_file, output_file):
+def record_dedup_by_period(periods, seconds):
+    """
+    Registra a etapa dedup de um chunk por período (`periods`: a coluna do
+    período), dividindo `seconds` pelo número de linhas de cada um
     """
-    Remove duplicatas do arquivo final processando em chunks
+    for year_month, rows in periods.value_counts(sort=False).items():
+        instrumentation.record('dedup', year_month, seconds * rows / len(periods), rows=int(rows))
+
+def remove_duplicates_from_file(input_file, store_root, compression=None, scanner=None,
+                                max_workers=None, prefilter=False, shards=None):
+    """
+    Remove duplicatas do arquivo temporário processando em chunks e grava os
+    registros únicos no armazenamento particionado por período
+
+    Com `compression` ('gzip' ou 'zstd') os arquivos das partições são
+    comprimidos durante a escrita. Com `scanner` (anomalies.AnomalyScanner),
+    cada chunk bruto (antes da remoção) também passa pela detecção de anomalias.
+    Com mais de um núcleo (ou `max_workers` > 1), as linhas são divididas por
+    hash da chave em shards deduplicados em paralelo (sharded_dedup): os de
+    `shards` (ShardWriter gravado durante a coleta, cujas linhas já passaram
+    pelo `scanner`) ou, sem ele, distribuídas a partir de `input_file`. Com
+    `prefilter`, as chaves passam antes por um filtro de Bloom (dedup_prefilter;
+    nos shards, um filtro por shard) e só as prováveis repetições vão ao
+    conjunto exato.
     """
     log_message("=== REMOVENDO DUPLICATAS ===")
     
     seen_combinations = set()
-    chunk_size = 100000
+    read_stats = {}
     total_original = 0
     total_unique = 0
     
     # Ler arquivo em chunks e escrever apenas registros únicos
-    write_header = True
+    start = time.perf_counter()
+    scan_seconds = 0.0
+    dedup_seconds = 0.0  # já registrado por período
+    dedup_rows = 0
+    candidates = None
     
     try:
-        for chunk_num, chunk in enumerate(pd.read_csv(input_file, sep=';', encoding='utf-8', dtype=str, chunksize=chunk_size)):
-            log_message(f"Processando chunk {chunk_num + 1} para remoção de duplicatas ({len(chunk)} registros)")
-            
-            total_original += len(chunk)
-            
-            # Criar chave única baseada em CPF e Mês Referência
-            chunk['unique_key'] = chunk['CPF do Beneficiário'].astype(str) + '|' + chunk['Mês Referência'].astype(str)
-            
-            # Filtrar apenas registros únicos
-            unique_chunk = chunk[~chunk['unique_key'].isin(seen_combinations)]
-            
-            # Adicionar novas combinações ao conjunto
-            seen_combinations.update(unique_chunk['unique_key'].tolist())
-            
-            # Remover coluna auxiliar
-            unique_chunk = unique_chunk.drop('unique_key', axis=1)
-            
-            if len(unique_chunk) > 0:
-                # Salvar chunk único
-                unique_chunk.to_csv(output_file, 
-                                  mode='a',
-                                  header=write_header,
-                                  index=False, 
-                                  encoding='utf-8', 
-                                  sep=';')
-                write_header = False
-                total_unique += len(unique_chunk)
-            
-            # Limpar memória
-            del chunk, unique_chunk
+        with partition_store.PartitionWriter(store_root, compression=compression) as writer:
+            sharded = None
+            if shards is not None:
+                # as anomalias já foram detectadas na coleta (ShardWriter)
+                sharded = sharded_dedup.dedup_shards(shards, writer, max_workers, log_message,
+                                                     prefilter) + (0.0,)
+            elif sharded_dedup.shard_workers(max_workers) > 1:
+                sharded = sharded_dedup.remove_duplicates(input_file, writer, max_workers,
+                                                          scanner, read_stats, log_message,
+                                                          prefilter)
+                if sharded is None:
+                    log_message(f"Cabeçalho de {input_file} fora do layout do coletor: "
+                                f"remoção de duplicatas serial")
+            if sharded is not None:
+                total_original, total_unique, scan_seconds = sharded
+                chunks = []
+            else:
+                if prefilter:
+                    candidates = dedup_prefilter.scan(input_file)
+                chunks = chunking.read_csv_chunks(input_file, stats=read_stats, sep=';',
+                                                  encoding='utf-8', dtype=str)
+            chunk_start = time.perf_counter()
+            for chunk in chunks:
+                total_original += len(chunk)
+                chunk_scan = 0.0
+                
+                if scanner is not None:
+                    scan_start = time.perf_counter()
+                    scanner.update(chunk)
+                    chunk_scan = time.perf_counter() - scan_start
+                    scan_seconds += chunk_scan
+                
+                # Com o pré-filtro, só as linhas com chave candidata vão ao conjunto exato
+                checked = chunk if candidates is None else chunk[candidates.probable(chunk)]
+                
+                # Criar chave única baseada em CPF e período (equivale ao Mês Referência)
+                unique_key = checked['CPF do Beneficiário'].astype(str) + '|' + checked[partition_store.PERIOD_COLUMN].astype(str)
+                
+                # Filtrar apenas registros únicos (inclusive repetidos dentro do próprio chunk)
+                repeated = unique_key.isin(seen_combinations) | unique_key.duplicated()
+                unique_chunk = chunk.drop(index=checked.index[repeated.to_numpy()])
+                
+                # Adicionar novas combinações ao conjunto
+                seen_combinations.update(unique_key[~repeated].tolist())
+                
+                if len(unique_chunk) > 0:
+                    # Salvar chunk único
+                    writer.write(unique_chunk)
+                    total_unique += len(unique_chunk)
+                
+                # Tempo do chunk (leitura inclusa) dividido entre os períodos pelas linhas
+                chunk_end = time.perf_counter()
+                chunk_seconds = chunk_end - chunk_start - chunk_scan
+                record_dedup_by_period(chunk[partition_store.PERIOD_COLUMN], chunk_seconds)
+                dedup_seconds += chunk_seconds
+                dedup_rows += len(chunk)
+                chunk_start = chunk_end
+                
+                # Limpar memória
+                del chunk, unique_chunk
+        
+        # O restante (pré-filtro, ordenação das partições no close) fica sem período
+        instrumentation.record('dedup', seconds=time.perf_counter() - start - scan_seconds
+                               - dedup_seconds, rows=total_original - dedup_rows)
+        if scanner is not None:
+            if shards is not None:
+                scan_seconds = shards.scan_seconds
+            instrumentation.record('anomalies', seconds=scan_seconds, rows=total_original)
         
+        if read_stats:
+            log_message(f"Leitura: {chunking.describe(read_stats)}")
         log_message(f"Registros originais: {total_original}")
         log_message(f"Registros únicos: {total_unique}")
         log_message(f"Duplicatas removidas: {total_original - total_unique}")
+        if candidates is not None:
+            log_message("Pré-filtro: " + dedup_prefilter.describe(
+                candidates.summary(total_original - total_unique, len(seen_combinations))))
         
         return total_unique
         
+    except memory_tracking.MemoryBudgetExceeded:
+        raise
     except Exception as e:
         log_message(f"Erro na remoção de duplicatas: {e}")
         return 0
 
-def main():
+def parse_args(argv=None):
+    """Opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Coleta ultra-otimizada dos dados do Pé-de-Meia")
+    parser.add_argument('--metricas', metavar='ARQUIVO.jsonl',
+                        help='grava um evento JSON por etapa/período medido')
+    parser.add_argument('--snapshot', metavar='ARQUIVO.json',
+                        help='grava o acumulado por etapa e período ao final')
+    parser.add_argument('--prometheus', metavar='ARQUIVO.prom',
+                        help='grava as métricas no formato textfile do Prometheus')
+    parser.add_argument('--metricas-http', metavar='ARQUIVO.json',
+                        help='grava ao final as métricas de transporte HTTP (requisições, '
+                             'novas tentativas, falhas, bytes, tempo)')
+    parser.add_argument('--profile-memory', '--perfil-memoria', dest='profile_memory',
+                        metavar='ARQUIVO.json', nargs='?', const='',
+                        help='amostra RSS e tracemalloc por etapa/chunk (relatório JSON opcional)')
+    parser.add_argument('--memoria-max-mb', type=float, default=None,
+                        help='falha a coleta se o RSS ultrapassar este orçamento')
+    parser.add_argument('--memoria-chunk-mb', type=float, default=None,
+                        help='memória alvo por chunk (padrão: 10%% da memória disponível '
+                             'ou de --memoria-max-mb, entre 64 MB e 1 GB)')
+    parser.add_argument('--compressao', choices=csv_writer.available_compressions(),
+                        default=None, help='comprime as partições e o CSV legado durante a escrita')
+    parser.add_argument('--processos', type=int, default=None,
+                        help='processos para meses com vários CSVs no ZIP e shards da '
+                             'remoção de duplicatas (padrão: núcleos)')
+    parser.add_argument('--conexoes-download', type=int,
+                        default=ranged_download.DEFAULT_CONNECTIONS,
+                        help='conexões por arquivo no download em faixas, se o servidor '
+                             'aceitar Range (1 desliga)')
+    parser.add_argument('--exportar-legado', action='store_true',
+                        help='gera também o CSV consolidado de 8 colunas '
+                             '(dados_portal_transparencia_completo.csv)')
+    parser.add_argument('--linha-do-tempo', action='store_true',
+                        help='agrupa os pagamentos por beneficiário ao final '
+                             '(pe_de_meia_linha_do_tempo/)')
+    parser.add_argument('--anomalias', action='store_true',
+                        help='detecta pagamentos repetidos, representantes com muitos '
+                             'beneficiários e saltos mensais por município '
+                             '(pe_de_meia_anomalias.csv)')
+    parser.add_argument('--indice-representantes', action='store_true',
+                        help='atualiza o índice representante legal -> beneficiários '
+                             '(pe_de_meia_representantes/)')
+    parser.add_argument('--indice-nomes', action='store_true',
+                        help='atualiza o índice de busca aproximada de nomes (pe_de_meia_nomes/)')
+    parser.add_argument('--pre-filtro', action='store_true',
+                        help='na remoção de duplicatas, separa as prováveis repetições com um '
+                             'filtro de Bloom (um por shard com --processos) antes do conjunto '
+                             'exato')
+    parser.add_argument('--sem-validacao', action='store_true',
+                        help='não valida UF, município, valor, CPF mascarado e data das linhas')
+    parser.add_argument('--municipios', metavar='ARQUIVO.csv', default=None,
+                        help='tabela de municípios (código SIAFI;UF) para validar os códigos')
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """
     Função principal ultra-otimizada
     """
+    args = parse_args(argv)
+    instrumentation.configure(events_path=args.metricas, prometheus_path=args.prometheus)
+    chunking.configure(args.memoria_chunk_mb or chunking.default_budget_mb(args.memoria_max_mb))
+    if args.profile_memory is not None or args.memoria_max_mb:
+        # Só --memoria-max-mb: orçamento pelo RSS, sem o custo do tracemalloc
+        memory_tracking.enable(budget_mb=args.memoria_max_mb,
+                               trace_python=args.profile_memory is not None)
+    validation.configure(enabled=not args.sem_validacao, municipios_path=args.municipios)
+    
+    try:
+        return run_collection(compression=args.compressao, export_legacy=args.exportar_legado,
+                              max_workers=args.processos, build_timeline=args.linha_do_tempo,
+                              detect_anomalies=args.anomalias,
+                              index_representatives=args.indice_representantes,
+                              index_names=args.indice_nomes, dedup_prefilter=args.pre_filtro,
+                              download_connections=args.conexoes_download)
+    except memory_tracking.MemoryBudgetExceeded as e:
+        log_message(f"✗ ERRO: {e}")
+        return False
+    finally:
+        instrumentation.log_summary(log_message)
+        instrumentation.write_prometheus()
+        if args.snapshot:
+            instrumentation.write_snapshot(args.snapshot)
+        if args.metricas_http:
+            http_transport.export_metrics(args.metricas_http)
+        if memory_tracking.is_enabled():
+            memory_tracking.log_summary(log_message)
+            if args.profile_memory:
+                memory_tracking.write_report(args.profile_memory)
+            memory_tracking.disable()
+
+def run_collection(compression=None, export_legacy=False, max_workers=None, build_timeline=False,
+                   detect_anomalies=False, index_representatives=False, index_names=False,
+                   dedup_prefilter=False,
+                   download_connections=ranged_download.DEFAULT_CONNECTIONS):
+    """
+    Baixa todos os períodos e consolida no armazenamento particionado
+    (e, se pedido, no CSV legado de 8 colunas, na linha do tempo por
+    beneficiário, na tabela de anomalias e nos índices de representantes e de
+    nomes)
+    """
     log_message("=== INICIANDO COLETA COMPLETA DOS DADOS PÉ-DE-MEIA (VERSÃO ULTRA-OTIMIZADA) ===")
     
     # Períodos para coletar
@@ -178,31 +564,61 @@ def main():
     
     log_message(f"Períodos a processar: {len(periods)}")
     
-    # Arquivo temporário para dados brutos
-    temp_file = "/home/ubuntu/dados_pe_de_meia_temp.csv"
-    final_file = "/home/ubuntu/dados_portal_transparencia_completo.csv"
+    # Arquivo temporário para dados brutos (ou shards da remoção em paralelo)
+    temp_file = config.data_path("dados_pe_de_meia_temp.csv")
+    shard_dir = config.data_path("dados_pe_de_meia_shards")
+    rejects_file = config.data_path("dados_pe_de_meia_rejeitados.csv")
+    store_root = partition_store.default_root()
+    final_file = csv_writer.output_path(config.data_path("dados_portal_transparencia_completo.csv"),
+                                        compression)
     
     # Remover arquivos existentes
-    for file_path in [temp_file, final_file]:
+    for file_path in [temp_file, final_file, rejects_file]:
         if os.path.exists(file_path):
             os.remove(file_path)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    partition_store.clear(store_root)
+    
+    # As anomalias usam as linhas antes da remoção de duplicatas
+    scanner = anomalies.AnomalyScanner() if detect_anomalies else None
+    
+    # Com mais de um processo, as linhas vão direto para os shards da remoção de
+    # duplicatas; K é escolhido antes da coleta, pelo tamanho esperado dos meses
+    shards = None
+    workers = sharded_dedup.shard_workers(max_workers)
+    if workers > 1:
+        shards = sharded_dedup.ShardWriter(
+            shard_dir, sharded_dedup.planned_shards(len(periods), workers), scanner)
+        log_message(f"Remoção de duplicatas em {shards.shards} shards ({workers} processos), "
+                    f"gravados durante a coleta")
+    else:
+        log_message("Remoção de duplicatas serial (1 processo)")
     
     total_records = 0
     successful_downloads = 0
     
-    # Processar cada período diretamente no arquivo
-    for year, month in periods:
-        records = process_period_to_file(year, month, temp_file)
-        
-        if records > 0:
-            total_records += records
-            successful_downloads += 1
-            log_message(f"✓ Sucesso: {records} registros coletados para {year}/{month:02d}")
-        else:
-            log_message(f"✗ Falha para {year}/{month:02d}")
-        
-        # Pausa entre requisições
-        time.sleep(2)
+    # Processar cada período diretamente no arquivo (um handle aberto para toda a coleta)
+    with shards or csv_writer.CsvWriter(temp_file) as temp_writer, \
+            csv_writer.CsvWriter(rejects_file, columns=validation.REJECT_COLUMNS) as rejects:
+        for year, month in periods:
+            records = process_period_to_file(year, month, temp_writer, max_workers, rejects,
+                                             download_connections)
+            
+            if records > 0:
+                total_records += records
+                successful_downloads += 1
+                log_message(f"✓ Sucesso: {records} registros coletados para {year}/{month:02d}")
+            else:
+                log_message(f"✗ Falha para {year}/{month:02d}")
+            
+            # Pausa entre requisições
+            time.sleep(config.pause(2))
+    
+    http_transport.log_metrics(log_message)
+    if rejects.rows_written:
+        log_message(f"Registros rejeitados na validação: {rejects.rows_written} ({rejects_file})")
+    elif os.path.exists(rejects_file):
+        os.remove(rejects_file)
     
     if total_records > 0:
         log_message(f"=== DADOS COLETADOS ===")
@@ -210,18 +626,47 @@ def main():
         log_message(f"Downloads bem-sucedidos: {successful_downloads}/{len(periods)}")
         
         # Remover duplicatas
-        unique_records = remove_duplicates_from_file(temp_file, final_file)
+        unique_records = remove_duplicates_from_file(temp_file, store_root, compression, scanner,
+                                                     max_workers, dedup_prefilter, shards)
         
         if unique_records > 0:
             log_message(f"=== COLETA CONCLUÍDA COM SUCESSO ===")
-            log_message(f"Arquivo final: {final_file}")
+            log_message(f"Armazenamento: {store_root}")
             log_message(f"Total de registros únicos: {unique_records}")
             
+            if export_legacy:
+                with instrumentation.stage('export') as m:
+                    m['rows'] = partition_store.export_legacy(store_root, final_file, compression)
+                    m['bytes'] = os.path.getsize(final_file)
+                log_message(f"CSV legado: {final_file}")
+            
+            if build_timeline:
+                with instrumentation.stage('timeline') as m:
+                    m['rows'] = timeline.build(store_root, log=log_message)['payments']
+                log_message(f"Linha do tempo: {timeline.default_root()}")
+            
+            if index_representatives:
+                with instrumentation.stage('representatives') as m:
+                    m['rows'] = representative_index.update(store_root=store_root,
+                                                            log=log_message)['edges']
+                log_message(f"Índice de representantes: {representative_index.default_root()}")
+            
+            if index_names:
+                with instrumentation.stage('names') as m:
+                    m['rows'] = name_search.update(store_root=store_root, log=log_message)['names']
+                log_message(f"Índice de nomes: {name_search.default_root()}")
+            
+            if scanner is not None:
+                anomalies_file = anomalies.default_output()
+                anomalies.write_findings(scanner.findings(), anomalies_file)
+                log_message(f"Anomalias: {scanner.summary()} ({anomalies_file})")
+            
             # Mostrar estatísticas básicas
             log_message("=== ESTATÍSTICAS BÁSICAS ===")
             try:
                 # Ler apenas uma amostra para estatísticas
-                sample = pd.read_csv(final_file, sep=';', encoding='utf-8', dtype=str, nrows=10000)
+                first_period = partition_store.list_periods(store_root)[0]
+                sample = next(partition_store.read_chunks(store_root, first_period)).head(10000)
                 log_message(f"Estados únicos (amostra): {sample['UF'].nunique()}")
                 log_message(f"Municípios únicos (amostra): {sample['Município'].nunique()}")
                 log_message(f"Colunas: {list(sample.columns)}")
@@ -234,9 +679,10 @@ def main():
             except Exception as e:
                 log_message(f"Erro ao calcular estatísticas: {e}")
             
-            # Limpar arquivo temporário
+            # Limpar arquivo temporário e shards
             if os.path.exists(temp_file):
                 os.remove(temp_file)
+            shutil.rmtree(shard_dir, ignore_errors=True)
             
             return True
         else:
@@ -4,22 +4,24 @@ Script otimizado para coletar TODOS os dados do Programa Pé-de-Meia
 Versão melhorada com tratamento de memória e processamento em lotes
 """
 
-import requests
 import pandas as pd
 import time
 import os
 from datetime import datetime
-import zipfile
-import io
 import sys
 
+import archive_reader
+import config
+import http_transport
+import schema_registry
+
 def log_message(message):
     """Log com timestamp"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] {message}")
     sys.stdout.flush()
 
-def download_and_save_data(year, month, output_dir="/home/ubuntu/pe_de_meia_temp"):
+def download_and_save_data(year, month, output_dir=config.data_path("pe_de_meia_temp")):
     """
     Baixa e salva dados para um período específico
     """
@@ -27,34 +29,20 @@ def download_and_save_data(year, month, output_dir="/home/ubuntu/pe_de_meia_temp
     os.makedirs(output_dir, exist_ok=True)
     
     year_month = f"{year}{month:02d}"
-    url = f"https://portaldatransparencia.gov.br/download-de-dados/pe-de-meia/{year_month}"
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
-        'Connection': 'keep-alive',
-    }
+    url = http_transport.period_url(year, month)
     
     try:
         log_message(f"Baixando dados para {year}/{month:02d}...")
-        response = requests.get(url, headers=headers, timeout=120, stream=True)
+        response = http_transport.fetch(url, log=log_message)
         
         if response.status_code == 200:
             content = response.content
             
-            # Verificar se é ZIP
-            if content.startswith(b'PK'):
-                log_message("Arquivo ZIP detectado, extraindo...")
-                with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
-                    csv_files = [f for f in zip_file.namelist() if f.endswith('.csv')]
-                    if csv_files:
-                        csv_content = zip_file.read(csv_files[0]).decode('utf-8', errors='ignore')
-                    else:
-                        log_message("Nenhum CSV encontrado no ZIP")
-                        return False
-            else:
-                csv_content = content.decode('utf-8', errors='ignore')
+            # ZIP (todos os CSVs) ou CSV direto, com o esquema verificado antes do parse
+            csv_content = archive_reader.read_period_text(content, year_month, log=log_message)
+            if csv_content is None:
+                log_message("Nenhum CSV encontrado no ZIP")
+                return False
             
             # Salvar arquivo temporário
             temp_file = os.path.join(output_dir, f"pe_de_meia_{year_month}.csv")
@@ -91,27 +79,7 @@ def process_single_file(file_path, year, month):
         # Mapear colunas (case-insensitive)
         df.columns = df.columns.str.upper().str.strip()
         
-        column_mapping = {
-            'MES_REFERENCIA': 'Mês Referência',
-            'MÊS_REFERÊNCIA': 'Mês Referência', 
-            'MESREFERENCIA': 'Mês Referência',
-            'UF': 'UF',
-            'ESTADO': 'UF',
-            'MUNICIPIO': 'Município',
-            'MUNICÍPIO': 'Município',
-            'NOME_BENEFICIARIO': 'Beneficiário',
-            'BENEFICIARIO': 'Beneficiário',
-            'NOME_BENEFICIÁRIO': 'Beneficiário',
-            'CPF_BENEFICIARIO': 'CPF do Beneficiário',
-            'CPF_BENEFICIÁRIO': 'CPF do Beneficiário',
-            'CPF': 'CPF do Beneficiário',
-            'REPRESENTANTE_LEGAL': 'Representante Legal',
-            'VALOR_DISPONIBILIZADO': 'Valor Disponibilizado',
-            'VALOR': 'Valor Disponibilizado',
-        }
-        
-        # Renomear colunas encontradas
-        df = df.rename(columns=column_mapping)
+        df = df.rename(columns=schema_registry.columns_rename(df.columns))
         
         # Criar DataFrame final com as 8 colunas necessárias
         final_columns = [
@@ -171,7 +139,9 @@ def main():
         file_path = download_and_save_data(year, month)
         if file_path:
             downloaded_files.append((file_path, year, month))
-        time.sleep(1)  # Pausa menor entre downloads
+        time.sleep(config.pause(1))  # Pausa menor entre downloads
+    
+    http_transport.log_metrics(log_message)
     
     log_message(f"Downloads concluídos: {len(downloaded_files)}/{len(periods)}")
     
@@ -201,7 +171,7 @@ def main():
             batch_df = pd.concat(batch_data, ignore_index=True)
             
             # Salvar lote processado
-            batch_file = f"/home/ubuntu/pe_de_meia_batch_{i//batch_size + 1}.csv"
+            batch_file = config.data_path(f"pe_de_meia_batch_{i//batch_size + 1}.csv")
             batch_df.to_csv(batch_file, index=False, encoding='utf-8', sep=';')
             all_processed_files.append(batch_file)
             
@@ -232,7 +202,7 @@ def main():
     log_message(f"Registros após remoção de duplicatas: {final_count}")
     
     # Salvar arquivo final
-    output_file = "/home/ubuntu/dados_portal_transparencia_completo.csv"
+    output_file = config.data_path("dados_portal_transparencia_completo.csv")
     final_df.to_csv(output_file, index=False, encoding='utf-8', sep=';')
     
     log_message("=== COLETA CONCLUÍDA COM SUCESSO ===")
@@ -249,8 +219,8 @@ def main():
     # Limpeza de arquivos temporários
     log_message("Limpando arquivos temporários...")
     import shutil
-    if os.path.exists("/home/ubuntu/pe_de_meia_temp"):
-        shutil.rmtree("/home/ubuntu/pe_de_meia_temp")
+    if os.path.exists(config.data_path("pe_de_meia_temp")):
+        shutil.rmtree(config.data_path("pe_de_meia_temp"))
     
     for batch_file in all_processed_files:
         if os.path.exists(batch_file):
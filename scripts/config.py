@@ -0,0 +1,32 @@
+"""
+Configuração compartilhada pelos scripts de coleta
+
+Os valores padrão reproduzem o ambiente original da coleta; cada um pode ser
+sobrescrito por variável de ambiente (usado, por exemplo, pelos benchmarks
+para apontar a coleta para um servidor local e um diretório temporário).
+"""
+
+import os
+
+# Diretório onde os coletores gravam arquivos temporários e o CSV final
+DATA_DIR = os.environ.get('PE_DE_MEIA_DATA_DIR', "/home/ubuntu")
+
+# Endereço base dos arquivos mensais (/pe-de-meia/AAAAMM)
+PORTAL_DOWNLOAD_URL = os.environ.get(
+    'PE_DE_MEIA_PORTAL_URL',
+    "https://portaldatransparencia.gov.br/download-de-dados/pe-de-meia",
+)
+
+# Pausa entre requisições ao Portal, em segundos (None = padrão de cada coletor)
+_pause = os.environ.get('PE_DE_MEIA_PAUSA')
+REQUEST_PAUSE = float(_pause) if _pause is not None else None
+
+
+def data_path(*parts):
+    """Caminho dentro de DATA_DIR"""
+    return os.path.join(DATA_DIR, *parts)
+
+
+def pause(default):
+    """Pausa entre requisições (respeita PE_DE_MEIA_PAUSA se definida)"""
+    return default if REQUEST_PAUSE is None else REQUEST_PAUSE
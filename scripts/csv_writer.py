@@ -0,0 +1,234 @@
+"""
+Escrita rápida de CSV para os arquivos consolidados
+
+Mantém um único handle bufferizado aberto por arquivo de saída e formata os
+chunks coluna a coluna (junção vetorizada das strings), em vez de reabrir o
+arquivo e formatar linha a linha a cada chunk como o DataFrame.to_csv.
+Opcionalmente comprime (gzip ou zstd) em uma thread separada, de forma que a
+compressão roda em paralelo com a formatação do próximo chunk.
+
+Saída idêntica à do to_csv(sep=';', index=False): aspas apenas quando o
+valor contém o separador, aspas ou quebra de linha; valores nulos vazios.
+"""
+
+import codecs
+import os
+import queue
+import threading
+import zlib
+
+import pandas as pd
+
+BUFFER_SIZE = 8 * 1024 * 1024
+QUEUE_SIZE = 4  # blocos pendentes de compressão (limita a memória)
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def available_compressions():
+    """Compressões suportadas neste ambiente"""
+    methods = ['gzip']
+    try:
+        import zstandard  # noqa: F401
+        methods.append('zstd')
+    except ImportError:
+        pass
+    return methods
+
+
+def output_path(path, compression=None):
+    """Acrescenta a extensão da compressão ao caminho (se ainda não tiver)"""
+    suffix = COMPRESSION_SUFFIXES.get(compression, '')
+    return path if path.endswith(suffix) else path + suffix
+
+
+def _quote(value):
+    return '"' + value.replace('"', '""') + '"'
+
+
+def column_values(series):
+    """Valores da coluna como lista de str (nulos viram '')"""
+    values = series.to_numpy(dtype=object, na_value='').tolist()
+    if not pd.api.types.is_string_dtype(series.dtype) or series.dtype == object:
+        values = [v if isinstance(v, str) else str(v) for v in values]
+    return values
+
+
+def format_column(values, sep=';'):
+    """Lista de strings da coluna, com aspas apenas onde necessário"""
+    joined = '\x00'.join(values)
+    if sep in joined or '"' in joined or '\n' in joined or '\r' in joined:
+        specials = (sep, '"', '\n', '\r')
+        values = [_quote(v) if any(ch in v for ch in specials) else v for v in values]
+    return values
+
+
+def format_rows(df, sep=';'):
+    """Texto CSV (sem cabeçalho) de um DataFrame"""
+    if len(df) == 0:
+        return ''
+    columns = [format_column(column_values(df[col]), sep) for col in df.columns]
+    return '\n'.join(map(sep.join, zip(*columns))) + '\n'
+
+
+def format_header(columns, sep=';'):
+    return sep.join(format_column([str(c) for c in columns], sep)) + '\n'
+
+
+class _Compressor:
+    """Thread que comprime e grava os blocos recebidos pela fila"""
+
+    def __init__(self, raw, compression, level):
+        if compression == 'gzip':
+            self._codec = zlib.compressobj(level if level is not None else 6, zlib.DEFLATED, 31)
+            self._flush = self._codec.flush
+        elif compression == 'zstd':
+            import zstandard
+            self._codec = zstandard.ZstdCompressor(level=level if level is not None else 3,
+                                                   threads=-1).compressobj()
+            self._flush = self._codec.flush
+        else:
+            raise ValueError(f"compressão não suportada: {compression}")
+        self._raw = raw
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                break
+            if self._error is None:
+                try:
+                    self._raw.write(self._codec.compress(block))
+                except Exception as e:
+                    self._error = e
+        if self._error is None:
+            self._raw.write(self._flush())
+
+    def write(self, block):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(block)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+class CsvWriter:
+    """
+    Escritor de CSV com handle único:
+
+        with CsvWriter(caminho, colunas) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+
+    Em modo append o cabeçalho só é escrito se o arquivo estiver vazio.
+    `bytes_written` conta os bytes do CSV antes da compressão. Com
+    encoding='utf-8-sig' o BOM é gravado uma única vez, no início do arquivo.
+    """
+
+    def __init__(self, path, columns=None, sep=';', encoding='utf-8', compression=None,
+                 level=None, append=False, header=True, buffer_size=BUFFER_SIZE):
+        if compression and append:
+            raise ValueError("append não é suportado com compressão")
+        self.path = output_path(path, compression)
+        self.columns = list(columns) if columns is not None else None
+        self.sep = sep
+        self.encoding = encoding
+        self.rows_written = 0
+        self.bytes_written = 0
+
+        existing = append and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        self._raw = open(self.path, 'ab' if append else 'wb', buffering=buffer_size)
+        self._compressor = _Compressor(self._raw, compression, level) if compression else None
+        self._header_pending = header and not existing
+        if self.encoding.lower().replace('_', '-') == 'utf-8-sig':
+            # str.encode('utf-8-sig') repetiria o BOM em cada chunk
+            self.encoding = 'utf-8'
+            if not existing:
+                self._emit_bytes(codecs.BOM_UTF8)
+
+    def _emit(self, text):
+        return self._emit_bytes(text.encode(self.encoding))
+
+    def _emit_bytes(self, block):
+        if self._compressor is not None:
+            self._compressor.write(block)
+        else:
+            self._raw.write(block)
+        self.bytes_written += len(block)
+        return len(block)
+
+    def write(self, df):
+        """Escreve um chunk; retorna os bytes (não comprimidos) escritos"""
+        if self.columns is None:
+            self.columns = list(df.columns)
+        elif list(df.columns) != self.columns:
+            df = df[self.columns]
+
+        nbytes = 0
+        if self._header_pending:
+            nbytes += self._emit(format_header(self.columns, self.sep))
+            self._header_pending = False
+        nbytes += self._emit(format_rows(df, self.sep))
+        self.rows_written += len(df)
+        return nbytes
+
+    def write_text(self, text, rows):
+        """Acrescenta linhas já formatadas (ex.: JSON lines); retorna os bytes"""
+        nbytes = 0
+        if self._header_pending and self.columns is not None:
+            nbytes += self._emit(format_header(self.columns, self.sep))
+            self._header_pending = False
+        nbytes += self._emit(text)
+        self.rows_written += rows
+        return nbytes
+
+    def write_bytes(self, block, rows=0):
+        """Acrescenta bytes já codificados (ex.: trechos copiados de outro CSV)"""
+        self.rows_written += rows
+        return self._emit_bytes(block)
+
+    def append_file(self, path, rows, columns=None):
+        """
+        Acrescenta um arquivo já formatado com o mesmo separador e codificação
+        e sem cabeçalho (ex.: partes gravadas em paralelo). Retorna os bytes.
+        """
+        if self.columns is None:
+            self.columns = list(columns)
+        nbytes = 0
+        if self._header_pending:
+            nbytes += self._emit(format_header(self.columns, self.sep))
+            self._header_pending = False
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(BUFFER_SIZE)
+                if not block:
+                    break
+                nbytes += self._emit_bytes(block)
+        self.rows_written += rows
+        return nbytes
+
+    def close(self):
+        if self._raw.closed:
+            return
+        try:
+            if self._header_pending and self.columns is not None:
+                self._emit(format_header(self.columns, self.sep))
+                self._header_pending = False
+            if self._compressor is not None:
+                self._compressor.close()
+        finally:
+            self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,159 @@
+"""
+Pré-filtro probabilístico da remoção de duplicatas (filtro de Bloom)
+
+Na remoção serial, cada linha passa pelo conjunto exato de chaves (um `set`
+de strings "CPF|período" que guarda todas as chaves já vistas); na remoção em
+shards (sharded_dedup), pelas chaves já vistas do shard. Como quase todas as
+linhas são únicas, o pré-filtro separa antes as chaves que podem se repetir:
+
+    1. scan: lê só as colunas da chave e passa o hash de cada linha por um
+       filtro de Bloom dimensionado pelo número de linhas do arquivo
+       (BITS_PER_KEY bits por linha). Uma linha cuja chave o filtro já
+       "conhece" é uma provável repetição, e sua chave vira candidata;
+    2. na remoção, só as linhas com chave candidata passam pelo conjunto
+       exato. As demais aparecem uma única vez no arquivo (toda repetição
+       real é marcada no passo 1, inclusive a primeira ocorrência, que tem a
+       mesma chave) e são mantidas sem consulta.
+
+O conjunto exato fica com as chaves candidatas (duplicatas reais e falsos
+positivos do filtro) em vez de todas as chaves; describe() informa a memória
+do filtro e a taxa de falsos positivos observada. Nos shards, cada shard tem o
+seu filtro (dimensionado pelas linhas do shard) e combine() soma os resumos.
+"""
+
+import numpy as np
+import pandas as pd
+
+import chunking
+import row_groups
+import sharded_dedup
+
+BITS_PER_KEY = row_groups.BLOOM_BITS_PER_KEY
+HASHES = row_groups.BLOOM_HASHES
+BUFFER_SIZE = 1 << 20
+
+
+def count_lines(path):
+    """Linhas de dados do arquivo (sem o cabeçalho), contando as quebras de linha"""
+    lines = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(BUFFER_SIZE)
+            if not block:
+                break
+            lines += block.count(b'\n')
+    return max(lines - 1, 0)
+
+
+class BloomFilter:
+    """Filtro de Bloom de chaves uint64 (hash duplo, como o de row_groups)"""
+
+    def __init__(self, expected_keys, bits_per_key=BITS_PER_KEY, hashes=HASHES):
+        self.bits = max(64, int(expected_keys) * bits_per_key)
+        self.hashes = hashes
+        self.expected_keys = int(expected_keys)
+        self.array = np.zeros((self.bits + 7) // 8, dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    def expected_fp_rate(self):
+        """Taxa teórica de falsos positivos com o número de chaves esperado"""
+        if not self.expected_keys:
+            return 0.0
+        return (1 - np.exp(-self.hashes * self.expected_keys / self.bits)) ** self.hashes
+
+    def _positions(self, keys):
+        keys = np.asarray(keys, dtype=np.uint64)
+        h1 = keys & np.uint64(0xFFFFFFFF)
+        h2 = (keys >> np.uint64(32)) | np.uint64(1)
+        for step in range(self.hashes):
+            yield (h1 + np.uint64(step) * h2) % np.uint64(self.bits)
+
+    def contains(self, keys):
+        """True para as chaves possivelmente adicionadas (sem falsos negativos)"""
+        found = np.ones(len(keys), dtype=bool)
+        for position in self._positions(keys):
+            found &= ((self.array[position >> np.uint64(3)]
+                       >> (position & np.uint64(7)).astype(np.uint8)) & 1).astype(bool)
+        return found
+
+    def add(self, keys):
+        for position in self._positions(keys):
+            np.bitwise_or.at(self.array, position >> np.uint64(3),
+                             np.left_shift(1, position & np.uint64(7)).astype(np.uint8))
+
+
+class DuplicatePrefilter:
+    """Chaves candidatas a repetição de um arquivo (resultado de scan)"""
+
+    def __init__(self, bloom, candidates, rows, flagged):
+        self.bloom = bloom
+        self.candidates = candidates  # hashes candidatos, ordenados e únicos
+        self.rows = rows
+        self.flagged = flagged  # linhas marcadas como prováveis repetições
+
+    def probable(self, chunk):
+        """Máscara das linhas do chunk cuja chave é candidata"""
+        keys = sharded_dedup.key_hashes(chunk)
+        if not len(self.candidates):
+            return np.zeros(len(keys), dtype=bool)
+        position = np.minimum(np.searchsorted(self.candidates, keys), len(self.candidates) - 1)
+        return self.candidates[position] == keys
+
+    def summary(self, duplicates, exact_keys):
+        """Memória e falsos positivos, dadas as duplicatas removidas de fato"""
+        false_positives = max(self.flagged - duplicates, 0)
+        unique = self.rows - duplicates
+        return {
+            'rows': self.rows,
+            'bloom_bytes': self.bloom.nbytes,
+            'candidate_bytes': self.candidates.nbytes,
+            'candidates': len(self.candidates),
+            'exact_keys': exact_keys,
+            'flagged': self.flagged,
+            'false_positives': false_positives,
+            'fp_rate': false_positives / unique if unique else 0.0,
+            'expected_fp_rate': self.bloom.expected_fp_rate(),
+        }
+
+
+def scan(input_file, expected_rows=None, stats=None):
+    """Passa as chaves de `input_file` pelo filtro e retorna o DuplicatePrefilter"""
+    bloom = BloomFilter(expected_rows if expected_rows is not None else count_lines(input_file))
+    candidates = []
+    rows = flagged = 0
+    for chunk in chunking.read_csv_chunks(input_file, stats=stats, sep=';', encoding='utf-8',
+                                          dtype=str, usecols=sharded_dedup.KEY_COLUMNS):
+        keys = sharded_dedup.key_hashes(chunk)
+        # repetida no filtro (linhas anteriores) ou dentro do próprio chunk
+        probable = bloom.contains(keys) | pd.Series(keys).duplicated().to_numpy()
+        candidates.append(keys[probable])
+        flagged += int(probable.sum())
+        bloom.add(keys)
+        rows += len(chunk)
+    candidates = np.unique(np.concatenate(candidates)) if candidates \
+        else np.empty(0, dtype=np.uint64)
+    return DuplicatePrefilter(bloom, candidates, rows, flagged)
+
+
+def combine(summaries):
+    """Resumo somado de vários pré-filtros (ex.: um por shard, sharded_dedup)"""
+    total = {field: sum(summary[field] for summary in summaries)
+             for field in ('rows', 'bloom_bytes', 'candidate_bytes', 'candidates', 'exact_keys',
+                           'flagged', 'false_positives')}
+    unique = sum(summary['rows'] - summary['flagged'] + summary['false_positives']
+                 for summary in summaries)
+    total['fp_rate'] = total['false_positives'] / unique if unique else 0.0
+    total['expected_fp_rate'] = max((summary['expected_fp_rate'] for summary in summaries),
+                                    default=0.0)
+    return total
+
+
+def describe(summary):
+    return (f"filtro de Bloom {summary['bloom_bytes'] / 2**20:.1f} MB, "
+            f"{summary['candidates']:,} chaves candidatas, "
+            f"{summary['exact_keys']:,} no conjunto exato (de {summary['rows']:,} linhas); "
+            f"falsos positivos {summary['false_positives']:,} "
+            f"({summary['fp_rate']:.3%}; {summary['expected_fp_rate']:.3%} com o filtro cheio)")
@@ -0,0 +1,372 @@
+"""
+Exportação para vários formatos em uma única leitura do armazenamento
+
+    engine = ExportEngine(store_root)
+    engine.add(CsvSink('legado.csv', columns=LEGACY_COLUMNS))
+    engine.add(JsonLinesSink('dados.jsonl', where={'UF': ['SP', 'RJ']}))
+    engine.add(UfSlicesSink('por_uf/'))
+    stats = engine.run()
+
+O produtor lê cada partição em chunks (partition_store.read_chunks, com os
+ids decodificados) com todas as colunas e as constantes do período (RECORD_COLUMNS) e entrega o mesmo
+chunk a todas as saídas. Cada saída roda em sua própria thread, atrás de uma
+fila limitada (QUEUE_CHUNKS): a memória fica em poucos chunks por saída e a
+saída mais lenta segura a leitura em vez de acumular dados. Filtros (`where`)
+e projeções (`columns`, `rename`) são aplicados por saída, na thread dela.
+
+Parquet depende do pyarrow (opcional): available_formats() informa os
+formatos disponíveis no ambiente.
+"""
+
+import importlib.util
+import os
+import queue
+import threading
+import time
+
+import chunking
+import csv_writer
+import partition_store
+
+QUEUE_CHUNKS = 2
+EXCEL_MAX_ROWS = 1_048_576  # linhas por planilha, cabeçalho incluído
+SLICE_BUFFER_SIZE = 256 * 1024  # buffer por arquivo aberto nas saídas por UF
+
+
+def available_formats():
+    """Formatos suportados neste ambiente"""
+    formats = ['csv', 'jsonl', 'uf']
+    # Só verifica se o pyarrow está instalado; o import fica no ParquetSink
+    if importlib.util.find_spec('pyarrow') and importlib.util.find_spec('pyarrow.parquet'):
+        formats.append('parquet')
+    return formats
+
+
+class Sink:
+    """
+    Saída da exportação: recebe chunks no layout RECORD_COLUMNS, aplica o
+    filtro (`where`: coluna -> valores aceitos) e a projeção (`columns`,
+    depois `rename`) e grava
+    """
+
+    label = 'saida'
+
+    def __init__(self, path, columns=None, where=None, rename=None):
+        self.path = path
+        self.columns = list(columns) if columns else list(partition_store.RECORD_COLUMNS)
+        self.where = {column: list(values) for column, values in (where or {}).items()}
+        self.rename = dict(rename or {})
+        self.rows = 0
+        self.bytes = 0
+
+    def select(self, chunk):
+        for column, values in self.where.items():
+            chunk = chunk[chunk[column].isin(values)]
+        chunk = chunk[self.columns]
+        return chunk.rename(columns=self.rename) if self.rename else chunk
+
+    @property
+    def output_columns(self):
+        return [self.rename.get(c, c) for c in self.columns]
+
+    def open(self):
+        pass
+
+    def write(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        self.close()
+
+    def describe(self):
+        return f"{self.label} {self.path}"
+
+
+class CsvSink(Sink):
+    """CSV (CsvWriter): separador, codificação (utf-8-sig = com BOM) e compressão"""
+
+    label = 'csv'
+
+    def __init__(self, path, columns=None, where=None, rename=None, sep=';', encoding='utf-8',
+                 compression=None):
+        super().__init__(csv_writer.output_path(path, compression), columns, where, rename)
+        self.sep = sep
+        self.encoding = encoding
+        self.compression = compression
+        self._writer = None
+
+    def open(self):
+        self._writer = csv_writer.CsvWriter(self.path, self.output_columns, sep=self.sep,
+                                            encoding=self.encoding, compression=self.compression)
+
+    def write(self, frame):
+        self.bytes += self._writer.write(frame)
+        self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class JsonLinesSink(Sink):
+    """Um objeto JSON por linha, chaves = nomes das colunas"""
+
+    label = 'jsonl'
+
+    def __init__(self, path, columns=None, where=None, rename=None, compression=None):
+        super().__init__(csv_writer.output_path(path, compression), columns, where, rename)
+        self.compression = compression
+        self._writer = None
+
+    def open(self):
+        self._writer = csv_writer.CsvWriter(self.path, compression=self.compression,
+                                            header=False)
+
+    def write(self, frame):
+        if len(frame):
+            text = frame.to_json(orient='records', lines=True, force_ascii=False)
+            self.bytes += self._writer.write_text(text if text.endswith('\n') else text + '\n',
+                                                  len(frame))
+            self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class UfSlicesSink(Sink):
+    """
+    Um CSV por UF em `path` (diretório), com BOM e no máximo EXCEL_MAX_ROWS
+    linhas por arquivo: SP.csv, SP_2.csv, ...
+    """
+
+    label = 'uf'
+
+    def __init__(self, path, columns=None, where=None, rename=None, sep=';',
+                 encoding='utf-8-sig', max_rows=EXCEL_MAX_ROWS - 1):
+        super().__init__(path, columns or partition_store.LEGACY_COLUMNS, where, rename)
+        self.sep = sep
+        self.encoding = encoding
+        self.max_rows = max_rows
+        self.files = []
+        self._writers = {}
+        self._parts = {}
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def _writer_for(self, uf):
+        writer = self._writers.get(uf)
+        if writer is not None and writer.rows_written < self.max_rows:
+            return writer
+        if writer is not None:
+            writer.close()
+        part = self._parts.get(uf, 0) + 1
+        self._parts[uf] = part
+        name = f"{uf or 'sem_uf'}{'' if part == 1 else f'_{part}'}.csv"
+        writer = csv_writer.CsvWriter(os.path.join(self.path, name), self.output_columns,
+                                      sep=self.sep, encoding=self.encoding,
+                                      buffer_size=SLICE_BUFFER_SIZE)
+        self._writers[uf] = writer
+        self.files.append(writer.path)
+        return writer
+
+    def select(self, chunk):
+        frame = super().select(chunk)
+        # A UF continua disponível para o agrupamento mesmo fora da projeção
+        return frame, chunk.loc[frame.index, 'UF']
+
+    def write(self, selected):
+        frame, ufs = selected
+        for uf, group in frame.groupby(ufs.to_numpy(), sort=False):
+            start = 0
+            while start < len(group):
+                writer = self._writer_for(uf)
+                room = self.max_rows - writer.rows_written
+                self.bytes += writer.write(group.iloc[start:start + room])
+                start += room
+        self.rows += len(frame)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+
+    def describe(self):
+        return f"{self.label} {self.path} ({len(self.files)} arquivo(s))"
+
+
+class ParquetSink(Sink):
+    """Parquet (pyarrow), um row group por chunk; todas as colunas como texto"""
+
+    label = 'parquet'
+
+    def __init__(self, path, columns=None, where=None, rename=None, compression='zstd'):
+        super().__init__(path, columns, where, rename)
+        self.compression = compression
+        self._writer = None
+
+    def open(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("exportação Parquet requer o pacote pyarrow") from None
+        self._schema = pa.schema([(name, pa.string()) for name in self.output_columns])
+        self._table = pa.Table
+        self._writer = pq.ParquetWriter(self.path, self._schema, compression=self.compression)
+
+    def write(self, frame):
+        if len(frame):
+            self._writer.write_table(self._table.from_pandas(frame, schema=self._schema,
+                                                             preserve_index=False))
+            self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self.bytes = os.path.getsize(self.path)
+
+
+_DONE = object()
+
+
+class _SinkWorker:
+    """Thread de uma saída, alimentada por uma fila limitada"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.error = None
+        self.queue = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.thread = threading.Thread(target=self._run, daemon=True,
+                                       name=f"export-{sink.label}")
+
+    def _run(self):
+        done = False
+        try:
+            self.sink.open()
+            while True:
+                chunk = self.queue.get()
+                if chunk is _DONE:
+                    done = True
+                    break
+                self.sink.write(self.sink.select(chunk))
+            self.sink.close()
+        except Exception as e:
+            self.error = e
+            if not done:
+                # Continua consumindo a fila para não travar o produtor
+                while self.queue.get() is not _DONE:
+                    pass
+
+    def put(self, chunk):
+        if self.error is None:
+            self.queue.put(chunk)
+
+    def finish(self):
+        self.queue.put(_DONE)
+        self.thread.join()
+        if self.error is not None:
+            self.sink.abort()
+
+
+class ExportEngine:
+    """Lê o armazenamento uma vez e distribui os chunks entre as saídas"""
+
+    def __init__(self, store_root=None, periods=None):
+        self.store_root = store_root or partition_store.default_root()
+        self.periods = periods
+        self.sinks = []
+
+    def add(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def scan(self, stats=None):
+        """Chunks no layout RECORD_COLUMNS, em ordem de período"""
+        periods = self.periods if self.periods is not None \
+            else partition_store.list_periods(self.store_root)
+        for year_month in periods:
+            meta = partition_store.read_metadata(self.store_root, year_month)
+            for chunk in partition_store.read_chunks(self.store_root, year_month,
+                                                     stats=stats, meta=meta):
+                for column in partition_store.DATA_COLUMNS:
+                    if column not in chunk:
+                        chunk[column] = ''
+                for position, column in enumerate(partition_store.CONSTANT_COLUMNS):
+                    chunk.insert(position, column, meta['constants'][column])
+                yield chunk[partition_store.RECORD_COLUMNS]
+
+    def run(self, log=None):
+        """
+        Executa a exportação. Retorna {'rows', 'seconds', 'read', 'sinks': [...]}
+        e relança o 1º erro de uma saída (as demais são concluídas).
+        """
+        workers = [_SinkWorker(sink) for sink in self.sinks]
+        for worker in workers:
+            worker.thread.start()
+
+        started = time.perf_counter()
+        read_stats = {}
+        rows = 0
+        try:
+            for chunk in self.scan(read_stats):
+                rows += len(chunk)
+                for worker in workers:
+                    worker.put(chunk)
+        finally:
+            for worker in workers:
+                worker.finish()
+        elapsed = time.perf_counter() - started
+
+        result = {'rows': rows, 'seconds': round(elapsed, 3),
+                  'read': chunking.describe(read_stats) if read_stats else '', 'sinks': []}
+        for worker in workers:
+            sink = worker.sink
+            result['sinks'].append({'saida': sink.describe(), 'rows': sink.rows,
+                                    'bytes': sink.bytes, 'erro': str(worker.error or '')})
+            if log:
+                status = f"ERRO: {worker.error}" if worker.error else \
+                    f"{sink.rows:,} linhas, {sink.bytes / 1024 / 1024:.1f} MB"
+                log(f"  {sink.describe()}: {status}")
+        if log:
+            log(f"Exportação: 1 leitura de {rows:,} linhas -> {len(workers)} saída(s) "
+                f"em {elapsed:.2f}s ({result['read']})")
+        for worker in workers:
+            if worker.error is not None:
+                raise worker.error
+        return result
+
+
+# --- Entregas prontas (CLI) --------------------------------------------------
+
+DELIVERABLES = {
+    'legado': 'CSV legado de 8 colunas (;)',
+    'legado_bom': 'CSV legado de 8 colunas (;) com BOM, para Excel',
+    'jsonl': 'todas as colunas em JSON lines',
+    'uf': 'um CSV por UF, com BOM, no limite de linhas do Excel',
+    'parquet': 'todas as colunas em Parquet (requer pyarrow)',
+}
+
+
+def deliverable_sink(name, directory, compression=None, where=None):
+    """Saída correspondente a uma entrega de DELIVERABLES em `directory`"""
+    legacy = partition_store.LEGACY_COLUMNS
+    if name == 'legado':
+        return CsvSink(os.path.join(directory, 'dados_portal_transparencia_completo.csv'),
+                       legacy, where, compression=compression)
+    if name == 'legado_bom':
+        return CsvSink(os.path.join(directory, 'dados_portal_transparencia_bom.csv'),
+                       legacy, where, encoding='utf-8-sig', compression=compression)
+    if name == 'jsonl':
+        return JsonLinesSink(os.path.join(directory, 'pe_de_meia.jsonl'), where=where,
+                             compression=compression)
+    if name == 'uf':
+        return UfSlicesSink(os.path.join(directory, 'pe_de_meia_por_uf'), where=where)
+    if name == 'parquet':
+        if 'parquet' not in available_formats():
+            raise RuntimeError("exportação Parquet requer o pacote pyarrow")
+        return ParquetSink(os.path.join(directory, 'pe_de_meia.parquet'), where=where)
+    raise ValueError(f"entrega desconhecida: {name} (use {', '.join(DELIVERABLES)})")
@@ -0,0 +1,190 @@
+"""
+Camada HTTP compartilhada pelos coletores
+
+Uma única requests.Session com pool de conexões (keep-alive), novas
+tentativas com backoff exponencial + jitter, respeito ao cabeçalho
+Retry-After e timeouts separados para conexão e leitura. Também mantém
+métricas simples de transporte (requisições, tentativas, bytes, tempo).
+"""
+
+import email.utils
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
+    'Connection': 'keep-alive',
+}
+
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 120
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+_session = None
+_lock = threading.Lock()
+_metrics = {
+    'requests': 0,
+    'retries': 0,
+    'failures': 0,
+    'bytes': 0,
+    'seconds': 0.0,
+    'status': {},
+}
+
+
+def period_url(year, month):
+    """URL de download de um período (AAAAMM)"""
+    return f"{config.PORTAL_DOWNLOAD_URL}/{year}{month:02d}"
+
+
+def get_session():
+    """Sessão HTTP compartilhada (criada sob demanda)"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _session = session
+        return _session
+
+
+def retry_after_seconds(response):
+    """Interpreta Retry-After (segundos ou data HTTP); None se ausente"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt):
+    """Backoff exponencial com jitter completo"""
+    cap = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def _count(key, amount=1):
+    with _lock:
+        _metrics[key] += amount
+
+
+def fetch(url, timeout=None, retries=MAX_RETRIES, log=None):
+    """
+    GET com novas tentativas. O corpo é lido dentro do laço de tentativas,
+    então falhas no meio da transferência também são repetidas.
+
+    Retorna a última resposta recebida (o chamador verifica status_code).
+    Se todas as tentativas falharem por erro de rede, relança o último erro.
+    """
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    session = get_session()
+
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        _count('requests')
+        try:
+            response = session.get(url, timeout=timeout)
+            _ = response.content  # lê o corpo inteiro
+        except (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            _count('seconds', time.perf_counter() - start)
+            if attempt == retries:
+                _count('failures')
+                raise
+            delay = backoff_delay(attempt)
+            if log:
+                log(f"Falha de rede em {url} ({e.__class__.__name__}), "
+                    f"nova tentativa em {delay:.1f}s")
+        else:
+            _count('seconds', time.perf_counter() - start)
+            _count('bytes', len(response.content))
+            with _lock:
+                status = str(response.status_code)
+                _metrics['status'][status] = _metrics['status'].get(status, 0) + 1
+
+            if response.status_code not in RETRY_STATUS:
+                return response
+            if attempt == retries:
+                _count('failures')
+                return response
+
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            delay = min(delay, BACKOFF_MAX)
+            if log:
+                log(f"Status {response.status_code} em {url}, "
+                    f"nova tentativa em {delay:.1f}s")
+
+        _count('retries')
+        time.sleep(delay)
+
+
+def record_transfer(requests=0, retries=0, failures=0, nbytes=0, seconds=0.0):
+    """Soma às métricas uma transferência feita fora de fetch (ex.: ranged_download)"""
+    with _lock:
+        _metrics['requests'] += requests
+        _metrics['retries'] += retries
+        _metrics['failures'] += failures
+        _metrics['bytes'] += nbytes
+        _metrics['seconds'] += seconds
+
+
+def get_metrics():
+    """Cópia das métricas de transporte"""
+    with _lock:
+        metrics = dict(_metrics)
+        metrics['status'] = dict(_metrics['status'])
+    if metrics['seconds'] > 0:
+        metrics['bytes_per_second'] = metrics['bytes'] / metrics['seconds']
+    metrics['connections_opened'] = _connections_opened()
+    return metrics
+
+
+def _connections_opened():
+    """Total de conexões abertas pelos pools (aprox. handshakes TLS)"""
+    if _session is None:
+        return 0
+    total = 0
+    for adapter in set(_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            total += getattr(pool, 'num_connections', 0)
+    return total
+
+
+def export_metrics(path):
+    """Grava as métricas de transporte em JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(get_metrics(), f, indent=2)
+
+
+def log_metrics(log):
+    """Resumo das métricas em uma linha de log"""
+    m = get_metrics()
+    log(f"HTTP: {m['requests']} requisições, {m['retries']} novas tentativas, "
+        f"{m['failures']} falhas, {m['connections_opened']} conexões, "
+        f"{m['bytes'] / 1e6:.1f} MB em {m['seconds']:.1f}s")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Ingestão contínua das páginas exportadas pelo navegador
+
+Em vez de executar append_page_data.py a cada página, este processo fica
+aberto observando um diretório de entrada. Cada arquivo JSON deixado ali
+(o resultado do código colado no console ou a exportação do localStorage
+feita por js/extract_data.js) é validado e acrescentado ao CSV em lotes,
+pelo mesmo sink incremental de append_page_data.py.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import page_sink
+
+DEFAULT_DROP_DIR = "/home/ubuntu/paginas_portal"
+DEFAULT_CSV = "/home/ubuntu/dados_portal_transparencia.csv"
+
+
+def log_message(message):
+    """Log com timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}")
+    sys.stdout.flush()
+
+
+def parse_dump(payload, headers):
+    """
+    Valida o conteúdo de um arquivo despejado pelo navegador e retorna as
+    linhas. Aceita:
+      - lista de linhas (saída do código colado no console)
+      - objeto {headers, data, ...} (exportação do localStorage)
+
+    Lança ValueError com o motivo quando o conteúdo é inválido.
+    """
+    if isinstance(payload, str):
+        # localStorage.getItem() copiado como string JSON
+        payload = json.loads(payload)
+
+    if isinstance(payload, dict):
+        if payload.get('error'):
+            raise ValueError(f"exportação com erro: {payload['error']}")
+        dump_headers = payload.get('headers') or []
+        if dump_headers and list(dump_headers) != list(headers):
+            raise ValueError(f"cabeçalhos diferentes do CSV: {dump_headers}")
+        rows = payload.get('data')
+    else:
+        rows = payload
+
+    if not isinstance(rows, list):
+        raise ValueError("formato não reconhecido (esperado lista de linhas)")
+
+    for i, row in enumerate(rows):
+        if not isinstance(row, list) or not all(isinstance(cell, str) for cell in row):
+            raise ValueError(f"linha {i} não é uma lista de textos")
+
+    return page_sink.clean_rows(rows, headers)
+
+
+def list_ready_files(drop_dir, sizes):
+    """
+    Lista arquivos JSON cujo tamanho não mudou desde a última varredura
+    (evita ler arquivos ainda sendo gravados pelo navegador)
+    """
+    ready = []
+    current = {}
+    with os.scandir(drop_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith('.json'):
+                continue
+            stat = entry.stat()
+            current[entry.path] = stat.st_size
+            if sizes.get(entry.path) == stat.st_size:
+                ready.append((stat.st_mtime, entry.path))
+    sizes.clear()
+    sizes.update(current)
+    return [path for _, path in sorted(ready)]
+
+
+def move_to(path, subdir, reason=None):
+    """Move o arquivo para processados/ ou rejeitados/"""
+    target_dir = os.path.join(os.path.dirname(path), subdir)
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, os.path.basename(path))
+    shutil.move(path, target)
+    if reason:
+        with open(target + '.erro.txt', 'w', encoding='utf-8') as f:
+            f.write(reason + '\n')
+
+
+def requeue(path, rows):
+    """Regrava no diretório de entrada só as linhas que ainda não foram escritas"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def ingest_batch(paths, csv_file, headers, seen_digests):
+    """
+    Valida os arquivos de um lote e os acrescenta ao CSV com uma única escrita.
+    Arquivos gravados por inteiro vão para processados/; os que ficaram
+    (total ou parcialmente) de fora pelo limite permanecem na entrada só com
+    as linhas restantes. Retorna o estado atualizado do sink (ou None se nada
+    foi escrito).
+    """
+    batch_rows = []
+    accepted = []
+
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            digest = hashlib.sha1(raw).hexdigest()
+            if digest in seen_digests:
+                raise ValueError("arquivo idêntico a um já ingerido")
+            rows = parse_dump(json.loads(raw.decode('utf-8-sig')), headers)
+            if not rows:
+                raise ValueError("nenhuma linha válida")
+        except (ValueError, UnicodeDecodeError) as e:
+            log_message(f"✗ Rejeitado {os.path.basename(path)}: {e}")
+            move_to(path, 'rejeitados', str(e))
+            continue
+
+        seen_digests.add(digest)
+        batch_rows.extend(rows)
+        accepted.append((path, digest, rows))
+
+    if not batch_rows:
+        return None
+
+    sources = [(digest, len(rows)) for _, digest, rows in accepted]
+    state, added = page_sink.append_rows(csv_file, batch_rows, sources=sources)
+
+    offset = 0
+    for path, digest, rows in accepted:
+        written = min(max(added - offset, 0), len(rows))
+        offset += len(rows)
+        if written == len(rows):
+            move_to(path, 'processados')
+            continue
+        # Fora do limite: o arquivo fica na entrada com o que falta gravar
+        seen_digests.discard(digest)
+        if written:
+            requeue(path, rows[written:])
+        log_message(f"↺ Mantido {os.path.basename(path)}: {len(rows) - written} "
+                    f"registros não gravados")
+
+    log_message(f"✓ Lote: {len(accepted)} arquivo(s), {added} registros adicionados. "
+                f"Total: {state['row_count']:,}")
+    if added < len(batch_rows):
+        log_message(f"⚠️  {len(batch_rows) - added} registros não couberam no limite de "
+                    f"{page_sink.MAX_RECORDS:,}")
+    return state
+
+
+def watch(drop_dir, csv_file, interval=0.5):
+    """Loop principal: varre o diretório e ingere os arquivos prontos"""
+    os.makedirs(drop_dir, exist_ok=True)
+    state = page_sink.load_state(csv_file)
+    headers = state['headers']
+
+    log_message(f"Observando {drop_dir} (intervalo {interval}s)")
+    log_message(f"CSV: {csv_file} ({state['row_count']:,} registros)")
+
+    sizes = {}
+    # Digests dos arquivos já ingeridos ficam no estado do sink (sobrevivem a reinícios)
+    seen_digests = set(state['digests'])
+
+    while state['row_count'] < page_sink.MAX_RECORDS:
+        paths = list_ready_files(drop_dir, sizes)
+        if paths:
+            start = time.perf_counter()
+            new_state = ingest_batch(paths, csv_file, headers, seen_digests)
+            if new_state is not None:
+                state = new_state
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                log_message(f"Lote ingerido em {elapsed_ms:.1f} ms")
+            for path in paths:
+                sizes.pop(path, None)
+        time.sleep(interval)
+
+    log_message(f"🎯 Limite de {page_sink.MAX_RECORDS:,} registros atingido, encerrando")
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dir', default=DEFAULT_DROP_DIR,
+                        help='diretório observado (arquivos .json do navegador)')
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='CSV de destino')
+    parser.add_argument('--intervalo', type=float, default=0.5,
+                        help='intervalo de varredura em segundos')
+    args = parser.parse_args(argv)
+
+    try:
+        watch(args.dir, args.csv, args.intervalo)
+    except FileNotFoundError:
+        log_message("✗ Arquivo CSV principal não encontrado. Execute primeiro: python collect_all_data.py")
+        return False
+    except KeyboardInterrupt:
+        log_message("Interrompido pelo usuário")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,216 @@
+"""
+Instrumentação estruturada das etapas da coleta
+
+Cada etapa (download, unzip, parse, transform, write, dedup) registra tempo,
+linhas e bytes por período. Os eventos podem ser gravados como JSON lines,
+e o acumulado pode ser exportado como snapshot JSON ou como arquivo texto
+no formato do Prometheus (node_exporter textfile collector).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+_lock = threading.Lock()
+_totals = {}   # (etapa, período) -> {'seconds', 'rows', 'bytes', 'calls'}
+_events_path = None
+_prometheus_path = None
+_listeners = []  # chamados a cada medição: fn(etapa, período, segundos, linhas, bytes)
+_checks = []     # chamados após uma etapa concluída sem erro; podem lançar exceção
+
+
+def configure(events_path=None, prometheus_path=None):
+    """Define os destinos opcionais dos eventos e do textfile do Prometheus"""
+    global _events_path, _prometheus_path
+    _events_path = events_path
+    _prometheus_path = prometheus_path
+    if events_path:
+        os.makedirs(os.path.dirname(os.path.abspath(events_path)), exist_ok=True)
+
+
+def add_listener(fn):
+    """Registra uma função chamada a cada medição (ex.: perfil de memória)"""
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def remove_listener(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def add_check(fn):
+    """
+    Registra uma verificação executada depois de cada etapa (ou chunk) que
+    terminou sem erro. Diferente dos listeners, pode lançar exceção: como não
+    roda quando a etapa falhou, não substitui o erro original.
+    """
+    if fn not in _checks:
+        _checks.append(fn)
+
+
+def remove_check(fn):
+    if fn in _checks:
+        _checks.remove(fn)
+
+
+def _run_checks():
+    for check in list(_checks):
+        check()
+
+
+def reset():
+    """Zera os acumulados (útil entre execuções no mesmo processo)"""
+    with _lock:
+        _totals.clear()
+
+
+def record(name, period=None, seconds=0.0, rows=0, nbytes=0):
+    """Registra uma medição de etapa"""
+    key = (name, period)
+    with _lock:
+        total = _totals.setdefault(key, {'seconds': 0.0, 'rows': 0, 'bytes': 0, 'calls': 0})
+        total['seconds'] += seconds
+        total['rows'] += rows
+        total['bytes'] += nbytes
+        total['calls'] += 1
+
+    if _events_path:
+        event = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'stage': name,
+            'period': period,
+            'seconds': round(seconds, 6),
+            'rows': rows,
+            'bytes': nbytes,
+        }
+        event.update(_rates(seconds, rows, nbytes))
+        with _lock, open(_events_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event) + '\n')
+
+    for listener in list(_listeners):
+        listener(name, period, seconds, rows, nbytes)
+
+
+@contextmanager
+def stage(name, period=None):
+    """
+    Mede o tempo de um bloco. O chamador pode preencher 'rows' e 'bytes'
+    no dicionário retornado:
+
+        with instrumentation.stage('write', '202401') as m:
+            m['bytes'] = escrever(...)
+    """
+    measure = {'rows': 0, 'bytes': 0}
+    start = time.perf_counter()
+    try:
+        yield measure
+    finally:
+        record(name, period, time.perf_counter() - start,
+               rows=measure['rows'], nbytes=measure['bytes'])
+    _run_checks()
+
+
+def timed_iter(iterable, name, period=None):
+    """Mede o tempo gasto em cada next() (ex.: leitura de chunks do CSV)"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        rows = len(item) if hasattr(item, '__len__') else 0
+        record(name, period, time.perf_counter() - start, rows=rows)
+        _run_checks()
+        yield item
+
+
+def _rates(seconds, rows, nbytes):
+    rates = {}
+    if seconds > 0:
+        if rows:
+            rates['rows_per_s'] = round(rows / seconds, 1)
+        if nbytes:
+            rates['mb_per_s'] = round(nbytes / seconds / 1e6, 3)
+    return rates
+
+
+def snapshot():
+    """Acumulados por etapa e por período, com taxas"""
+    with _lock:
+        items = [(k, dict(v)) for k, v in _totals.items()]
+
+    by_stage = {}
+    by_period = {}
+    for (name, period), total in items:
+        total.update(_rates(total['seconds'], total['rows'], total['bytes']))
+        if period is not None:
+            by_period.setdefault(period, {})[name] = total
+        agg = by_stage.setdefault(name, {'seconds': 0.0, 'rows': 0, 'bytes': 0, 'calls': 0})
+        for field in ('seconds', 'rows', 'bytes', 'calls'):
+            agg[field] += total[field]
+
+    for total in by_stage.values():
+        total.update(_rates(total['seconds'], total['rows'], total['bytes']))
+
+    return {'stages': by_stage, 'periods': by_period}
+
+
+def write_snapshot(path):
+    """Grava o snapshot em JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=2, ensure_ascii=False)
+
+
+def write_prometheus(path=None):
+    """
+    Grava as métricas no formato textfile do Prometheus (escrita atômica)
+    """
+    path = path or _prometheus_path
+    if not path:
+        return
+
+    # Por etapa (inclusive as medidas sem período, como export e índices) e, em
+    # outra métrica, por período: somar as séries de uma métrica não conta duas vezes
+    snap = snapshot()
+    lines = [
+        '# HELP pe_de_meia_stage_seconds_total Tempo acumulado por etapa',
+        '# TYPE pe_de_meia_stage_seconds_total counter',
+    ]
+    for name, total in sorted(snap['stages'].items()):
+        lines.append(f'pe_de_meia_stage_seconds_total{{stage="{name}"}} {total["seconds"]:.6f}')
+    lines += [
+        '# HELP pe_de_meia_period_stage_seconds_total Tempo acumulado por etapa e período',
+        '# TYPE pe_de_meia_period_stage_seconds_total counter',
+    ]
+    for period, stages in sorted(snap['periods'].items()):
+        for name, total in sorted(stages.items()):
+            lines.append(f'pe_de_meia_period_stage_seconds_total'
+                         f'{{stage="{name}",period="{period}"}} {total["seconds"]:.6f}')
+    for metric, field in (('rows', 'rows'), ('bytes', 'bytes')):
+        lines.append(f'# TYPE pe_de_meia_stage_{metric}_total counter')
+        for name, total in sorted(snap['stages'].items()):
+            lines.append(f'pe_de_meia_stage_{metric}_total{{stage="{name}"}} {total[field]}')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+
+def log_summary(log):
+    """Resumo por etapa, ordenado pela participação no tempo total"""
+    stages = snapshot()['stages']
+    total_seconds = sum(s['seconds'] for s in stages.values()) or 1.0
+    log("=== TEMPO POR ETAPA ===")
+    for name, total in sorted(stages.items(), key=lambda kv: -kv[1]['seconds']):
+        parts = [f"{total['seconds']:.2f}s ({total['seconds'] / total_seconds * 100:.1f}%)"]
+        if 'rows_per_s' in total:
+            parts.append(f"{total['rows_per_s']:,.0f} linhas/s")
+        if 'mb_per_s' in total:
+            parts.append(f"{total['mb_per_s']:.1f} MB/s")
+        log(f"{name}: " + ", ".join(parts))
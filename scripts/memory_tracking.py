@@ -0,0 +1,197 @@
+"""
+Perfil de memória da coleta
+
+Quando habilitado, registra para cada etapa medida pela instrumentação
+(download, unzip, parse, transform, write, dedup — as de chunk a cada chunk):
+  - o pico de RSS do processo no intervalo (amostrado em uma thread);
+  - com o perfil completo, a memória alocada pelo Python segundo o
+    tracemalloc (atual e pico);
+e guarda os maiores alocadores por período. Se um orçamento de memória for
+definido e ultrapassado, a próxima etapa que terminar sem erro lança
+MemoryBudgetExceeded (verificação da instrumentação, fora do listener). O
+orçamento usa só o RSS: sem o perfil completo o tracemalloc fica desligado,
+porque encarece toda alocação.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+import instrumentation
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+_lock = threading.Lock()
+_state = {
+    'enabled': False,
+    'tracing': False,          # tracemalloc ligado por este módulo
+    'budget_mb': None,
+    'window_peak_mb': 0.0,
+    'over_budget_mb': None,
+    'over_budget_at': None,     # (etapa, período) em que o orçamento foi ultrapassado
+}
+_stages = {}        # etapa -> {'rss_peak_mb', 'traced_peak_mb', 'samples'}
+_samples = []       # um registro por etapa/chunk
+_top_allocators = {}
+_sampler = None
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """O uso de memória ultrapassou o orçamento configurado"""
+
+
+def current_rss_mb():
+    """RSS atual do processo em MB"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1e6
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Pico de RSS do processo desde o início (ru_maxrss)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / 1e6  # ru_maxrss em KB
+
+
+def _sample_loop(interval):
+    while _state['enabled']:
+        rss = current_rss_mb()
+        with _lock:
+            _state['window_peak_mb'] = max(_state['window_peak_mb'], rss)
+            budget = _state['budget_mb']
+            if budget and rss > budget and _state['over_budget_mb'] is None:
+                _state['over_budget_mb'] = rss
+        time.sleep(interval)
+
+
+def _on_stage(name, period, seconds, rows, nbytes):
+    """Listener da instrumentação: fecha a janela de amostragem da etapa"""
+    rss = current_rss_mb()
+    traced, traced_peak = 0, 0
+    if _state['tracing']:
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+    with _lock:
+        rss_peak = max(_state['window_peak_mb'], rss)
+        _state['window_peak_mb'] = rss
+        if _state['budget_mb'] and rss_peak > _state['budget_mb']:
+            _state['over_budget_mb'] = max(_state['over_budget_mb'] or 0.0, rss_peak)
+        if _state['over_budget_mb'] is not None and _state['over_budget_at'] is None:
+            _state['over_budget_at'] = (name, period)
+
+        stage = _stages.setdefault(name, {'rss_peak_mb': 0.0, 'traced_peak_mb': 0.0, 'samples': 0})
+        stage['rss_peak_mb'] = max(stage['rss_peak_mb'], rss_peak)
+        stage['traced_peak_mb'] = max(stage['traced_peak_mb'], traced_peak / 1e6)
+        stage['samples'] += 1
+        _samples.append({
+            'stage': name,
+            'period': period,
+            'rows': rows,
+            'rss_mb': round(rss, 1),
+            'rss_peak_mb': round(rss_peak, 1),
+            'traced_mb': round(traced / 1e6, 1),
+            'traced_peak_mb': round(traced_peak / 1e6, 1),
+        })
+
+
+def check_budget():
+    """
+    Verificação da instrumentação (após etapa concluída sem erro): lança
+    MemoryBudgetExceeded se o orçamento foi ultrapassado. O listener só
+    registra, para não substituir a exceção de uma etapa que falhou.
+    """
+    with _lock:
+        over_budget = _state['over_budget_mb']
+        name, period = _state['over_budget_at'] or (None, None)
+    if over_budget is not None:
+        raise MemoryBudgetExceeded(
+            f"memória {over_budget:.0f} MB acima do orçamento de {_state['budget_mb']:.0f} MB "
+            f"(etapa {name}, período {period})"
+        )
+
+
+def enable(budget_mb=None, interval=0.05, frames=1, trace_python=True):
+    """
+    Liga o perfil de memória (amostragem de RSS e, com `trace_python`,
+    tracemalloc). Para só impor `budget_mb`, use trace_python=False.
+    """
+    global _sampler
+    if _state['enabled']:
+        return
+    tracing = trace_python and not tracemalloc.is_tracing()
+    _state.update(enabled=True, tracing=tracing, budget_mb=budget_mb,
+                  window_peak_mb=current_rss_mb(), over_budget_mb=None, over_budget_at=None)
+    if tracing:
+        tracemalloc.start(frames)
+    instrumentation.add_listener(_on_stage)
+    instrumentation.add_check(check_budget)
+    _sampler = threading.Thread(target=_sample_loop, args=(interval,), daemon=True)
+    _sampler.start()
+
+
+def disable():
+    """Desliga o perfil de memória"""
+    global _sampler
+    if not _state['enabled']:
+        return
+    _state['enabled'] = False
+    instrumentation.remove_listener(_on_stage)
+    instrumentation.remove_check(check_budget)
+    if _sampler is not None:
+        _sampler.join()
+        _sampler = None
+    if _state['tracing']:
+        tracemalloc.stop()
+        _state['tracing'] = False
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def capture_top_allocators(period, limit=5):
+    """Guarda os maiores alocadores atuais (por linha de código) do período"""
+    if not _state['enabled'] or not _state['tracing']:
+        return []
+    stats = tracemalloc.take_snapshot().statistics('lineno')[:limit]
+    top = [{'location': str(stat.traceback[0]), 'size_mb': round(stat.size / 1e6, 2),
+            'count': stat.count} for stat in stats]
+    _top_allocators[period] = top
+    return top
+
+
+def report():
+    """Resumo: picos por etapa, amostras por etapa/chunk e alocadores"""
+    with _lock:
+        return {
+            'budget_mb': _state['budget_mb'],
+            'process_peak_rss_mb': round(peak_rss_mb(), 1),
+            'stages': {name: {k: round(v, 1) if isinstance(v, float) else v
+                              for k, v in stage.items()}
+                       for name, stage in _stages.items()},
+            'samples': list(_samples),
+            'top_allocators': dict(_top_allocators),
+        }
+
+
+def write_report(path):
+    """Grava o relatório em JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report(), f, indent=2, ensure_ascii=False)
+
+
+def log_summary(log):
+    """Picos de memória por etapa"""
+    rep = report()
+    log("=== MEMÓRIA POR ETAPA ===")
+    for name, stage in sorted(rep['stages'].items(), key=lambda kv: -kv[1]['rss_peak_mb']):
+        traced = f", pico Python {stage['traced_peak_mb']:.0f} MB" if _state['tracing'] else ""
+        log(f"{name}: pico RSS {stage['rss_peak_mb']:.0f} MB{traced} "
+            f"({stage['samples']} amostras)")
+    log(f"Pico do processo: {rep['process_peak_rss_mb']:.0f} MB"
+        + (f" (orçamento {rep['budget_mb']:.0f} MB)" if rep['budget_mb'] else ""))
@@ -0,0 +1,299 @@
+"""
+Busca aproximada de nomes (beneficiários e representantes legais)
+
+Os nomes são dobrados (sem acentos, maiúsculas, só A-Z e espaço simples,
+como schema_registry.fold) e indexados por trigramas: com 27 símbolos há
+27³ = 19.683 trigramas possíveis, então o índice invertido é um CSR de tamanho
+fixo, sem dicionário:
+
+    <raiz>/
+      nomes_chaves.npy ...     hash do nome dobrado, grafia de exibição (1ª vista)
+      nomes.txt, nomes_pos.npy e ids estáveis (representative_index.IdentityTable)
+      papeis.npy               bits: 1 = beneficiário, 2 = representante legal
+      tamanhos.npy             trigramas distintos de cada nome
+      inicios.npy              postings do trigrama t em [inicios[t], inicios[t+1])
+      postings.npy             ids (int32) dos nomes, crescentes em cada trigrama
+      _metadata.json
+
+A consulta soma, com np.bincount, as listas dos trigramas do texto buscado e
+ordena os nomes pelo coeficiente de Dice (2·comuns / (|consulta| + |nome|)).
+Nomes novos de cada mês recebem os próximos ids; como eles são maiores que
+os já indexados, as postings novas de cada trigrama vão para o fim da lista
+existente, sem reordenar o índice.
+"""
+
+import json
+import os
+import shutil
+import unicodedata
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import chunking
+import config
+import partition_store
+from representative_index import IdentityTable
+
+ROLES = {'Beneficiário': 1, 'Representante Legal': 2}
+ROLE_LABELS = {1: 'beneficiário', 2: 'representante'}
+NAME_WIDTH = 80
+ALPHABET = 27
+TRIGRAMS = ALPHABET ** 3
+THRESHOLD = 0.5
+SLICE_ROWS = 100_000
+METADATA_FILE = '_metadata.json'
+
+_HASH_PRIME = np.uint64(0x100000001B3)
+_HASH_SEED = np.uint64(0xCBF29CE484222325)
+
+
+def default_root():
+    return config.data_path("pe_de_meia_nomes")
+
+
+def _symbol_table():
+    """Código do caractere (até U+024F) -> símbolo (0 = espaço, 1..26 = A..Z)"""
+    table = np.zeros(0x250, dtype=np.int8)
+    for code in range(0x250):
+        text = unicodedata.normalize('NFKD', chr(code))
+        letter = ''.join(ch for ch in text if not unicodedata.combining(ch)).upper()
+        if len(letter) == 1 and 'A' <= letter <= 'Z':
+            table[code] = ord(letter) - ord('A') + 1
+    return table
+
+
+_SYMBOLS = _symbol_table()
+
+
+def fold(values):
+    """
+    Nomes -> (matriz de símbolos n x NAME_WIDTH, comprimentos), com acentos
+    removidos, maiúsculas e sequências de não-letras reduzidas a um espaço
+    """
+    codes = np.asarray(values, dtype=f'U{NAME_WIDTH}').view(np.uint32) \
+        .reshape(len(values), NAME_WIDTH)
+    symbols = _SYMBOLS[np.minimum(codes, len(_SYMBOLS) - 1)]
+    symbols[codes >= len(_SYMBOLS)] = 0
+    letter = symbols > 0
+    previous = np.zeros_like(letter)
+    previous[:, 1:] = letter[:, :-1]
+    # Mantém as letras e o 1º espaço depois de uma letra (sem espaço inicial)
+    keep = letter | previous
+    order = np.argsort(~keep, axis=1, kind='stable')
+    symbols = np.take_along_axis(symbols, order, axis=1)
+    lengths = keep.sum(axis=1)
+    trailing = (lengths > 0) & (symbols[np.arange(len(symbols)), np.maximum(lengths - 1, 0)] == 0)
+    lengths = lengths - trailing
+    symbols[np.arange(NAME_WIDTH) >= lengths[:, None]] = 0
+    return symbols, lengths
+
+
+def name_keys(symbols, lengths):
+    """
+    Hash (FNV-1a sobre os símbolos) de cada nome dobrado. Cada linha só é
+    atualizada até o próprio comprimento, para que a chave não dependa do
+    maior nome do lote.
+    """
+    keys = np.full(len(symbols), _HASH_SEED, dtype=np.uint64)
+    for column in range(int(lengths.max(initial=0))):
+        hashed = (keys ^ symbols[:, column].astype(np.uint64)) * _HASH_PRIME
+        keys = np.where(column < lengths, hashed, keys)
+    return keys ^ lengths.astype(np.uint64)
+
+
+def trigrams(symbols, lengths):
+    """(linha, trigrama) distintos de cada nome, com um espaço de cada lado"""
+    padded = np.zeros((len(symbols), NAME_WIDTH + 2), dtype=np.int32)
+    padded[:, 1:-1] = symbols
+    codes = padded[:, :-2] * ALPHABET ** 2 + padded[:, 1:-1] * ALPHABET + padded[:, 2:]
+    codes[np.arange(NAME_WIDTH) >= lengths[:, None]] = TRIGRAMS
+    codes.sort(axis=1)
+    # Repetidos na linha ficam adjacentes depois da ordenação
+    distinct = codes < TRIGRAMS
+    distinct[:, 1:] &= codes[:, 1:] != codes[:, :-1]
+    rows, positions = np.nonzero(distinct)
+    return rows, codes[rows, positions]
+
+
+def read_metadata(root):
+    path = os.path.join(root, METADATA_FILE)
+    if not os.path.exists(path):
+        return {'periods': [], 'names': 0, 'postings': 0}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _period_names(store_root, year_month, stats):
+    """Nomes distintos de uma partição: (chaves, grafias, papéis)"""
+    stored = partition_store.read_metadata(store_root, year_month)['columns']
+    columns = [c for c in ROLES if c in stored]
+    frames = {column: [] for column in columns}
+    for chunk in partition_store.read_chunks(store_root, year_month, columns, stats=stats):
+        for column in columns:
+            frames[column].append(pd.DataFrame({
+                'nome': chunk[column].drop_duplicates().to_numpy(object),
+                'papel': ROLES[column]}))
+    # Um papel depois do outro: a ordem dos ids não depende do tamanho dos chunks
+    frames = [frame for column in columns for frame in frames[column]]
+    if not frames:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=object), np.empty(0, np.uint8)
+    names = pd.concat(frames, ignore_index=True)
+    # Papéis distintos somados = OR dos bits
+    names = names[names['nome'] != ''].drop_duplicates() \
+        .groupby('nome', sort=False)['papel'].sum().reset_index()
+
+    keys = np.empty(len(names), dtype=np.uint64)
+    spellings = names['nome'].to_numpy(object)
+    for start in range(0, len(names), SLICE_ROWS):
+        symbols, lengths = fold(spellings[start:start + SLICE_ROWS])
+        keys[start:start + SLICE_ROWS] = name_keys(symbols, lengths)
+    return keys, spellings, names['papel'].to_numpy(np.uint8)
+
+
+def _slice_postings(spellings, first_id):
+    """Trigramas distintos por nome, (offsets, ids) agrupados por trigrama"""
+    rows, codes = trigrams(*fold(spellings))
+    order = np.argsort(codes.astype(np.uint16), kind='stable')
+    offsets = np.zeros(TRIGRAMS + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=TRIGRAMS), out=offsets[1:])
+    sizes = np.bincount(rows, minlength=len(spellings)).astype(np.uint8)
+    return sizes, (offsets, (rows[order] + first_id).astype(np.int32))
+
+
+def _merge_postings(parts):
+    """Concatena, trigrama a trigrama, listas (offsets, ids) em ordem de id"""
+    offsets = np.zeros(TRIGRAMS + 1, dtype=np.int64)
+    for part_offsets, _ in parts:
+        offsets += part_offsets
+    postings = np.empty(offsets[-1], dtype=np.int32)
+    for code in range(TRIGRAMS):
+        position = offsets[code]
+        for part_offsets, ids in parts:
+            size = part_offsets[code + 1] - part_offsets[code]
+            postings[position:position + size] = ids[part_offsets[code]:part_offsets[code + 1]]
+            position += size
+    return offsets, postings
+
+
+def update(root=None, store_root=None, periods=None, log=None):
+    """Inclui os nomes novos dos períodos no índice. Retorna o metadata."""
+    root = root or default_root()
+    store_root = store_root or partition_store.default_root()
+    periods = periods if periods is not None else partition_store.list_periods(store_root)
+    os.makedirs(root, exist_ok=True)
+    meta = read_metadata(root)
+    read_stats = {}
+
+    for year_month in periods:
+        keys, spellings, roles = _period_names(store_root, year_month, read_stats)
+        table = IdentityTable(root, 'nomes', mmap=False)
+        start = len(table.keys)
+        ids = table.find(keys)
+
+        papeis_path = os.path.join(root, 'papeis.npy')
+        papeis = np.load(papeis_path) if os.path.exists(papeis_path) else np.empty(0, np.uint8)
+        known = ids >= 0
+        np.bitwise_or.at(papeis, ids[known], roles[known])
+
+        # Mesmo nome dobrado com grafias diferentes no mês: fica a 1ª
+        unique, first, inverse = np.unique(keys[~known], return_index=True,
+                                           return_inverse=True)
+        unique_roles = np.zeros(len(unique), dtype=np.uint8)
+        np.bitwise_or.at(unique_roles, inverse, roles[~known])
+        appearance = np.argsort(first, kind='stable')
+        new_keys, new_roles = unique[appearance], unique_roles[appearance]
+        new_spellings = spellings[~known][first[appearance]]
+        if len(new_keys):
+            table.append(new_keys, new_spellings.tolist())
+        np.save(papeis_path, np.concatenate([papeis, new_roles]))
+
+        # Postings dos nomes novos (ids >= start) vão para o fim de cada lista
+        sizes_path = os.path.join(root, 'tamanhos.npy')
+        sizes = np.load(sizes_path) if os.path.exists(sizes_path) else np.empty(0, np.uint8)
+        if meta['postings']:
+            parts = [(np.load(os.path.join(root, 'inicios.npy')),
+                      np.load(os.path.join(root, 'postings.npy'), mmap_mode='r'))]
+        else:
+            parts = []
+        new_sizes = [sizes]
+        for offset in range(0, len(new_keys), SLICE_ROWS):
+            part_sizes, part = _slice_postings(new_spellings[offset:offset + SLICE_ROWS],
+                                               start + offset)
+            new_sizes.append(part_sizes)
+            parts.append(part)
+        offsets, postings = _merge_postings(parts)
+        del parts
+        np.save(sizes_path, np.concatenate(new_sizes))
+        np.save(os.path.join(root, 'inicios.npy'), offsets)
+        np.save(os.path.join(root, 'postings.npy'), postings)
+
+        index_periods = list(meta['periods'])
+        if year_month not in index_periods:
+            index_periods.append(year_month)
+        meta = {
+            'periods': index_periods,
+            'names': start + len(new_keys),
+            'postings': int(len(postings)),
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(os.path.join(root, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        if log:
+            log(f"Índice de nomes: {year_month} com {len(keys):,} nomes distintos, "
+                f"{len(new_keys):,} novos -> {meta['names']:,} nomes, "
+                f"{meta['postings']:,} postings")
+
+    if log and read_stats:
+        log(f"Índice de nomes: {chunking.describe(read_stats)}")
+    return meta
+
+
+def rebuild(root=None, store_root=None, periods=None, log=None):
+    """Apaga o índice e inclui todos os períodos"""
+    root = root or default_root()
+    shutil.rmtree(root, ignore_errors=True)
+    return update(root, store_root, periods, log)
+
+
+class NameIndex:
+    """Consultas sobre o índice de nomes (arrays abertos via memmap)"""
+
+    def __init__(self, root=None):
+        self.root = root or default_root()
+        self.meta = read_metadata(self.root)
+        self.names = IdentityTable(self.root, 'nomes')
+        self.roles = np.load(os.path.join(self.root, 'papeis.npy'), mmap_mode='r')
+        self.sizes = np.load(os.path.join(self.root, 'tamanhos.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(self.root, 'inicios.npy'), mmap_mode='r')
+        self.postings = np.load(os.path.join(self.root, 'postings.npy'), mmap_mode='r')
+
+    def search(self, text, limit=10, threshold=THRESHOLD, role=None):
+        """
+        [(grafia, score, papéis), ...] em ordem de similaridade (Dice sobre
+        trigramas), apenas os com score >= threshold
+        """
+        _, codes = trigrams(*fold([text]))
+        if not len(codes):
+            return []
+        lists = [self.postings[self.offsets[c]:self.offsets[c + 1]] for c in codes]
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.sizes))
+        candidates = np.flatnonzero(shared)
+        scores = 2.0 * shared[candidates] / (len(codes) + self.sizes[candidates])
+        keep = scores >= threshold
+        if role:
+            keep &= (self.roles[candidates] & ROLES[role]) > 0
+        candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((candidates, -scores))
+        candidates, scores = candidates[order], scores[order]
+        return [(spelling, round(float(score), 3), self.describe_roles(candidate))
+                for spelling, score, candidate
+                in zip(self.names.identity(candidates), scores, candidates)]
+
+    def describe_roles(self, name_id):
+        roles = int(self.roles[name_id])
+        return ', '.join(label for bit, label in ROLE_LABELS.items() if roles & bit)
@@ -0,0 +1,159 @@
+"""
+Gravação incremental (append-only) das páginas coletadas no navegador
+
+Em vez de reler e reescrever o CSV inteiro a cada página, as novas linhas são
+acrescentadas ao final do arquivo e as estatísticas (total de linhas,
+distribuição por UF e valor total) ficam em um arquivo de estado ao lado do CSV.
+"""
+
+import csv
+import json
+import os
+from collections import Counter
+
+MAX_RECORDS = 20000
+VALUE_COLUMN = 'Valor Disponibilizado (R$)'
+
+
+def state_path(csv_file):
+    """Caminho do arquivo de estado associado ao CSV"""
+    return f"{csv_file}.state.json"
+
+
+def parse_value(value):
+    """Converte '200,00' / 'R$ 200,00' em float (None se inválido)"""
+    try:
+        return float(value.replace(',', '.').replace('R$', '').strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _empty_state(headers):
+    return {
+        'headers': headers,
+        'row_count': 0,
+        'uf_counts': {},
+        'total_valor': 0.0,
+        'csv_size': 0,
+        'digests': [],
+    }
+
+
+def _update_state(state, rows):
+    """Atualiza contadores do estado com as linhas novas"""
+    headers = state['headers']
+    uf_idx = headers.index('UF') if 'UF' in headers else None
+    value_idx = headers.index(VALUE_COLUMN) if VALUE_COLUMN in headers else None
+
+    uf_counts = Counter(state['uf_counts'])
+    for row in rows:
+        if uf_idx is not None and row[uf_idx]:
+            uf_counts[row[uf_idx]] += 1
+        if value_idx is not None:
+            value = parse_value(row[value_idx])
+            if value is not None:
+                state['total_valor'] += value
+
+    state['uf_counts'] = dict(uf_counts)
+    state['row_count'] += len(rows)
+
+
+def rebuild_state(csv_file):
+    """
+    Reconstrói o estado lendo o CSV uma única vez (usado quando o arquivo de
+    estado não existe ou está desatualizado em relação ao CSV). O estado fica
+    só em memória; quem grava é append_rows(), junto com as linhas novas.
+    """
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        headers = next(reader)
+        state = _empty_state(headers)
+        _update_state(state, list(reader))
+
+    state['csv_size'] = os.path.getsize(csv_file)
+    return state
+
+
+def load_state(csv_file):
+    """
+    Carrega o estado do sink sem gravar nada (leitura pura, usada também por
+    comandos de consulta). Lança FileNotFoundError se o CSV não existir.
+    """
+    if not os.path.exists(csv_file):
+        raise FileNotFoundError(csv_file)
+
+    try:
+        with open(state_path(csv_file), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return rebuild_state(csv_file)
+
+    # CSV alterado por fora do sink: contadores não são mais confiáveis, mas os
+    # arquivos já ingeridos continuam ingeridos
+    if state.get('csv_size') != os.path.getsize(csv_file):
+        digests = state.get('digests', [])
+        state = rebuild_state(csv_file)
+        state['digests'] = digests
+
+    state.setdefault('digests', [])
+    return state
+
+
+def save_state(csv_file, state):
+    """Salva o estado de forma atômica"""
+    tmp_file = state_path(csv_file) + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, state_path(csv_file))
+
+
+def clean_rows(page_data, headers):
+    """
+    Filtra linhas vazias/incompletas e ajusta o tamanho ao número de colunas
+    """
+    clean_data = []
+    for row in page_data:
+        if len(row) >= len(headers) and any(cell.strip() for cell in row):
+            clean_data.append(list(row[:len(headers)]))
+    return clean_data
+
+
+def append_rows(csv_file, rows, max_records=MAX_RECORDS, sources=None):
+    """
+    Acrescenta linhas ao CSV em O(página), respeitando o limite de registros.
+
+    sources, opcional, é a lista [(digest, n_linhas), ...] dos arquivos de
+    origem na ordem das linhas; o digest de cada arquivo gravado por inteiro
+    entra no estado, na mesma escrita.
+
+    Retorna (estado, linhas_adicionadas).
+    """
+    state = load_state(csv_file)
+
+    remaining = max_records - state['row_count']
+    if remaining <= 0:
+        return state, 0
+
+    rows = rows[:remaining]
+    if not rows:
+        return state, 0
+
+    with open(csv_file, 'a', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerows(rows)
+
+    _update_state(state, rows)
+    state['csv_size'] = os.path.getsize(csv_file)
+    written = 0
+    for digest, n_rows in sources or ():
+        written += n_rows
+        if written > len(rows):
+            break
+        state['digests'].append(digest)
+    save_state(csv_file, state)
+    return state, len(rows)
+
+
+def top_ufs(state, n=10):
+    """Top N UFs por número de registros"""
+    return Counter(state['uf_counts']).most_common(n)
@@ -0,0 +1,385 @@
+"""
+Revisões de meses já armazenados (republicações do Portal)
+
+O Portal às vezes republica um mês com linhas incluídas, removidas ou
+corrigidas. Em vez de reprocessar o armazenamento inteiro, revise() compara a
+nova versão do mês com a partição gravada e aplica só a diferença:
+
+    periodo=202410/
+      dados.csv
+      _linhas.npy        chave, hash do conteúdo e deslocamento (em bytes) de
+                         cada linha de dados.csv, em ordem de chave
+      _deltas/
+        0001.csv.gz      Operação;UF;Município;...  I = inclusão, A = alteração
+                         (conteúdo novo), E = exclusão (conteúdo removido)
+      _metadata.json     + "revisions": resumo de cada delta aplicado
+
+A chave de linha é a mesma da remoção de duplicatas do coletor (CPF do
+Beneficiário dentro do período, primeira ocorrência). A diferença compara as
+chaves ordenadas das duas versões por busca binária, sem ler dados.csv; a
+aplicação copia os trechos inalterados de dados.csv em blocos de bytes, sem
+interpretar o CSV, e formata apenas as linhas incluídas e alteradas, que
+formam grupos novos ao fim do layout agrupado (row_groups), com os nomes e o
+município codificados nos dicionários (string_pool) como as demais linhas. O
+hash de conteúdo é calculado sobre as colunas decodificadas, e o delta grava as
+linhas decodificadas (DATA_COLUMNS). O índice
+_linhas.npy é criado na primeira revisão do mês e mantido pelas seguintes (uma
+nova coleta substitui a partição inteira, e com ela o índice e os deltas).
+"""
+
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import chunking
+import csv_writer
+import partition_store
+import row_groups
+import string_pool
+
+KEY_COLUMN = 'CPF do Beneficiário'
+OPERATION_COLUMN = 'Operação'
+INSERT, UPDATE, DELETE = 'I', 'A', 'E'
+DELTA_COLUMNS = [OPERATION_COLUMN] + partition_store.DATA_COLUMNS
+INDEX_FILE = '_linhas.npy'
+DELTA_DIR = '_deltas'
+INDEX_DTYPE = np.dtype([('key', np.uint64), ('hash', np.uint64), ('offset', np.int64)])
+COPY_BLOCK = 8 * 1024 * 1024
+
+
+def row_keys(frame):
+    """Chave de 64 bits de cada linha (hash do CPF mascarado, row_groups.beneficiary_keys)"""
+    return row_groups.beneficiary_keys(frame[KEY_COLUMN])
+
+
+def row_hashes(frame):
+    """Hash de 64 bits do conteúdo das colunas de dados de cada linha"""
+    return pd.util.hash_pandas_object(frame[partition_store.DATA_COLUMNS],
+                                      index=False).to_numpy()
+
+
+def _read_exact(f, size):
+    parts = []
+    while size > 0:
+        block = f.read(min(size, COPY_BLOCK))
+        if not block:
+            raise ValueError("arquivo de dados menor que o indicado no índice de linhas")
+        parts.append(block)
+        size -= len(block)
+    return b''.join(parts)
+
+
+def _copy(f, writer, size):
+    while size > 0:
+        block = _read_exact(f, min(size, COPY_BLOCK))
+        writer.write_bytes(block)
+        size -= len(block)
+
+
+def _line_starts(data, base=0):
+    """Deslocamento do início de cada linha de um bloco de bytes terminado em \\n"""
+    newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+    return np.concatenate([[0], newlines[:-1] + 1]).astype(np.int64)[:len(newlines)] + base
+
+
+def build_index(root, year_month, meta):
+    """
+    Índice de linhas do arquivo de dados da partição: chave, hash (das colunas
+    decodificadas) e deslocamento em bytes (descomprimidos) de cada linha, em
+    ordem de chave. Retorna (índice, tamanho em bytes).
+    """
+    path = os.path.join(partition_store.partition_dir(root, year_month), meta['data_file'])
+    rows = meta['rows']
+    offsets, size = row_groups.line_offsets(path)
+    if len(offsets) != rows:
+        raise ValueError(f"{path}: {len(offsets)} linhas físicas para {rows} registros "
+                         "(quebra de linha dentro de um campo?)")
+
+    keys, hashes = [], []
+    for chunk in partition_store.read_chunks(root, year_month, meta=meta):
+        keys.append(row_keys(chunk))
+        hashes.append(row_hashes(chunk))
+
+    index = np.empty(rows, dtype=INDEX_DTYPE)
+    index['key'] = np.concatenate(keys) if keys else []
+    index['hash'] = np.concatenate(hashes) if hashes else []
+    index['offset'] = offsets
+    return index[np.argsort(index['key'], kind='stable')], size
+
+
+def load_index(root, year_month, meta, log=None):
+    """Índice de linhas da partição, criado (e gravado) se ausente ou desatualizado"""
+    path = os.path.join(partition_store.partition_dir(root, year_month), INDEX_FILE)
+    if os.path.exists(path):
+        index = np.load(path)
+        if len(index) == meta['rows']:
+            return index
+    if log:
+        log(f"Criando o índice de linhas de {year_month} ({meta['rows']:,} linhas)")
+    index, _ = build_index(root, year_month, meta)
+    _save(path, index)
+    return index
+
+
+def _save(path, index):
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, index)
+    os.replace(path + '.tmp', path)
+
+
+def _release_chunks(release_file, year_month):
+    """Chunks da nova versão do mês (layout do arquivo temporário do coletor)"""
+    for chunk in chunking.read_csv_chunks(release_file, sep=';', dtype=str,
+                                          keep_default_na=False):
+        missing = [c for c in partition_store.DATA_COLUMNS if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"{release_file}: colunas ausentes: {missing}")
+        if partition_store.PERIOD_COLUMN in chunk.columns:
+            chunk = chunk[chunk[partition_store.PERIOD_COLUMN] == year_month]
+        yield chunk
+
+
+def scan_release(release_file, year_month):
+    """
+    Chaves, hashes e números de linha (no arquivo) da nova versão do mês,
+    apenas a primeira ocorrência de cada chave, na ordem do arquivo
+    """
+    keys, hashes, rows = [], [], []
+    for chunk in _release_chunks(release_file, year_month):
+        keys.append(row_keys(chunk))
+        hashes.append(row_hashes(chunk))
+        rows.append(chunk.index.to_numpy(dtype=np.int64))
+    if not keys:
+        return (np.empty(0, dtype=np.uint64),) * 2 + (np.empty(0, dtype=np.int64),)
+    keys = np.concatenate(keys)
+    _, first = np.unique(keys, return_index=True)
+    first.sort()
+    return keys[first], np.concatenate(hashes)[first], np.concatenate(rows)[first]
+
+
+def diff(index, keys, hashes):
+    """
+    Compara a versão gravada (índice em ordem de chave) com a nova (chaves
+    únicas). Retorna posições na nova versão das inclusões e alterações e
+    posições no índice das linhas alteradas e excluídas.
+    """
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    if len(index):
+        pos = np.minimum(np.searchsorted(index['key'], sorted_keys), len(index) - 1)
+        found = index['key'][pos] == sorted_keys
+    else:
+        pos = np.zeros(len(keys), dtype=np.int64)
+        found = np.zeros(len(keys), dtype=bool)
+    changed = found.copy()
+    changed[found] = index['hash'][pos[found]] != hashes[order][found]
+
+    kept = np.zeros(len(index), dtype=bool)
+    kept[pos[found]] = True
+    return {
+        'inserts': np.sort(order[~found]),
+        'updates': order[changed],
+        'updated': pos[changed],
+        'deletes': np.flatnonzero(~kept),
+    }
+
+
+def _release_rows(release_file, year_month, wanted):
+    """Linhas da nova versão pelos números de linha (em ordem crescente)"""
+    frames = []
+    for chunk in _release_chunks(release_file, year_month):
+        if len(chunk) == 0:
+            continue
+        selected = chunk[chunk.index.isin(wanted)]
+        if len(selected):
+            frames.append(selected)
+        if chunk.index[-1] >= wanted[-1]:
+            break
+    frame = pd.concat(frames) if frames else pd.DataFrame(columns=partition_store.DATA_COLUMNS)
+    return frame[partition_store.DATA_COLUMNS].reset_index(drop=True)
+
+
+def _stored_frame(root, meta, rows):
+    """Linhas (DATA_COLUMNS) no layout gravado da partição, com os ids dos dicionários"""
+    encoded = meta.get('string_pools')
+    if not encoded:
+        return rows[meta['columns']]
+    pools = string_pool.open_pools(root, writable=True)
+    ids = string_pool.encode_frame(pools, rows)
+    return rows.assign(**{column: ids[string_pool.ID_FIELDS[column]]
+                          for column in encoded})[meta['columns']]
+
+
+def _decoded_frame(root, meta, lines):
+    """Linhas removidas de dados.csv (bytes) decodificadas, no layout DATA_COLUMNS"""
+    reader = csv.reader(io.StringIO(b''.join(lines).decode('utf-8'), newline=''),
+                        delimiter=';')
+    return pd.DataFrame(list(partition_store.decode_rows(root, meta, reader)),
+                        columns=partition_store.DATA_COLUMNS)
+
+
+def _next_delta(directory):
+    numbers = [int(name.split('.')[0]) for name in os.listdir(directory)
+               if name.split('.')[0].isdigit()] if os.path.isdir(directory) else []
+    return f"{max(numbers, default=0) + 1:04d}.csv.gz"
+
+
+def revise(root, year_month, release_file, dry_run=False, log=None):
+    """
+    Aplica à partição `year_month` a diferença para a nova versão do mês em
+    `release_file` (CSV ';' com as DATA_COLUMNS e, opcionalmente, `periodo`,
+    como o arquivo temporário do coletor). Com `dry_run` apenas conta.
+    Retorna o resumo da revisão (inclusões, alterações, exclusões, linhas).
+    """
+    start = time.perf_counter()
+    meta = partition_store.read_metadata(root, year_month)
+    if sorted(meta['columns']) != sorted(partition_store.DATA_COLUMNS):
+        raise ValueError(f"partição {year_month} em layout antigo ({len(meta['columns'])} "
+                         "colunas); colete o mês novamente")
+    index = load_index(root, year_month, meta, log)
+    keys, hashes, rows = scan_release(release_file, year_month)
+    changes = diff(index, keys, hashes)
+    summary = {
+        'inserts': len(changes['inserts']),
+        'updates': len(changes['updates']),
+        'deletes': len(changes['deletes']),
+        'rows': len(index) + len(changes['inserts']) - len(changes['deletes']),
+        'delta': None,
+    }
+    if dry_run or not (summary['inserts'] or summary['updates'] or summary['deletes']):
+        summary['seconds'] = round(time.perf_counter() - start, 3)
+        return summary
+
+    directory = partition_store.partition_dir(root, year_month)
+    data_file = os.path.join(directory, meta['data_file'])
+
+    # Linhas novas (alteradas e incluídas), na ordem do agrupamento da partição
+    new_positions = np.sort(np.concatenate([changes['updates'], changes['inserts']]))
+    new_rows = _release_rows(release_file, year_month, rows[new_positions])
+    new_municipios = row_groups.fold_values(new_rows['Município'])
+    order = row_groups.cluster_order(new_rows['UF'], new_municipios, keys[new_positions])
+    new_rows = new_rows.iloc[order].reset_index(drop=True)
+    new_municipios, new_positions = new_municipios[order], new_positions[order]
+    new_text = csv_writer.format_rows(_stored_frame(root, meta, new_rows)).encode('utf-8')
+
+    # Trechos removidos de dados.csv (alteradas e excluídas), em ordem de posição
+    removed = np.concatenate([changes['updated'], changes['deletes']])
+    offsets = np.sort(index['offset'])
+    ends = np.append(offsets, meta['bytes'])[np.searchsorted(offsets, index['offset'][removed],
+                                                             side='right')]
+    by_offset = np.argsort(index['offset'][removed])
+    spans = np.stack([index['offset'][removed], ends], axis=1)[by_offset]
+    deleted = (by_offset >= len(changes['updated'])).tolist()
+
+    # Os grupos existentes perdem as linhas removidas (a zona continua válida,
+    # só mais larga); as linhas novas formam grupos novos ao fim
+    layout = row_groups.load(directory)
+    header_end = int(offsets[0]) if len(offsets) else meta['bytes']
+    segments = ([group['raw'] for group in layout['groups']] if layout
+                else [(header_end, meta['bytes'])])
+    starts = np.append(_line_starts(new_text), len(new_text))
+    bounds = list(range(0, len(new_rows), row_groups.ROW_GROUP_ROWS)) + [len(new_rows)]
+    new_groups, new_blooms = row_groups.zones(new_rows['UF'], new_municipios,
+                                              keys[new_positions], bounds)
+
+    writer = row_groups.GroupWriter(os.path.join(directory, 'novo_' + meta['data_file']),
+                                    partition_store.compression_of(data_file))
+    groups, blooms, deleted_lines = [], [], []
+    try:
+        with partition_store.open_binary(data_file) as f:
+            _copy(f, writer, header_end)
+            header = writer.end_group()
+            position, span = header_end, 0
+            for number, (segment_start, segment_end) in enumerate(segments):
+                removed_rows = 0
+                while span < len(spans) and spans[span][0] < segment_end:
+                    span_start, span_end = spans[span].tolist()
+                    _copy(f, writer, span_start - position)
+                    line = _read_exact(f, span_end - span_start)
+                    if deleted[span]:
+                        deleted_lines.append(line)
+                    position = span_end
+                    span += 1
+                    removed_rows += 1
+                _copy(f, writer, segment_end - position)
+                position = segment_end
+                record = writer.end_group(layout['groups'][number] if layout else None)
+                if layout and record['raw'][1] > record['raw'][0]:
+                    record['rows'] -= removed_rows
+                    groups.append(record)
+                    blooms.append(layout['blooms'][number])
+        for i, record in enumerate(new_groups):
+            writer.write_bytes(new_text[starts[bounds[i]]:starts[bounds[i + 1]]])
+            groups.append(writer.end_group(record))
+            blooms.append(new_blooms[i])
+    finally:
+        writer.close()
+
+    # Delta: inclusões e alterações com o conteúdo novo, exclusões com o removido
+    delta_dir = os.path.join(directory, DELTA_DIR)
+    os.makedirs(delta_dir, exist_ok=True)
+    delta_name = _next_delta(delta_dir)
+    operations = np.where(np.isin(new_positions, changes['inserts']), INSERT, UPDATE)
+    with csv_writer.CsvWriter(os.path.join(delta_dir, delta_name), columns=DELTA_COLUMNS,
+                              compression='gzip') as delta:
+        delta.write(new_rows.assign(**{OPERATION_COLUMN: operations}))
+        delta.write(_decoded_frame(root, meta, deleted_lines).assign(
+            **{OPERATION_COLUMN: DELETE}))
+
+    # Índice: desloca as linhas mantidas e acrescenta as novas ao fim
+    removed_lengths = spans[:, 1] - spans[:, 0]
+    keep = np.ones(len(index), dtype=bool)
+    keep[removed] = False
+    kept = index[keep]
+    kept['offset'] -= np.append(0, np.cumsum(removed_lengths))[
+        np.searchsorted(spans[:, 0], kept['offset'])]
+    added = np.empty(len(new_positions), dtype=INDEX_DTYPE)
+    added['key'] = keys[new_positions]
+    added['hash'] = hashes[new_positions]
+    added['offset'] = _line_starts(new_text, meta['bytes'] - int(removed_lengths.sum()))
+    new_index = np.concatenate([kept, added])
+    new_index = new_index[np.argsort(new_index['key'], kind='stable')]
+
+    os.replace(writer.path, data_file)
+    _save(os.path.join(directory, INDEX_FILE), new_index)
+    if layout:
+        row_groups.save(directory, header, groups, blooms)
+
+    meta['rows'] = len(new_index)
+    meta['bytes'] = writer.raw_bytes
+    summary['delta'] = os.path.join(DELTA_DIR, delta_name)
+    meta.setdefault('revisions', []).append({
+        'delta': summary['delta'],
+        'applied_at': datetime.now().isoformat(timespec='seconds'),
+        'inserts': summary['inserts'],
+        'updates': summary['updates'],
+        'deletes': summary['deletes'],
+        'rows': meta['rows'],
+    })
+    metadata_path = os.path.join(directory, partition_store.METADATA_FILE)
+    with open(metadata_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    os.replace(metadata_path + '.tmp', metadata_path)
+
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    if log:
+        log(f"Revisão de {year_month}: {describe(summary)} em {summary['seconds']}s "
+            f"({summary['delta']})")
+    return summary
+
+
+def describe(summary):
+    return (f"{summary['inserts']:,} inclusões, {summary['updates']:,} alterações, "
+            f"{summary['deletes']:,} exclusões -> {summary['rows']:,} linhas")
+
+
+def read_delta(root, year_month, delta):
+    """DataFrame de um delta aplicado (caminho relativo à partição, como no metadata)"""
+    path = os.path.join(partition_store.partition_dir(root, year_month), delta)
+    return pd.read_csv(path, sep=';', dtype=str, keep_default_na=False)
@@ -0,0 +1,451 @@
+"""
+Armazenamento particionado por período dos dados consolidados
+
+    <raiz>/
+      periodo=202401/
+        dados.csv          # colunas de dados (UF, CPF do Beneficiário, ...; nomes e
+                           # município como ids dos dicionários, string_pool)
+        _metadata.json     # constantes do período, colunas, linhas, bytes
+        _grupos.json       # mapas de zona dos grupos de linhas (row_groups)
+        _bloom.npy         # filtros de Bloom do CPF por grupo (row_groups)
+        _linhas.npy        # chave, hash e posição de cada linha (partition_delta)
+        _deltas/           # revisões aplicadas ao mês (partition_delta)
+      periodo=202402/
+      ...
+      _dicionario/         # dicionários globais de strings (string_pool)
+
+`Detalhar` e `Mês Referência` são iguais em todas as linhas de um mês, então
+ficam só no _metadata.json da partição e são materializadas apenas quando o
+CSV legado de 8 colunas é exportado (export_legacy).
+
+Depois das colunas legadas, dados.csv guarda os códigos de etapa e de tipo de
+incentivo, a data do pagamento e o CPF do representante (EXTRA_COLUMNS),
+usados pela linha do tempo e pelas análises e ignorados na exportação legada.
+
+Beneficiário, Representante Legal e Município (ENCODED_COLUMNS) são gravados
+como ids int32 dos dicionários globais (string_pool), ao fim de cada linha:
+_metadata.json traz as colunas na ordem gravada ('columns') e o dicionário de
+cada coluna codificada ('string_pools'). read_chunks, iter_rows e iter_records
+decodificam os ids na leitura; partições gravadas antes dos dicionários (sem
+'string_pools') guardam as strings e são lidas como antes.
+
+As linhas de cada partição ficam ordenadas por UF, município e beneficiário,
+em grupos com mapas de zona (row_groups); iter_rows e iter_records com filtro
+de UF, município ou CPF leem só os grupos que podem conter as linhas pedidas.
+
+pandas e csv_writer são importados apenas nas funções de escrita/exportação
+(row_groups só nas leituras filtradas e string_pool só nas partições
+codificadas), para que a leitura sem filtro de partições sem ids (iter_rows)
+continue leve no CLI.
+"""
+
+import contextlib
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import shutil
+
+import config
+
+LEGACY_COLUMNS = [
+    'Detalhar', 'Mês Referência', 'UF', 'Município', 'Beneficiário',
+    'CPF do Beneficiário', 'Representante Legal', 'Valor Disponibilizado',
+]
+CONSTANT_COLUMNS = ['Detalhar', 'Mês Referência']
+LEGACY_DATA_COLUMNS = [c for c in LEGACY_COLUMNS if c not in CONSTANT_COLUMNS]
+EXTRA_COLUMNS = ['Código Etapa Ensino', 'Código Tipo Incentivo', 'Data do Pagamento',
+                 'CPF do Representante']
+DATA_COLUMNS = LEGACY_DATA_COLUMNS + EXTRA_COLUMNS
+RECORD_COLUMNS = CONSTANT_COLUMNS + DATA_COLUMNS
+PERIOD_COLUMN = 'periodo'
+
+DATA_FILE = 'dados.csv'
+UNSORTED_FILE = 'desordenado.csv'
+GROUPS_FILE = '_grupos.json'
+CLUSTER_COLUMNS = ['UF', 'Município', 'CPF do Beneficiário']
+ENCODED_COLUMNS = ['Beneficiário', 'Representante Legal', 'Município']
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}  # mesmas de csv_writer
+DECODE_BATCH = 4096  # linhas decodificadas de uma vez em iter_rows/iter_records
+METADATA_FILE = '_metadata.json'
+DETAIL_URL = "https://portaldatransparencia.gov.br/beneficios/pe-de-meia/{year_month}"
+
+
+def default_root():
+    return config.data_path("pe_de_meia_particoes")
+
+
+def period_constants(year_month):
+    """Valores constantes das colunas legadas em um período AAAAMM"""
+    return {
+        'Detalhar': DETAIL_URL.format(year_month=year_month),
+        'Mês Referência': f"{year_month[4:]}/{year_month[:4]}",
+    }
+
+
+def partition_dir(root, year_month):
+    return os.path.join(root, f"periodo={year_month}")
+
+
+def list_periods(root):
+    """Períodos com partição completa (metadata gravado), em ordem"""
+    if not os.path.isdir(root):
+        return []
+    periods = []
+    for name in os.listdir(root):
+        if name.startswith('periodo=') and \
+                os.path.exists(os.path.join(root, name, METADATA_FILE)):
+            periods.append(name.split('=', 1)[1])
+    return sorted(periods)
+
+
+def read_metadata(root, year_month):
+    with open(os.path.join(partition_dir(root, year_month), METADATA_FILE), 'r',
+              encoding='utf-8') as f:
+        return json.load(f)
+
+
+def data_path(root, year_month):
+    """Caminho do arquivo de dados da partição (com a extensão da compressão)"""
+    meta = read_metadata(root, year_month)
+    return os.path.join(partition_dir(root, year_month), meta['data_file'])
+
+
+def total_rows(root):
+    return sum(read_metadata(root, ym)['rows'] for ym in list_periods(root))
+
+
+def clear(root):
+    """Remove todas as partições"""
+    for year_month in list_periods(root):
+        shutil.rmtree(partition_dir(root, year_month))
+
+
+def open_binary(path):
+    """Bytes descomprimidos de um arquivo de dados (.csv, .csv.gz ou .csv.zst)"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def compression_of(path):
+    """Compressão ('gzip', 'zstd' ou None) pela extensão do arquivo de dados"""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return None
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    if path.endswith('.zst'):
+        import io
+        return io.TextIOWrapper(open_binary(path), encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+class PartitionWriter:
+    """
+    Grava chunks com a coluna `periodo` nas partições correspondentes. Cada
+    partição é escrita em um diretório temporário e só substitui a anterior
+    no close(), junto com o _metadata.json. Com `cluster` (padrão), as linhas
+    são gravadas primeiro sem compressão e reordenadas em grupos no close()
+    (row_groups.cluster). Com `string_pools` (padrão, requer `cluster`), as
+    ENCODED_COLUMNS não vão para o arquivo intermediário: no close() viram ids
+    dos dicionários globais (string_pool), acrescentados ao fim de cada linha
+    na reordenação. `part_columns` são as colunas do arquivo intermediário (e
+    das partes de append_part); `stored_columns`, as de dados.csv.
+    """
+
+    def __init__(self, root, compression=None, cluster=True, string_pools=True):
+        if string_pools and not cluster:
+            raise ValueError("string_pools requer cluster (os ids entram na reordenação)")
+        self.root = root
+        self.compression = compression
+        self.cluster = cluster
+        self.string_pools = string_pools
+        self._writers = {}
+        self._columns = {}  # período -> colunas de agrupamento/codificação já escritas
+        self._pools = None
+        self.collected_columns = []
+        if cluster:
+            self.collected_columns += CLUSTER_COLUMNS
+        if string_pools:
+            self.collected_columns += [c for c in ENCODED_COLUMNS if c not in self.collected_columns]
+        self.part_columns = [c for c in DATA_COLUMNS
+                             if not string_pools or c not in ENCODED_COLUMNS]
+        self.stored_columns = self.part_columns + (ENCODED_COLUMNS if string_pools else [])
+        os.makedirs(root, exist_ok=True)
+
+    def _writer(self, year_month):
+        writer = self._writers.get(year_month)
+        if writer is None:
+            import csv_writer
+            tmp_dir = partition_dir(self.root, year_month) + '.tmp'
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            if self.cluster:
+                writer = csv_writer.CsvWriter(os.path.join(tmp_dir, UNSORTED_FILE),
+                                              columns=self.part_columns)
+            else:
+                writer = csv_writer.CsvWriter(os.path.join(tmp_dir, DATA_FILE),
+                                              columns=DATA_COLUMNS, compression=self.compression)
+            self._writers[year_month] = writer
+        return writer
+
+    def _write(self, year_month, df):
+        if self.collected_columns:
+            columns = self._columns.setdefault(year_month, {})
+            for column in self.collected_columns:
+                columns.setdefault(column, []).append(df[column].to_numpy(dtype=object,
+                                                                          na_value=''))
+        return self._writer(year_month).write(df[self.part_columns])
+
+    def append_part(self, year_month, path, rows, columns=None):
+        """
+        Acrescenta à partição um CSV parcial já formatado (`part_columns`, sem
+        cabeçalho), gravado por outro processo; `columns` traz as colunas
+        `collected_columns` dessas linhas, na ordem. Retorna os bytes.
+        """
+        if self.collected_columns:
+            collected = self._columns.setdefault(year_month, {})
+            for column in self.collected_columns:
+                collected.setdefault(column, []).append(columns[column])
+        return self._writer(year_month).append_file(path, rows, self.part_columns)
+
+    def write(self, df):
+        """Escreve um chunk; retorna os bytes (não comprimidos) escritos"""
+        nbytes = 0
+        periods = df[PERIOD_COLUMN].unique()
+        if len(periods) == 1:
+            return self._write(str(periods[0]), df)
+        for year_month, group in df.groupby(PERIOD_COLUMN, sort=False):
+            nbytes += self._write(str(year_month), group)
+        return nbytes
+
+    def _encode(self, columns):
+        """(nomes, matriz linhas x colunas de ids) das ENCODED_COLUMNS coletadas"""
+        import numpy as np
+        import string_pool
+        if self._pools is None:
+            self._pools = string_pool.open_pools(self.root, writable=True)
+        ids = string_pool.encode_columns(
+            self._pools, {column: np.concatenate(columns[column]) for column in ENCODED_COLUMNS})
+        return ENCODED_COLUMNS, np.column_stack(
+            [ids[string_pool.ID_FIELDS[column]] for column in ENCODED_COLUMNS])
+
+    def close(self):
+        for year_month, writer in sorted(self._writers.items()):
+            writer.close()
+            tmp_dir = os.path.dirname(writer.path)
+            data_file = writer.path
+            nbytes = writer.bytes_written
+            columns = self._columns.pop(year_month, None)
+            if self.cluster:
+                import csv_writer
+                import row_groups
+                data_file = csv_writer.output_path(os.path.join(tmp_dir, DATA_FILE),
+                                                   self.compression)
+                appended = self._encode(columns) if self.string_pools else None
+                _, nbytes = row_groups.cluster(writer.path, data_file, self.compression, columns,
+                                               appended)
+                os.remove(writer.path)
+            meta = {
+                'period': year_month,
+                'constants': period_constants(year_month),
+                'columns': self.stored_columns if self.cluster else DATA_COLUMNS,
+                'rows': writer.rows_written,
+                'bytes': nbytes,
+                'data_file': os.path.basename(data_file),
+            }
+            if self.string_pools:
+                import string_pool
+                meta['string_pools'] = {column: string_pool.COLUMN_POOLS[column]
+                                        for column in ENCODED_COLUMNS}
+            with open(os.path.join(tmp_dir, METADATA_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2, ensure_ascii=False)
+
+            final_dir = partition_dir(self.root, year_month)
+            shutil.rmtree(final_dir, ignore_errors=True)
+            os.replace(tmp_dir, final_dir)
+        self._writers.clear()
+        self._columns.clear()
+
+    def abort(self):
+        """Descarta as partições em escrita (as anteriores são mantidas)"""
+        for writer in self._writers.values():
+            writer.close()
+            shutil.rmtree(os.path.dirname(writer.path), ignore_errors=True)
+        self._writers.clear()
+        self._columns.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_chunks(root, year_month, columns=None, stats=None, meta=None, decode=True):
+    """
+    Chunks (DataFrames de str, chunking.read_csv_chunks) de uma partição, na
+    ordem das linhas, com as colunas `columns` (padrão: DATA_COLUMNS) que a
+    partição tiver. As colunas gravadas como ids são decodificadas; com
+    `decode=False` vêm como ids (int64) e as strings não são lidas.
+    """
+    import chunking
+    import numpy as np
+
+    meta = meta or read_metadata(root, year_month)
+    wanted = [c for c in (columns or DATA_COLUMNS) if c in meta['columns']]
+    encoded = {c: pool for c, pool in meta.get('string_pools', {}).items() if c in wanted}
+    pools = None
+    if encoded and decode:
+        import string_pool
+        pools = string_pool.open_pools(root)
+    path = os.path.join(partition_dir(root, year_month), meta['data_file'])
+    for chunk in chunking.read_csv_chunks(path, stats=stats, sep=';', usecols=wanted,
+                                          dtype={c: np.int64 if c in encoded else str
+                                                 for c in wanted},
+                                          keep_default_na=False):
+        if pools is not None:
+            for column, pool in encoded.items():
+                chunk[column] = pools[pool].decode(chunk[column].to_numpy())
+        yield chunk[wanted]
+
+
+def decode_rows(root, meta, rows):
+    """
+    Linhas gravadas (colunas do metadata) no layout DATA_COLUMNS, vazias as
+    colunas ausentes em partições antigas, com os ids decodificados em lotes
+    de DECODE_BATCH linhas
+    """
+    positions = [meta['columns'].index(c) if c in meta['columns'] else None
+                 for c in DATA_COLUMNS]
+    encoded = meta.get('string_pools')
+    if not encoded:
+        for row in rows:
+            yield [row[p] if p is not None else '' for p in positions]
+        return
+
+    import numpy as np
+    import string_pool
+    pools = string_pool.open_pools(root)
+    decoders = [(DATA_COLUMNS.index(column), meta['columns'].index(column), pools[pool])
+                for column, pool in encoded.items()]
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, DECODE_BATCH))
+        if not batch:
+            return
+        values = [(target, pool.decode(np.array([row[source] for row in batch], dtype=np.int64)))
+                  for target, source, pool in decoders]
+        for i, row in enumerate(batch):
+            decoded = [row[p] if p is not None else '' for p in positions]
+            for target, strings in values:
+                decoded[target] = strings[i]
+            yield decoded
+
+
+def _partition_rows(root, year_month, meta, uf=None, municipio=None, cpf=None):
+    """
+    Linhas (layout DATA_COLUMNS, decodificadas) de uma partição. Com `uf`,
+    `municipio` (comparado sem acentos, schema_registry.fold) ou `cpf`, só as
+    linhas com esses valores, lidas apenas dos grupos que podem contê-las
+    (row_groups).
+    """
+    directory = partition_dir(root, year_month)
+    path = os.path.join(directory, meta['data_file'])
+    if uf is None and municipio is None and cpf is None:
+        with _open_text(path) as f:
+            reader = csv.reader(f, delimiter=';')
+            next(reader, None)
+            yield from decode_rows(root, meta, reader)
+        return
+
+    import schema_registry
+    columns = meta['columns']
+    checks = [(columns.index(column), value)
+              for column, value in (('UF', uf), ('CPF do Beneficiário', cpf)) if value is not None]
+    municipio_at = DATA_COLUMNS.index('Município')
+    if municipio is not None:
+        municipio = schema_registry.fold(municipio)
+    folded = {}
+
+    with contextlib.ExitStack() as stack:
+        if os.path.exists(os.path.join(directory, GROUPS_FILE)):
+            import row_groups
+            blocks = row_groups.read_groups(path, row_groups.select(
+                row_groups.load(directory), uf, municipio, cpf))
+            reader = (row for block in blocks
+                      for row in csv.reader(io.StringIO(block.decode('utf-8'), newline=''),
+                                            delimiter=';'))
+        else:
+            reader = csv.reader(stack.enter_context(_open_text(path)), delimiter=';')
+            next(reader, None)
+        # UF e CPF são comparados antes da decodificação (nunca são ids)
+        matching = (row for row in reader
+                    if all(row[position] == value for position, value in checks))
+        for row in decode_rows(root, meta, matching):
+            if municipio is not None:
+                name = row[municipio_at]
+                if name not in folded:
+                    folded[name] = schema_registry.fold(name)
+                if folded[name] != municipio:
+                    continue
+            yield row
+
+
+def iter_rows(root, periods=None, uf=None, municipio=None, cpf=None):
+    """
+    Linhas no layout legado (8 colunas), com as constantes de cada partição
+    acrescentadas na leitura. Usa apenas o módulo csv (e row_groups com
+    filtro de UF, município ou CPF).
+    """
+    width = len(LEGACY_DATA_COLUMNS)
+    for year_month in periods if periods is not None else list_periods(root):
+        meta = read_metadata(root, year_month)
+        prefix = [meta['constants'][c] for c in CONSTANT_COLUMNS]
+        for row in _partition_rows(root, year_month, meta, uf, municipio, cpf):
+            yield prefix + row[:width]
+
+
+def iter_records(root, periods=None, uf=None, municipio=None, cpf=None):
+    """
+    Linhas completas (RECORD_COLUMNS: legadas + extras), com as constantes
+    acrescentadas e as extras ausentes em partições antigas vazias; filtros
+    como em iter_rows
+    """
+    for year_month in periods if periods is not None else list_periods(root):
+        meta = read_metadata(root, year_month)
+        prefix = [meta['constants'][c] for c in CONSTANT_COLUMNS]
+        for row in _partition_rows(root, year_month, meta, uf, municipio, cpf):
+            yield prefix + row
+
+
+def export_legacy(root, output_file, compression=None, periods=None, sep=';', encoding='utf-8'):
+    """
+    Exporta o CSV legado de 8 colunas, materializando as colunas constantes.
+    Retorna o número de linhas escritas.
+    """
+    import csv_writer
+
+    with csv_writer.CsvWriter(output_file, columns=LEGACY_COLUMNS, sep=sep, encoding=encoding,
+                              compression=compression) as writer:
+        for year_month in periods if periods is not None else list_periods(root):
+            meta = read_metadata(root, year_month)
+            constants = meta['constants']
+            for chunk in read_chunks(root, year_month, LEGACY_DATA_COLUMNS, meta=meta):
+                for position, column in enumerate(CONSTANT_COLUMNS):
+                    chunk.insert(position, column, constants[column])
+                writer.write(chunk)
+        return writer.rows_written
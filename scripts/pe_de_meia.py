@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+pe-de-meia: ponto de entrada único para os scripts do projeto
+
+Subcomandos:
+  collect  coleta os arquivos mensais do Portal (coletar_pe_de_meia_*.py)
+  scrape   raspagem da tabela do Portal via Selenium (scraper_*.py)
+  append   acrescenta a página exportada do navegador (append_page_data.py)
+  stats    estatísticas do CSV coletado pelo navegador
+  query    filtra registros de um CSV coletado ou do armazenamento particionado
+  export   gera o CSV legado de 8 colunas (ou várias entregas em uma leitura)
+  timeline constrói ou consulta a linha do tempo de pagamentos por beneficiário
+  anomalias tabela de anomalias (representantes, municípios) do armazenamento
+  representantes índice representante legal -> beneficiários (grau, vizinhança)
+  nomes    busca aproximada de nomes de beneficiários e representantes
+  revisar  aplica a republicação de um mês como delta (inclusões, alterações, exclusões)
+  api      API HTTP local (agregados, consultas e fatias do armazenamento)
+
+Dependências pesadas (pandas, selenium) são importadas apenas dentro do
+subcomando que precisa delas, para que os subcomandos simples iniciem rápido.
+"""
+
+import time
+
+_START = time.perf_counter()
+_INTERPRETER_CPU = time.process_time()  # CPU gasta pelo interpretador antes deste módulo
+
+import argparse
+import contextlib
+import importlib
+import os
+import sys
+
+import config
+
+BROWSER_CSV = config.data_path("dados_portal_transparencia.csv")
+CONSOLIDATED_CSV = config.data_path("dados_portal_transparencia_completo.csv")
+PARTITION_STORE = config.data_path("pe_de_meia_particoes")
+TIMELINE_ROOT = config.data_path("pe_de_meia_linha_do_tempo")
+ANOMALIES_CSV = config.data_path("pe_de_meia_anomalias.csv")
+REPRESENTATIVES_ROOT = config.data_path("pe_de_meia_representantes")
+NAMES_ROOT = config.data_path("pe_de_meia_nomes")
+NAME_ROLES = {'beneficiario': 'Beneficiário', 'representante': 'Representante Legal'}
+
+# estratégia -> (módulo, main() aceita argv)
+COLLECT_STRATEGIES = {
+    'memoria': ('coletar_pe_de_meia_memoria_otimizada', True),
+    'final': ('coletar_pe_de_meia_final', False),
+    'otimizado': ('coletar_pe_de_meia_otimizado', False),
+    'completo': ('coletar_pe_de_meia_completo', False),
+}
+
+SCRAPE_MODES = {
+    'final': ('scraper_portal_final', 'scrape_all_data'),
+    'transparencia': ('scraper_portal_transparencia', 'scrape_portal_transparencia'),
+    'simples': ('scraper_simples', 'main'),
+}
+
+
+def _passthrough(options):
+    """Opções repassadas a outro script, sem o separador '--' (mantido pelo REMAINDER)"""
+    return options[1:] if options[:1] == ['--'] else options
+
+
+def cmd_collect(args):
+    args.opcoes = _passthrough(args.opcoes)
+    module_name, accepts_argv = COLLECT_STRATEGIES[args.estrategia]
+    if args.opcoes and not accepts_argv:
+        print(f"A estratégia '{args.estrategia}' não aceita opções: {' '.join(args.opcoes)}")
+        return False
+    module = importlib.import_module(module_name)
+    return module.main(args.opcoes) if accepts_argv else module.main()
+
+
+def cmd_scrape(args):
+    module_name, func_name = SCRAPE_MODES[args.modo]
+    module = importlib.import_module(module_name)
+    result = getattr(module, func_name)()
+    return result is not False
+
+
+def cmd_append(args):
+    if args.watch:
+        import ingest_watch
+        return ingest_watch.main(['--csv', args.csv])
+
+    import append_page_data
+    return append_page_data.get_data_from_browser(args.csv)
+
+
+def cmd_stats(args):
+    import page_sink
+
+    try:
+        state = page_sink.load_state(args.csv)
+    except FileNotFoundError:
+        print(f"Arquivo não encontrado: {args.csv}")
+        return False
+
+    print(f"Arquivo: {args.csv}")
+    print(f"Total de registros: {state['row_count']:,}")
+    print(f"Progresso: {state['row_count']/page_sink.MAX_RECORDS*100:.1f}% "
+          f"(limite: {page_sink.MAX_RECORDS:,} registros)")
+    print(f"\nDistribuição por UF (Top {args.top}):")
+    for uf, count in page_sink.top_ufs(state, args.top):
+        print(f"  {uf}: {count:,} registros")
+    print(f"\nValor total: R$ {state['total_valor']:,.2f}")
+    return True
+
+
+def _store_periods(root, mes):
+    """Partições do armazenamento, já podadas pelo Mês Referência (MM/AAAA)"""
+    import partition_store
+
+    periods = partition_store.list_periods(root)
+    if mes:
+        periods = [ym for ym in periods
+                   if partition_store.period_constants(ym)['Mês Referência'] == mes]
+    return periods
+
+
+def cmd_query(args):
+    import csv
+
+    source = args.csv
+    if source is None:
+        source = CONSOLIDATED_CSV if os.path.exists(CONSOLIDATED_CSV) else PARTITION_STORE
+    if not os.path.exists(source):
+        print(f"Arquivo não encontrado: {source}")
+        return False
+
+    with contextlib.ExitStack() as stack:
+        if os.path.isdir(source):
+            import partition_store
+            headers, sep = partition_store.LEGACY_COLUMNS, ';'
+            # UF e CPF exatos também podam os grupos de linhas das partições
+            rows = partition_store.iter_rows(source, _store_periods(source, args.mes),
+                                             uf=args.uf.upper() if args.uf else None,
+                                             cpf=args.cpf)
+        else:
+            f = stack.enter_context(open(source, 'r', encoding='utf-8-sig', newline=''))
+            header_line = f.readline()
+            sep = ';' if ';' in header_line else ','
+            headers = next(csv.reader([header_line], delimiter=sep))
+            rows = csv.reader(f, delimiter=sep)
+        columns = {name: i for i, name in enumerate(headers)}
+
+        wanted = [('UF', args.uf, lambda v, uf=(args.uf or '').upper(): v == uf),
+                  ('Mês Referência', args.mes, lambda v, mes=args.mes: v == mes),
+                  ('Município', args.municipio,
+                   lambda v, m=(args.municipio or '').upper(): m in v.upper()),
+                  ('CPF do Beneficiário', args.cpf, lambda v, cpf=args.cpf: v == cpf),
+                  ('Beneficiário', args.nome,
+                   lambda v, n=(args.nome or '').upper(): n in v.upper())]
+        wanted = [(name, check) for name, value, check in wanted if value]
+        missing = [name for name, _ in wanted if name not in columns]
+        if missing:
+            print(f"Coluna(s) ausente(s) em {source}: {', '.join(missing)}")
+            return False
+        filters = [(columns[name], check) for name, check in wanted]
+
+        writer = csv.writer(sys.stdout, delimiter=sep, lineterminator='\n')
+        if not args.contar:
+            writer.writerow(headers)
+
+        matches = 0
+        for row in rows:
+            if all(check(row[idx]) for idx, check in filters):
+                matches += 1
+                if not args.contar:
+                    writer.writerow(row)
+                    if matches >= args.limite:
+                        break
+
+    if args.contar:
+        print(matches)
+    return True
+
+
+def cmd_export(args):
+    import csv_writer
+    import partition_store
+
+    periods = _store_periods(args.store, args.mes)
+    if not periods:
+        print(f"Nenhuma partição encontrada em {args.store}")
+        return False
+
+    if args.entregas:
+        import export_engine
+
+        where = {'UF': [uf.strip().upper() for uf in args.uf.split(',')]} if args.uf else None
+        os.makedirs(args.destino, exist_ok=True)
+        engine = export_engine.ExportEngine(args.store, periods)
+        try:
+            for name in args.entregas.split(','):
+                engine.add(export_engine.deliverable_sink(name.strip(), args.destino,
+                                                          args.compressao, where))
+            engine.run(log=print)
+        except (ValueError, RuntimeError) as e:
+            print(f"Erro na exportação: {e}")
+            return False
+        return True
+
+    output = csv_writer.output_path(args.saida, args.compressao)
+    rows = partition_store.export_legacy(args.store, output, args.compressao, periods)
+    print(f"{rows:,} registros de {len(periods)} período(s) exportados para {output}")
+    return True
+
+
+def cmd_timeline(args):
+    import timeline
+
+    if args.construir:
+        if not _store_periods(args.store, None):
+            print(f"Nenhuma partição encontrada em {args.store}")
+            return False
+        meta = timeline.build(args.store, args.raiz, log=print)
+        print(f"{meta['beneficiaries']:,} beneficiários, {meta['payments']:,} pagamentos "
+              f"em {args.raiz}")
+        return True
+
+    if not os.path.exists(os.path.join(args.raiz, timeline.METADATA_FILE)):
+        print(f"Linha do tempo não encontrada: {args.raiz} (use --construir)")
+        return False
+    if not args.cpf and not args.nome:
+        print("Informe --cpf e/ou --nome")
+        return False
+
+    if args.cpf and args.nome and not args.contem:
+        index = timeline.lookup(args.raiz, args.cpf, args.nome)
+        found = [] if index is None else [(index, {'CPF do Beneficiário': args.cpf,
+                                                   'Beneficiário': args.nome})]
+    else:
+        found = timeline.find(args.raiz, args.cpf, args.nome, args.limite)
+
+    for index, row in found:
+        payments = timeline.payments_of(args.raiz, index)
+        location = f" - {row['Município']}/{row['UF']}" if 'UF' in row else ''
+        print(f"{row['Beneficiário']} ({row['CPF do Beneficiário']}){location}: "
+              f"{len(payments)} pagamento(s)")
+        for payment in payments:
+            print(f"  {timeline.describe_payment(payment)}")
+    if not found:
+        print("Nenhum beneficiário encontrado")
+    return bool(found)
+
+
+def cmd_anomalies(args):
+    import anomalies
+
+    periods = _store_periods(args.store, None)
+    if not periods:
+        print(f"Nenhuma partição encontrada em {args.store}")
+        return False
+
+    scanner = anomalies.scan_store(args.store, periods, log=print)
+    findings = scanner.findings(top=args.limite)
+    anomalies.write_findings(findings, args.saida)
+    print(f"{len(findings):,} ocorrências em {args.saida}")
+    for kind, group in findings.groupby('tipo', sort=False):
+        for row in group.head(args.mostrar).itertuples(index=False):
+            print(f"  {kind} #{row.posicao} [{row.score}] {row.periodo} {row.chave}: {row.descricao}")
+    return True
+
+
+def cmd_representatives(args):
+    import representative_index
+
+    if args.atualizar or args.reconstruir:
+        periods = _store_periods(args.store, args.mes)
+        if not periods:
+            print(f"Nenhuma partição encontrada em {args.store}")
+            return False
+        build = representative_index.rebuild if args.reconstruir else representative_index.update
+        meta = build(args.raiz, args.store, periods, log=print)
+        print(f"{meta['representatives']:,} representantes, {meta['beneficiaries']:,} "
+              f"beneficiários, {meta['edges']:,} vínculos em {args.raiz}")
+        return True
+
+    if not os.path.exists(os.path.join(args.raiz, representative_index.METADATA_FILE)):
+        print(f"Índice não encontrado: {args.raiz} (use --atualizar)")
+        return False
+    index = representative_index.RepresentativeIndex(args.raiz)
+
+    if args.beneficiario:
+        if not (args.cpf and args.nome):
+            print("Com --beneficiario, informe --cpf e --nome do beneficiário")
+            return False
+        ben_id = index.beneficiary_id(args.cpf, args.nome)
+        rep_ids = [] if ben_id is None else index.representatives_of(ben_id)
+        for rep_id, identity in zip(rep_ids, index.representatives.identity(rep_ids)):
+            print(f"{identity}: {index.degree(rep_id)} beneficiário(s)")
+        if not len(rep_ids):
+            print("Nenhum representante encontrado")
+        return bool(len(rep_ids))
+
+    if args.maiores:
+        rep_ids = index.top(args.maiores)
+    elif args.cpf and args.nome and not args.contem:
+        rep_id = index.representative_id(args.cpf, args.nome)
+        rep_ids = [] if rep_id is None else [rep_id]
+    elif args.cpf or args.nome:
+        rep_ids = index.find_representatives(args.cpf, args.nome, args.limite)
+    else:
+        print("Informe --cpf e/ou --nome, ou --maiores N")
+        return False
+
+    for rep_id in rep_ids:
+        identity = index.representatives.identity(rep_id)[0]
+        print(f"{identity}: {index.degree(rep_id)} beneficiário(s)")
+        if args.maiores:
+            continue
+        neighbors, masks = index.neighbors(rep_id)
+        for name, mask in zip(index.beneficiaries.identity(neighbors[:args.limite]), masks):
+            print(f"  {name}  meses: {','.join(index.months(mask))}")
+    if not len(rep_ids):
+        print("Nenhum representante encontrado")
+    return bool(len(rep_ids))
+
+
+def cmd_names(args):
+    import name_search
+
+    if args.atualizar or args.reconstruir:
+        periods = _store_periods(args.store, args.mes)
+        if not periods:
+            print(f"Nenhuma partição encontrada em {args.store}")
+            return False
+        build = name_search.rebuild if args.reconstruir else name_search.update
+        meta = build(args.raiz, args.store, periods, log=print)
+        print(f"{meta['names']:,} nomes, {meta['postings']:,} postings em {args.raiz}")
+        return True
+
+    if not os.path.exists(os.path.join(args.raiz, name_search.METADATA_FILE)):
+        print(f"Índice não encontrado: {args.raiz} (use --atualizar)")
+        return False
+    if not args.texto:
+        print("Informe o nome a buscar")
+        return False
+
+    index = name_search.NameIndex(args.raiz)
+    matches = index.search(' '.join(args.texto), args.limite, args.minimo,
+                           NAME_ROLES.get(args.papel))
+    for name, score, roles in matches:
+        print(f"{score:.3f}  {name}  ({roles})")
+    if not matches:
+        print("Nenhum nome encontrado")
+    return bool(matches)
+
+
+def cmd_dictionary(args):
+    import string_pool
+
+    if args.atualizar:
+        periods = _store_periods(args.store, args.mes)
+        if not periods:
+            print(f"Nenhuma partição encontrada em {args.store}")
+            return False
+        string_pool.update(args.store, periods, log=print)
+    elif not os.path.isdir(string_pool.dictionary_root(args.store)):
+        print(f"Dicionários não encontrados em {args.store} (use --atualizar)")
+        return False
+
+    pool = string_pool.open_pools(args.store)[args.tipo]
+    if args.ids:
+        try:
+            values = pool.decode([int(value) for value in args.ids])
+        except (KeyError, ValueError) as exc:
+            print(f"id inválido: {exc.args[0]}")
+            return False
+        for value_id, value in zip(args.ids, values):
+            print(f"{value_id}\t{value}")
+        return True
+    if args.valor:
+        value_id = int(pool.lookup([args.valor])[0])
+        print(f"{value_id}\t{args.valor}" if value_id >= 0 else f"'{args.valor}' não está no dicionário")
+        return value_id >= 0
+
+    summary = string_pool.summary(args.store)
+    for name, info in summary['pools'].items():
+        print(f"{name}: {info['strings']:,} strings ({info['bytes']:,} bytes)")
+    print(f"{summary['encoded_rows']:,} linhas codificadas em {summary['periods']} período(s)")
+    return True
+
+
+def cmd_revise(args):
+    import partition_delta
+    import partition_store
+
+    periods = _store_periods(args.store, args.mes)
+    if not periods:
+        print(f"Mês {args.mes} não encontrado em {args.store} (use collect)")
+        return False
+    year_month = periods[0]
+
+    if args.historico:
+        revisions = partition_store.read_metadata(args.store, year_month).get('revisions', [])
+        for revision in revisions:
+            print(f"{revision['applied_at']}  {revision['delta']}: "
+                  f"{partition_delta.describe(revision)}")
+        if not revisions:
+            print(f"Nenhuma revisão aplicada a {args.mes}")
+        return True
+
+    release = args.arquivo
+    if release is None:
+        import coletar_pe_de_meia_memoria_otimizada as coletor
+        release = config.data_path(f"dados_pe_de_meia_revisao_{year_month}.csv")
+        if os.path.exists(release):
+            os.remove(release)
+        if not coletor.process_period_to_file(int(year_month[:4]), int(year_month[4:]), release):
+            print(f"Falha ao baixar {args.mes}")
+            return False
+    try:
+        summary = partition_delta.revise(args.store, year_month, release,
+                                         dry_run=args.simular, log=print)
+    except ValueError as e:
+        print(f"Erro na revisão: {e}")
+        return False
+    finally:
+        if args.arquivo is None and os.path.exists(release):
+            os.remove(release)
+
+    print(f"{args.mes}: {partition_delta.describe(summary)}"
+          + (" (simulação)" if args.simular else ""))
+    if summary['delta']:
+        print(f"Índices derivados: timeline --construir, representantes --atualizar "
+              f"--mes {args.mes}, nomes --atualizar --mes {args.mes}")
+    return True
+
+
+def cmd_api(args):
+    import api_server
+
+    options = ['--store', args.store, '--linha-do-tempo', TIMELINE_ROOT, '--nomes', NAMES_ROOT]
+    return api_server.main(options + _passthrough(args.opcoes))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='pe-de-meia', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tempo', action='store_true',
+                        help='mostra o tempo de inicialização e de execução')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('collect', help='coleta os arquivos mensais do Portal')
+    p.add_argument('--estrategia', choices=sorted(COLLECT_STRATEGIES), default='memoria')
+    p.add_argument('opcoes', nargs=argparse.REMAINDER,
+                   help='opções repassadas ao coletor (ex.: --metricas logs/metricas.jsonl)')
+    p.set_defaults(func=cmd_collect)
+
+    p = sub.add_parser('scrape', help='raspagem da tabela do Portal via Selenium')
+    p.add_argument('--modo', choices=sorted(SCRAPE_MODES), default='final')
+    p.set_defaults(func=cmd_scrape)
+
+    p = sub.add_parser('append', help='acrescenta a página exportada do navegador')
+    p.add_argument('--watch', action='store_true', help='ingestão contínua (ingest_watch.py)')
+    p.add_argument('--csv', default=BROWSER_CSV)
+    p.set_defaults(func=cmd_append)
+
+    p = sub.add_parser('stats', help='estatísticas do CSV coletado pelo navegador')
+    p.add_argument('--csv', default=BROWSER_CSV)
+    p.add_argument('--top', type=int, default=10)
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser('query', help='filtra registros de um CSV coletado')
+    p.add_argument('--csv', default=None,
+                   help='CSV ou diretório do armazenamento particionado '
+                        '(padrão: CSV consolidado, se existir, senão o armazenamento)')
+    p.add_argument('--uf')
+    p.add_argument('--mes', help='Mês Referência no formato MM/AAAA')
+    p.add_argument('--municipio', help='trecho do nome do município')
+    p.add_argument('--cpf', help='CPF mascarado exato do beneficiário (***.123.456-**)')
+    p.add_argument('--nome', help='trecho do nome do beneficiário')
+    p.add_argument('--limite', type=int, default=20)
+    p.add_argument('--contar', action='store_true', help='mostra apenas a contagem')
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser('export', help='gera o CSV legado de 8 colunas')
+    p.add_argument('--store', default=PARTITION_STORE, help='diretório do armazenamento particionado')
+    p.add_argument('--saida', default=CONSOLIDATED_CSV)
+    p.add_argument('--compressao', choices=['gzip', 'zstd'])
+    p.add_argument('--mes', help='exporta apenas um Mês Referência (MM/AAAA)')
+    p.add_argument('--entregas', metavar='LISTA',
+                   help='várias saídas em uma única leitura, separadas por vírgula: '
+                        'legado, legado_bom, jsonl, uf, parquet')
+    p.add_argument('--destino', default=config.DATA_DIR, help='diretório das --entregas')
+    p.add_argument('--uf', help='com --entregas, apenas estas UFs (ex.: SP,RJ)')
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('timeline', help='linha do tempo de pagamentos por beneficiário')
+    p.add_argument('--construir', action='store_true',
+                   help='(re)constrói a linha do tempo a partir do armazenamento particionado')
+    p.add_argument('--store', default=PARTITION_STORE, help='diretório do armazenamento particionado')
+    p.add_argument('--raiz', default=TIMELINE_ROOT, help='diretório da linha do tempo')
+    p.add_argument('--cpf', help='CPF mascarado exato (***.123.456-**)')
+    p.add_argument('--nome', help='nome do beneficiário (exato com --cpf, senão trecho)')
+    p.add_argument('--contem', action='store_true',
+                   help='com --cpf e --nome, trata o nome como trecho')
+    p.add_argument('--limite', type=int, default=20)
+    p.set_defaults(func=cmd_timeline)
+
+    p = sub.add_parser('anomalias', help='detecta anomalias no armazenamento particionado')
+    p.add_argument('--store', default=PARTITION_STORE, help='diretório do armazenamento particionado')
+    p.add_argument('--saida', default=ANOMALIES_CSV)
+    p.add_argument('--limite', type=int, default=1000, help='ocorrências por tipo no arquivo')
+    p.add_argument('--mostrar', type=int, default=3, help='ocorrências por tipo na tela')
+    p.set_defaults(func=cmd_anomalies)
+
+    p = sub.add_parser('representantes', help='índice representante legal -> beneficiários')
+    p.add_argument('--atualizar', action='store_true',
+                   help='inclui (ou reprocessa) os períodos do armazenamento no índice')
+    p.add_argument('--reconstruir', action='store_true', help='apaga e refaz o índice')
+    p.add_argument('--mes', help='com --atualizar, apenas um Mês Referência (MM/AAAA)')
+    p.add_argument('--store', default=PARTITION_STORE, help='diretório do armazenamento particionado')
+    p.add_argument('--raiz', default=REPRESENTATIVES_ROOT, help='diretório do índice')
+    p.add_argument('--cpf', help='CPF mascarado exato (***.123.456-**)')
+    p.add_argument('--nome', help='nome do representante (exato com --cpf, senão trecho)')
+    p.add_argument('--contem', action='store_true',
+                   help='com --cpf e --nome, trata o nome como trecho')
+    p.add_argument('--beneficiario', action='store_true',
+                   help='--cpf e --nome são do beneficiário: lista os seus representantes')
+    p.add_argument('--maiores', type=int, default=0,
+                   help='os N representantes com mais beneficiários')
+    p.add_argument('--limite', type=int, default=20)
+    p.set_defaults(func=cmd_representatives)
+
+    p = sub.add_parser('nomes', help='busca aproximada de nomes (acentos e grafias variantes)')
+    p.add_argument('texto', nargs='*', help='nome (ou parte) a buscar')
+    p.add_argument('--atualizar', action='store_true',
+                   help='inclui os nomes novos dos períodos do armazenamento no índice')
+    p.add_argument('--reconstruir', action='store_true', help='apaga e refaz o índice')
+    p.add_argument('--mes', help='com --atualizar, apenas um Mês Referência (MM/AAAA)')
+    p.add_argument('--store', default=PARTITION_STORE, help='diretório do armazenamento particionado')
+    p.add_argument('--raiz', default=NAMES_ROOT, help='diretório do índice')
+    p.add_argument('--papel', choices=sorted(NAME_ROLES))
+    p.add_argument('--minimo', type=float, default=0.5,
+                   help='similaridade mínima (Dice sobre trigramas, 0 a 1)')
+    p.add_argument('--limite', type=int, default=10)
+    p.set_defaults(func=cmd_names)
+
+    p = sub.add_parser('dicionario', help='dicionários globais de nomes e municípios (ids int32)')
+    p.add_argument('ids', nargs='*', help='ids a decodificar')
+    p.add_argument('--tipo', choices=['nomes', 'municipios'], default='nomes')
+    p.add_argument('--valor', help='mostra o id de uma string')
+    p.add_argument('--atualizar', action='store_true',
+                   help='regrava com ids as partições gravadas com as strings')
+    p.add_argument('--mes', help='com --atualizar, apenas um Mês Referência (MM/AAAA)')
+    p.add_argument('--store', default=PARTITION_STORE, help='diretório do armazenamento particionado')
+    p.set_defaults(func=cmd_dictionary)
+
+    p = sub.add_parser('revisar', help='aplica a republicação de um mês (delta de linhas)')
+    p.add_argument('--mes', required=True, help='Mês Referência (MM/AAAA) já armazenado')
+    p.add_argument('--arquivo', help='nova versão já processada (CSV do coletor); '
+                                     'padrão: baixa o mês do Portal')
+    p.add_argument('--simular', action='store_true', help='apenas conta as diferenças')
+    p.add_argument('--historico', action='store_true', help='lista as revisões aplicadas')
+    p.add_argument('--store', default=PARTITION_STORE, help='diretório do armazenamento particionado')
+    p.set_defaults(func=cmd_revise)
+
+    p = sub.add_parser('api', help='API HTTP local somente leitura sobre o armazenamento')
+    p.add_argument('--store', default=PARTITION_STORE, help='diretório do armazenamento particionado')
+    p.add_argument('opcoes', nargs=argparse.REMAINDER,
+                   help='opções repassadas a api_server.py (ex.: --porta 8080 --aquecer)')
+    p.set_defaults(func=cmd_api)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    startup = time.perf_counter() - _START
+
+    success = args.func(args)
+
+    if args.tempo:
+        total = time.perf_counter() - _START
+        print(f"[tempo] interpretador: {_INTERPRETER_CPU*1000:.1f} ms de CPU, "
+              f"inicialização do CLI: {startup*1000:.1f} ms, "
+              f"total: {total*1000:.1f} ms", file=sys.stderr)
+    return success
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
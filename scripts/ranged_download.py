@@ -0,0 +1,263 @@
+"""
+Download de arquivos grandes em partes paralelas (requisições com Range)
+
+Uma única conexão TCP raramente ocupa o link inteiro. Quando o servidor
+anuncia `Accept-Ranges: bytes`, download() divide o arquivo em faixas de bytes
+buscadas ao mesmo tempo (asyncio) e gravadas, cada uma na sua posição
+(os.pwrite), em um arquivo pré-alocado com o tamanho final:
+
+  - com httpx e h2 instalados, as faixas são multiplexadas em HTTP/2
+    (httpx.AsyncClient); sem eles, cada faixa usa uma conexão HTTP/1.1 da
+    sessão de http_transport, em uma thread (asyncio.to_thread);
+  - cada faixa confere o status 206 e o Content-Range; se a conexão cair, a
+    nova tentativa (backoff de http_transport) continua do último byte gravado.
+    `If-Range` com o ETag garante que todas as faixas são da mesma versão;
+  - ao final, o tamanho do arquivo e o SHA-256 são conferidos (com o
+    `Repr-Digest`/`Digest` do servidor, ou com o valor esperado informado).
+
+Servidores sem Range, arquivos pequenos (menos de duas partes) ou sem
+tamanho conhecido ficam com o GET único de http_transport.fetch: download()
+retorna None nesses casos.
+"""
+
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import time
+
+import requests
+
+import http_transport
+
+DEFAULT_CONNECTIONS = 8  # = pool_maxsize da sessão de http_transport
+MIN_PART_BYTES = 8 << 20
+BLOCK_SIZE = 1 << 20
+MAX_RETRIES = http_transport.MAX_RETRIES
+
+
+class DownloadError(Exception):
+    """Resposta inválida ou arquivo que não confere (sem nova tentativa)"""
+
+
+class _Retry(Exception):
+    """Status que justifica nova tentativa da faixa"""
+
+
+def available_protocols():
+    """Protocolos disponíveis neste ambiente para as faixas"""
+    protocols = ['HTTP/1.1']
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+        protocols.append('HTTP/2')
+    except ImportError:
+        pass
+    return protocols
+
+
+def _digest(headers):
+    """SHA-256 (hex) anunciado em Repr-Digest (RFC 9530) ou Digest (RFC 3230)"""
+    for name, pattern in (('Repr-Digest', r"sha-256=:([A-Za-z0-9+/=]+):"),
+                          ('Digest', r"sha-256=([A-Za-z0-9+/=]+)")):
+        match = re.search(pattern, headers.get(name, ''), re.IGNORECASE)
+        if match:
+            return base64.b64decode(match.group(1)).hex()
+    return None
+
+
+def probe(url, timeout=None):
+    """
+    HEAD (seguindo redirecionamentos): {'url' final, 'size', 'ranges', 'etag',
+    'sha256'}, ou None se o servidor não responder 200 com Content-Length
+    """
+    response = http_transport.get_session().head(
+        url, allow_redirects=True,
+        timeout=timeout or (http_transport.CONNECT_TIMEOUT, http_transport.READ_TIMEOUT))
+    length = response.headers.get('Content-Length')
+    if response.status_code != 200 or not (length or '').isdigit():
+        return None
+    return {
+        'url': response.url,
+        'size': int(length),
+        'ranges': response.headers.get('Accept-Ranges', '').lower() == 'bytes',
+        'etag': response.headers.get('ETag'),
+        'sha256': _digest(response.headers),
+    }
+
+
+def split(size, connections, min_part_bytes=MIN_PART_BYTES):
+    """Faixas [início, fim] (inclusivo) de tamanho igual, ao menos min_part_bytes"""
+    part = max(min_part_bytes, -(-size // max(connections, 1)))
+    return [[start, min(start + part, size) - 1] for start in range(0, size, part)]
+
+
+def _check(status, headers, start, end, size):
+    if status in http_transport.RETRY_STATUS:
+        raise _Retry(f"status {status}")
+    if status != 206:
+        raise DownloadError(f"status {status} para a faixa {start}-{end} "
+                            "(servidor ignorou o Range ou o arquivo mudou)")
+    expected = f"bytes {start}-{end}/{size}"
+    if headers.get('Content-Range') != expected:
+        raise DownloadError(f"Content-Range {headers.get('Content-Range')!r}, esperado {expected!r}")
+
+
+def _range_headers(part, etag):
+    headers = {'Range': f"bytes={part['position']}-{part['end']}"}
+    if etag:
+        headers['If-Range'] = etag
+    return headers
+
+
+def _fetch_requests(session, url, fd, part, size, etag):
+    """Uma faixa via requests (bloqueante, roda em asyncio.to_thread)"""
+    timeout = (http_transport.CONNECT_TIMEOUT, http_transport.READ_TIMEOUT)
+    with session.get(url, headers=_range_headers(part, etag), stream=True,
+                     timeout=timeout) as response:
+        _check(response.status_code, response.headers, part['position'], part['end'], size)
+        part['protocol'] = 'HTTP/1.1'
+        for block in response.iter_content(BLOCK_SIZE):
+            os.pwrite(fd, block, part['position'])
+            part['position'] += len(block)
+
+
+async def _fetch_httpx(client, url, fd, part, size, etag):
+    """Uma faixa via httpx (HTTP/2 multiplexado na mesma conexão)"""
+    async with client.stream('GET', url, headers=_range_headers(part, etag)) as response:
+        _check(response.status_code, response.headers, part['position'], part['end'], size)
+        part['protocol'] = response.http_version
+        async for block in response.aiter_bytes(BLOCK_SIZE):
+            os.pwrite(fd, block, part['position'])
+            part['position'] += len(block)
+
+
+async def _fetch_part(fetch, part, stats, network_errors, log):
+    """Busca a faixa com novas tentativas, continuando do último byte gravado"""
+    for attempt in range(MAX_RETRIES + 1):
+        received = part['position']
+        error = None
+        try:
+            await fetch(part)
+            if part['position'] != part['end'] + 1:
+                raise _Retry(f"faixa incompleta ({part['position']} de {part['end'] + 1})")
+        except (_Retry,) + network_errors as e:
+            error = e
+        http_transport.record_transfer(requests=1, nbytes=part['position'] - received)
+        if error is None:
+            return
+        if attempt == MAX_RETRIES:
+            http_transport.record_transfer(failures=1)
+            raise DownloadError(f"faixa {part['start']}-{part['end']}: {error}") from error
+        stats['retries'] += 1
+        http_transport.record_transfer(retries=1)
+        delay = http_transport.backoff_delay(attempt)
+        if log:
+            reason = error if isinstance(error, _Retry) else error.__class__.__name__
+            log(f"Faixa {part['start']}-{part['end']}: {reason}, nova tentativa em {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def _download_parts(info, fd, parts, connections, stats, log):
+    semaphore = asyncio.Semaphore(connections)
+    url, size, etag = info['url'], info['size'], info['etag']
+
+    if 'HTTP/2' in available_protocols():
+        import httpx
+        client = httpx.AsyncClient(
+            http2=True, follow_redirects=True, headers=http_transport.DEFAULT_HEADERS,
+            timeout=httpx.Timeout(http_transport.READ_TIMEOUT,
+                                  connect=http_transport.CONNECT_TIMEOUT))
+        network_errors = (httpx.TransportError,)
+
+        async def fetch(part):
+            await _fetch_httpx(client, url, fd, part, size, etag)
+    else:
+        client = None
+        session = http_transport.get_session()
+        network_errors = (requests.ConnectionError, requests.Timeout,
+                          requests.exceptions.ChunkedEncodingError)
+
+        async def fetch(part):
+            await asyncio.to_thread(_fetch_requests, session, url, fd, part, size, etag)
+
+    async def limited(part):
+        async with semaphore:
+            await _fetch_part(fetch, part, stats, network_errors, log)
+
+    try:
+        await asyncio.gather(*(limited(part) for part in parts))
+    finally:
+        if client is not None:
+            await client.aclose()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def download(url, path, connections=DEFAULT_CONNECTIONS, min_part_bytes=MIN_PART_BYTES,
+             expected_sha256=None, log=None):
+    """
+    Baixa `url` em `path` em faixas paralelas. Retorna o resumo ('bytes',
+    'parts', 'protocol', 'sha256', 'verified', 'retries', 'seconds'), ou None
+    se o download em partes não se aplica (o chamador faz o GET único).
+    Lança DownloadError se uma faixa ou a verificação final falhar.
+    """
+    start = time.perf_counter()
+    info = probe(url)
+    if info is None or not info['ranges']:
+        return None
+    parts = [{'start': s, 'end': e, 'position': s}
+             for s, e in split(info['size'], connections, min_part_bytes)]
+    if len(parts) < 2:
+        return None
+
+    stats = {'retries': 0}
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(fd, 0, info['size'])
+        else:
+            os.ftruncate(fd, info['size'])
+        transfer_start = time.perf_counter()
+        asyncio.run(_download_parts(info, fd, parts, min(connections, len(parts)), stats, log))
+    finally:
+        os.close(fd)
+    # tempo de parede (as faixas são simultâneas)
+    http_transport.record_transfer(seconds=time.perf_counter() - transfer_start)
+
+    size = os.path.getsize(path)
+    if size != info['size']:
+        raise DownloadError(f"{size} bytes gravados, esperado {info['size']}")
+    sha256 = file_sha256(path)
+    expected = expected_sha256 or info['sha256']
+    if expected and sha256 != expected.lower():
+        raise DownloadError(f"SHA-256 {sha256} difere do esperado {expected}")
+    seconds = time.perf_counter() - start
+    return {
+        'bytes': size,
+        'parts': len(parts),
+        'connections': min(connections, len(parts)),
+        'protocol': ', '.join(sorted({part['protocol'] for part in parts})),
+        'sha256': sha256,
+        'verified': expected is not None,
+        'retries': stats['retries'],
+        'seconds': seconds,
+        'mb_per_s': size / 1e6 / seconds if seconds > 0 else 0.0,
+    }
+
+
+def describe(result):
+    check = 'SHA-256 conferido' if result['verified'] else f"SHA-256 {result['sha256'][:16]}"
+    return (f"{result['bytes'] / 1e6:.1f} MB em {result['parts']} faixas "
+            f"({result['connections']} conexões, {result['protocol']}) em "
+            f"{result['seconds']:.2f}s, {result['mb_per_s']:.1f} MB/s; {check}")
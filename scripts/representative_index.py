@@ -0,0 +1,351 @@
+"""
+Índice representante legal -> beneficiários (grafo bipartido em CSR)
+
+    <raiz>/
+      representantes_chaves.npy    chave (hash de CPF mascarado + nome) por id
+      representantes_busca.npy     chaves em ordem crescente ...
+      representantes_ordem.npy     ... e o id de cada uma (busca binária)
+      representantes.txt           "CPF;NOME" por id (só acrescentado)
+      representantes_pos.npy       deslocamento de cada linha do .txt (n + 1)
+      beneficiarios_chaves/...     o mesmo para os beneficiários (_busca, _ordem, .txt, _pos)
+      inicios.npy                  CSR: arestas do representante i em [inicios[i], inicios[i+1])
+      vizinhos.npy                 id (int32) do beneficiário de cada aresta, crescente na linha
+      meses.npy                    máscara de bits por aresta: bit j = periods[j] do metadata
+                                   (menor tipo inteiro que comporte os períodos)
+      beneficiarios_inicios.npy    CSR transposto: representantes do beneficiário j em
+      beneficiarios_vizinhos.npy   [beneficiarios_inicios[j], beneficiarios_inicios[j+1])
+      _metadata.json
+
+Os ids são estáveis: representantes e beneficiários novos recebem os
+próximos ids e suas identidades são acrescentadas ao fim dos .txt. Incluir um
+mês (update) lê só a partição do mês e refaz as arestas com uma ordenação
+vetorizada (np.unique sobre rep_id << 32 | ben_id); reprocessar um mês já
+indexado substitui o bit daquele mês.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import chunking
+import config
+import partition_store
+import timeline
+
+COLUMNS = ['CPF do Beneficiário', 'Beneficiário', 'Representante Legal', 'CPF do Representante']
+MAX_PERIODS = 64
+METADATA_FILE = '_metadata.json'
+
+
+def default_root():
+    return config.data_path("pe_de_meia_representantes")
+
+
+def mask_dtype(periods):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if periods <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"o índice comporta no máximo {MAX_PERIODS} períodos")
+
+
+def _path(root, name):
+    return os.path.join(root, name)
+
+
+class IdentityTable:
+    """
+    Chaves de 64 bits com ids estáveis e uma linha de texto por id
+    (<nome>_chaves/_busca/_ordem/_pos.npy e <nome>.txt); usada pelos dois lados
+    do grafo e pelo índice de nomes
+    """
+
+    def __init__(self, root, name, mmap=True):
+        self.root = root
+        self.name = name
+        self.mmap_mode = 'r' if mmap else None
+        self.keys = self._load(f"{name}_chaves.npy", np.uint64)
+        self.sorted_keys = self._load(f"{name}_busca.npy", np.uint64)
+        self.order = self._load(f"{name}_ordem.npy", np.int64)
+        positions = self._load(f"{name}_pos.npy", np.int64)
+        self.positions = positions if len(positions) else np.zeros(1, dtype=np.int64)
+
+    def _load(self, filename, dtype):
+        path = _path(self.root, filename)
+        if os.path.exists(path):
+            return np.load(path, mmap_mode=self.mmap_mode)
+        return np.empty(0, dtype=dtype)
+
+    def find(self, keys):
+        """ids das chaves (-1 para as ausentes)"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(self.sorted_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        position = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self.sorted_keys) - 1)
+        found = self.sorted_keys[position] == keys
+        return np.where(found, self.order[position], -1)
+
+    def identity(self, ids):
+        """["CPF;NOME", ...] lendo só as linhas pedidas do .txt"""
+        result = []
+        with open(_path(self.root, f"{self.name}.txt"), 'rb') as f:
+            for i in np.atleast_1d(ids):
+                f.seek(self.positions[i])
+                result.append(f.read(self.positions[i + 1] - self.positions[i])
+                              .decode('utf-8').rstrip('\n'))
+        return result
+
+    def append(self, new_keys, identities):
+        """Acrescenta chaves novas (em ordem de id) e grava os arquivos do lado"""
+        new_keys = np.asarray(new_keys, dtype=np.uint64)
+        keys = np.concatenate([np.asarray(self.keys), new_keys])
+        order = np.argsort(keys, kind='stable')
+
+        lines = [f"{identity}\n".encode('utf-8') for identity in identities]
+        lengths = np.fromiter((len(line) for line in lines), dtype=np.int64, count=len(lines))
+        positions = np.concatenate([np.asarray(self.positions),
+                                    self.positions[-1] + np.cumsum(lengths)])
+        with open(_path(self.root, f"{self.name}.txt"), 'ab') as f:
+            f.writelines(lines)
+
+        np.save(_path(self.root, f"{self.name}_chaves.npy"), keys)
+        np.save(_path(self.root, f"{self.name}_busca.npy"), keys[order])
+        np.save(_path(self.root, f"{self.name}_ordem.npy"), order.astype(np.int64))
+        np.save(_path(self.root, f"{self.name}_pos.npy"), positions)
+        self.keys, self.sorted_keys, self.order, self.positions = \
+            keys, keys[order], order.astype(np.int64), positions
+
+
+class RepresentativeIndex:
+    """Consultas sobre o índice (arrays abertos via memmap)"""
+
+    def __init__(self, root=None):
+        self.root = root or default_root()
+        self.meta = read_metadata(self.root)
+        self.representatives = IdentityTable(self.root, 'representantes')
+        self.beneficiaries = IdentityTable(self.root, 'beneficiarios')
+        self.offsets = np.load(_path(self.root, 'inicios.npy'), mmap_mode='r')
+        self.neighbor_ids = np.load(_path(self.root, 'vizinhos.npy'), mmap_mode='r')
+        self.masks = np.load(_path(self.root, 'meses.npy'), mmap_mode='r')
+        reverse = _path(self.root, 'beneficiarios_inicios.npy')
+        if os.path.exists(reverse):
+            self.reverse_offsets = np.load(reverse, mmap_mode='r')
+            self.reverse_ids = np.load(_path(self.root, 'beneficiarios_vizinhos.npy'),
+                                       mmap_mode='r')
+        else:  # índice gravado antes do CSR transposto
+            self.reverse_offsets = self.reverse_ids = None
+
+    @property
+    def periods(self):
+        return self.meta['periods']
+
+    def representative_id(self, cpf, name):
+        key = timeline.beneficiary_keys([cpf], [name])
+        rep_id = int(self.representatives.find(key)[0])
+        return None if rep_id < 0 else rep_id
+
+    def beneficiary_id(self, cpf, name):
+        key = timeline.beneficiary_keys([cpf], [name])
+        ben_id = int(self.beneficiaries.find(key)[0])
+        return None if ben_id < 0 else ben_id
+
+    def degree(self, rep_id):
+        return int(self.offsets[rep_id + 1] - self.offsets[rep_id])
+
+    def degrees(self):
+        return np.diff(self.offsets)
+
+    def neighbors(self, rep_id):
+        """(ids dos beneficiários, máscara de meses de cada aresta)"""
+        start, end = self.offsets[rep_id], self.offsets[rep_id + 1]
+        return np.array(self.neighbor_ids[start:end]), np.array(self.masks[start:end])
+
+    def representatives_of(self, ben_id):
+        """ids dos representantes de um beneficiário (linha do CSR transposto)"""
+        if self.reverse_offsets is None:
+            # sem o CSR transposto (índice antigo): varredura de todas as arestas
+            edges = np.flatnonzero(self.neighbor_ids == ben_id)
+            return np.searchsorted(self.offsets, edges, side='right') - 1
+        start, end = self.reverse_offsets[ben_id], self.reverse_offsets[ben_id + 1]
+        return np.array(self.reverse_ids[start:end], dtype=np.int64)
+
+    def top(self, count=10):
+        """ids dos representantes com mais beneficiários"""
+        degrees = self.degrees()
+        count = min(count, len(degrees))
+        if not count:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-degrees, count - 1)[:count]
+        return top[np.argsort(-degrees[top], kind='stable')]
+
+    def months(self, mask):
+        """Períodos AAAAMM presentes em uma máscara de bits"""
+        return [period for bit, period in enumerate(self.periods) if int(mask) >> bit & 1]
+
+    def find_representatives(self, cpf=None, name=None, limit=20):
+        """ids por CPF mascarado exato e/ou trecho do nome (varre representantes.txt)"""
+        found = []
+        needle = name.upper() if name else None
+        with open(_path(self.root, 'representantes.txt'), 'r', encoding='utf-8') as f:
+            for rep_id, line in enumerate(f):
+                line_cpf, _, line_name = line.rstrip('\n').partition(';')
+                if cpf and line_cpf != cpf:
+                    continue
+                if needle and needle not in line_name.upper():
+                    continue
+                found.append(rep_id)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+def read_metadata(root):
+    path = _path(root, METADATA_FILE)
+    if not os.path.exists(path):
+        return {'periods': [], 'representatives': 0, 'beneficiaries': 0, 'edges': 0}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read_pairs(store_root, year_month, stats):
+    """
+    Pares (representante, beneficiário) de uma partição, com a identidade da
+    1ª ocorrência de cada chave
+    """
+    rep_keys, ben_keys, rep_names, ben_names = [], [], [], []
+    for chunk in partition_store.read_chunks(store_root, year_month, COLUMNS, stats=stats):
+        if 'CPF do Representante' not in chunk:
+            chunk['CPF do Representante'] = ''
+        chunk = chunk[(chunk['Representante Legal'] != '') | (chunk['CPF do Representante'] != '')]
+        rep = timeline.beneficiary_keys(chunk['CPF do Representante'].to_numpy(object),
+                                        chunk['Representante Legal'].to_numpy(object))
+        ben = timeline.beneficiary_keys(chunk['CPF do Beneficiário'].to_numpy(object),
+                                        chunk['Beneficiário'].to_numpy(object))
+        rep_keys.append(rep)
+        ben_keys.append(ben)
+        rep_names.append(pd.DataFrame({'nome': (chunk['CPF do Representante'] + ';' +
+                                                chunk['Representante Legal']).to_numpy(object)},
+                                      index=rep))
+        ben_names.append(pd.DataFrame({'nome': (chunk['CPF do Beneficiário'] + ';' +
+                                                chunk['Beneficiário']).to_numpy(object)},
+                                      index=ben))
+    if not rep_keys:
+        empty = np.empty(0, dtype=np.uint64)
+        return empty, empty, pd.Series(dtype=object), pd.Series(dtype=object)
+
+    def first_names(frames):
+        names = pd.concat(frames)['nome']
+        return names[~names.index.duplicated()]
+
+    return (np.concatenate(rep_keys), np.concatenate(ben_keys),
+            first_names(rep_names), first_names(ben_names))
+
+
+def _new_ids(side, keys, names):
+    """ids das chaves (criando ids para as novas, na ordem de 1ª aparição)"""
+    ids = side.find(keys)
+    missing = ids < 0
+    if missing.any():
+        unique, first, inverse = np.unique(keys[missing], return_index=True,
+                                           return_inverse=True)
+        appearance = np.argsort(first, kind='stable')
+        rank = np.empty_like(appearance)
+        rank[appearance] = np.arange(len(appearance))
+        start = len(side.keys)
+        new_keys = unique[appearance]
+        side.append(new_keys, names.loc[new_keys].tolist())
+        ids[missing] = start + rank[inverse]
+    return ids
+
+
+def update(root=None, store_root=None, periods=None, log=None):
+    """
+    Inclui (ou reprocessa) períodos do armazenamento no índice. Retorna o
+    metadata atualizado.
+    """
+    root = root or default_root()
+    store_root = store_root or partition_store.default_root()
+    periods = periods if periods is not None else partition_store.list_periods(store_root)
+    os.makedirs(root, exist_ok=True)
+    meta = read_metadata(root)
+    read_stats = {}
+
+    for year_month in periods:
+        index_periods = list(meta['periods'])
+        if year_month not in index_periods:
+            index_periods.append(year_month)
+        if len(index_periods) > MAX_PERIODS:
+            raise ValueError(f"o índice comporta no máximo {MAX_PERIODS} períodos")
+        bit = np.uint64(1) << np.uint64(index_periods.index(year_month))
+
+        rep_keys, ben_keys, rep_names, ben_names = _read_pairs(store_root, year_month, read_stats)
+        representatives = IdentityTable(root, 'representantes', mmap=False)
+        beneficiaries = IdentityTable(root, 'beneficiarios', mmap=False)
+        rep_ids = _new_ids(representatives, rep_keys, rep_names)
+        ben_ids = _new_ids(beneficiaries, ben_keys, ben_names)
+        # contagens da tabela em memória: o mês pode não ter nenhum par (e ainda
+        # não existir representantes_chaves.npy)
+        rep_count, ben_count = len(representatives.keys), len(beneficiaries.keys)
+
+        # Arestas existentes sem o bit do mês + arestas do mês
+        if meta['edges']:
+            offsets = np.load(_path(root, 'inicios.npy'))
+            old_reps = np.repeat(np.arange(len(offsets) - 1, dtype=np.uint64), np.diff(offsets))
+            old_edges = (old_reps << np.uint64(32)) | np.load(_path(root, 'vizinhos.npy')) \
+                .astype(np.uint64)
+            old_masks = np.load(_path(root, 'meses.npy')).astype(np.uint64) & ~bit
+            keep = old_masks != 0
+            old_edges, old_masks = old_edges[keep], old_masks[keep]
+        else:
+            old_edges = old_masks = np.empty(0, dtype=np.uint64)
+        new_edges = (rep_ids.astype(np.uint64) << np.uint64(32)) | ben_ids.astype(np.uint64)
+        edges = np.concatenate([old_edges, new_edges])
+        masks = np.concatenate([old_masks, np.full(len(new_edges), bit, dtype=np.uint64)])
+
+        edges, starts, inverse = np.unique(edges, return_index=True, return_inverse=True)
+        merged = np.zeros(len(edges), dtype=np.uint64)
+        np.bitwise_or.at(merged, inverse, masks)
+
+        edge_reps = (edges >> np.uint64(32)).astype(np.int64)
+        edge_bens = (edges & np.uint64(0xFFFFFFFF)).astype(np.int32)
+        offsets = np.zeros(rep_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_reps, minlength=rep_count), out=offsets[1:])
+        np.save(_path(root, 'inicios.npy'), offsets)
+        np.save(_path(root, 'vizinhos.npy'), edge_bens)
+        np.save(_path(root, 'meses.npy'), merged.astype(mask_dtype(len(index_periods))))
+
+        # CSR transposto (beneficiário -> representantes): a ordenação estável
+        # mantém os representantes de cada beneficiário em ordem crescente
+        by_beneficiary = np.argsort(edge_bens, kind='stable')
+        reverse_offsets = np.zeros(ben_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_bens, minlength=ben_count), out=reverse_offsets[1:])
+        np.save(_path(root, 'beneficiarios_inicios.npy'), reverse_offsets)
+        np.save(_path(root, 'beneficiarios_vizinhos.npy'),
+                edge_reps[by_beneficiary].astype(np.int32))
+
+        meta = {
+            'periods': index_periods,
+            'representatives': rep_count,
+            'beneficiaries': ben_count,
+            'edges': int(len(edges)),
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(_path(root, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        if log:
+            log(f"Índice de representantes: {year_month} com {len(new_edges):,} pares "
+                f"-> {meta['representatives']:,} representantes, {meta['edges']:,} arestas")
+
+    if log and read_stats:
+        log(f"Índice de representantes: {chunking.describe(read_stats)}")
+    return meta
+
+
+def rebuild(root=None, store_root=None, periods=None, log=None):
+    """Apaga o índice e inclui todos os períodos"""
+    root = root or default_root()
+    shutil.rmtree(root, ignore_errors=True)
+    return update(root, store_root, periods, log)
@@ -0,0 +1,386 @@
+"""
+Layout agrupado das partições: grupos de linhas com mapas de zona
+
+PartitionWriter grava cada partição com as linhas ordenadas por (UF,
+Município sem acentos, chave do beneficiário) e divididas em grupos de
+ROW_GROUP_ROWS linhas:
+
+    periodo=202401/
+      dados.csv          cabeçalho + grupos (com gzip, um membro por grupo)
+      _grupos.json       por grupo: linhas, posição no arquivo e descomprimida,
+                         mínimo e máximo de UF, Município (dobrado) e chave
+      _bloom.npy         filtro de Bloom das chaves de cada grupo (grupos x bytes)
+
+A chave do beneficiário é o hash de 64 bits do CPF mascarado (a mesma chave de
+linha das revisões, partition_delta). Um leitor com filtro de igualdade por
+UF, Município ou CPF (partition_store.iter_rows/iter_records) só lê os grupos
+cujo intervalo contém o valor e, para o CPF, cujo filtro de Bloom o aceita:
+sem compressão ou com gzip, apenas os bytes desses grupos. Com zstd o arquivo
+é um único quadro; os grupos fora do filtro são descomprimidos, mas não
+interpretados.
+
+O Portal não publica o código SIAFI nas colunas armazenadas, então o
+agrupamento usa o nome do município dobrado (schema_registry.fold), o mesmo
+usado nos filtros da API.
+"""
+
+import json
+import mmap
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import chunking
+import partition_store
+import schema_registry
+
+ROW_GROUP_ROWS = 4096
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+BLOOM_BITS = ROW_GROUP_ROWS * BLOOM_BITS_PER_KEY
+KEY_COLUMN = 'CPF do Beneficiário'
+CLUSTER_COLUMNS = partition_store.CLUSTER_COLUMNS
+GROUPS_FILE = partition_store.GROUPS_FILE
+BLOOM_FILE = '_bloom.npy'
+BUFFER_SIZE = 8 * 1024 * 1024
+
+
+def beneficiary_keys(cpfs):
+    """Chave de 64 bits do beneficiário no mês (hash do CPF mascarado)"""
+    return pd.util.hash_array(np.asarray(cpfs, dtype=object))
+
+
+def fold_values(values):
+    """schema_registry.fold aplicado por valor distinto"""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    folded = np.array([schema_registry.fold(v) for v in uniques] + [''], dtype=object)
+    return folded[codes]
+
+
+def cluster_order(ufs, municipios, keys):
+    """Ordem das linhas por (UF, Município dobrado, chave)"""
+    uf_codes = pd.factorize(np.asarray(ufs, dtype=object), sort=True)[0]
+    municipio_codes = pd.factorize(np.asarray(municipios, dtype=object), sort=True)[0]
+    return np.lexsort((keys, municipio_codes, uf_codes))
+
+
+def line_offsets(path):
+    """
+    Início de cada linha de dados (em bytes descomprimidos, sem o cabeçalho)
+    de um CSV da partição e o tamanho total descomprimido
+    """
+    starts = [np.zeros(1, dtype=np.int64)]
+    size = 0
+    with partition_store.open_binary(path) as f:
+        while True:
+            block = f.read(BUFFER_SIZE)
+            if not block:
+                break
+            starts.append(np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10) + size + 1)
+            size += len(block)
+    starts = np.concatenate(starts)
+    return starts[1:][starts[1:] < size], size
+
+
+def _bloom_positions(keys):
+    keys = np.asarray(keys, dtype=np.uint64)
+    h1 = keys & np.uint64(0xFFFFFFFF)
+    h2 = (keys >> np.uint64(32)) | np.uint64(1)
+    steps = np.arange(BLOOM_HASHES, dtype=np.uint64)
+    return (h1[:, None] + steps * h2[:, None]) % np.uint64(BLOOM_BITS)
+
+
+def bloom(keys):
+    """Bits do filtro de Bloom de um grupo (BLOOM_BITS / 8 bytes)"""
+    bits = np.zeros(BLOOM_BITS, dtype=bool)
+    bits[_bloom_positions(keys).ravel().astype(np.int64)] = True
+    return np.packbits(bits, bitorder='little')
+
+
+def zones(ufs, municipios, keys, bounds):
+    """
+    Mapas de zona e filtros de Bloom dos grupos [bounds[i], bounds[i + 1]) de
+    linhas (UF, Município dobrado e chave como arrays)
+    """
+    starts = np.asarray(bounds[:-1], dtype=np.int64)
+    if not len(starts):
+        return [], np.empty((0, BLOOM_BITS // 8), dtype=np.uint8)
+    uf_codes, uf_values = pd.factorize(np.asarray(ufs, dtype=object), sort=True)
+    mun_codes, mun_values = pd.factorize(np.asarray(municipios, dtype=object), sort=True)
+    keys = np.asarray(keys, dtype=np.uint64)
+    columns = {
+        'uf': (np.minimum.reduceat(uf_codes, starts), np.maximum.reduceat(uf_codes, starts),
+               uf_values),
+        'municipio': (np.minimum.reduceat(mun_codes, starts),
+                      np.maximum.reduceat(mun_codes, starts), mun_values),
+    }
+    key_min = np.minimum.reduceat(keys, starts).tolist()
+    key_max = np.maximum.reduceat(keys, starts).tolist()
+
+    records = []
+    for i in range(len(starts)):
+        record = {'rows': int(bounds[i + 1] - bounds[i])}
+        for name, (low, high, values) in columns.items():
+            record[name] = [values[low[i]], values[high[i]]]
+        record['chave'] = [key_min[i], key_max[i]]
+        records.append(record)
+    blooms = np.stack([bloom(keys[bounds[i]:bounds[i + 1]]) for i in range(len(starts))])
+    return records, blooms
+
+
+class GroupWriter:
+    """
+    Arquivo de dados escrito em grupos. Com gzip, cada grupo (e o cabeçalho)
+    é um membro gzip independente; com zstd, um único quadro. end_group()
+    devolve as posições do grupo descomprimidas ('raw') e no arquivo ('file',
+    None com zstd, onde o grupo não pode ser lido sozinho).
+    """
+
+    def __init__(self, path, compression=None):
+        if compression not in (None, 'gzip', 'zstd'):
+            raise ValueError(f"compressão não suportada: {compression}")
+        self.path = path
+        self.compression = compression
+        self.raw_bytes = 0
+        self.file_bytes = 0
+        self._file = open(path, 'wb', buffering=BUFFER_SIZE)
+        self._codec = None
+        if compression == 'zstd':
+            import zstandard
+            self._codec = zstandard.ZstdCompressor(level=3).compressobj()
+        self._group_start = (0, 0)
+
+    def _emit(self, block):
+        self._file.write(block)
+        self.file_bytes += len(block)
+
+    def write_bytes(self, block):
+        if not block:
+            return 0
+        self.raw_bytes += len(block)
+        if self.compression == 'gzip':
+            if self._codec is None:
+                self._codec = zlib.compressobj(6, zlib.DEFLATED, 31)
+            self._emit(self._codec.compress(block))
+        elif self._codec is not None:
+            self._emit(self._codec.compress(block))
+        else:
+            self._emit(block)
+        return len(block)
+
+    def end_group(self, record=None):
+        """Fecha o grupo corrente; retorna `record` com as posições do grupo"""
+        if self.compression == 'gzip' and self._codec is not None:
+            self._emit(self._codec.flush())
+            self._codec = None
+        raw_start, file_start = self._group_start
+        record = dict(record or {})
+        record['raw'] = [raw_start, self.raw_bytes]
+        record['file'] = None if self.compression == 'zstd' else [file_start, self.file_bytes]
+        self._group_start = (self.raw_bytes, self.file_bytes)
+        return record
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self._codec is not None:
+                self._emit(self._codec.flush())
+                self._codec = None
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def save(directory, header, groups, blooms):
+    """Grava _grupos.json e _bloom.npy da partição"""
+    layout = {
+        'clustered_by': CLUSTER_COLUMNS,
+        'row_group_rows': ROW_GROUP_ROWS,
+        'bloom_bits': BLOOM_BITS,
+        'bloom_hashes': BLOOM_HASHES,
+        'header': header,
+        'groups': groups,
+    }
+    bloom_path = os.path.join(directory, BLOOM_FILE)
+    with open(bloom_path + '.tmp', 'wb') as f:
+        np.save(f, np.asarray(blooms, dtype=np.uint8).reshape(len(groups), BLOOM_BITS // 8))
+    os.replace(bloom_path + '.tmp', bloom_path)
+    groups_path = os.path.join(directory, GROUPS_FILE)
+    with open(groups_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(layout, f, ensure_ascii=False)
+    os.replace(groups_path + '.tmp', groups_path)
+
+
+def load(directory):
+    """Layout da partição (com os filtros de Bloom em 'blooms') ou None"""
+    path = os.path.join(directory, GROUPS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        layout = json.load(f)
+    layout['blooms'] = np.load(os.path.join(directory, BLOOM_FILE), mmap_mode='r')
+    return layout
+
+
+def remove(directory):
+    for name in (GROUPS_FILE, BLOOM_FILE):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _extend_header(line, names):
+    """Linha de cabeçalho (bytes) com as colunas `names` acrescentadas"""
+    import csv_writer
+    return line.rstrip(b'\r\n') + b';' + csv_writer.format_header(names).encode('utf-8')
+
+
+def _rewrite(f, out, appended):
+    """Cópia de `f` para `out` na ordem original, com as colunas de `appended`"""
+    if appended is None:
+        while True:
+            block = f.read(BUFFER_SIZE)
+            if not block:
+                break
+            out.write_bytes(block)
+        return
+    import csv_writer
+    names, ids = appended
+    out.write_bytes(_extend_header(f.readline(), names))
+    f.seek(0)
+    position = 0
+    for chunk in chunking.read_csv_chunks(f, sep=';', dtype=str, keep_default_na=False):
+        for i, name in enumerate(names):
+            chunk[name] = ids[position:position + len(chunk), i]
+        position += len(chunk)
+        out.write_bytes(csv_writer.format_rows(chunk).encode('utf-8'))
+
+
+def cluster(source, output, compression=None, columns=None, appended=None):
+    """
+    Reescreve o CSV `source` (sem compressão) em `output` no layout agrupado e
+    grava o layout no diretório de `output`. `columns` (CLUSTER_COLUMNS ->
+    listas de arrays, na ordem das linhas) evita reler essas colunas de
+    `source`; `appended` (nomes, matriz de inteiros linhas x colunas, na ordem
+    de `source`) acrescenta colunas ao fim de cada linha (os ids de
+    string_pool). Com quebras de linha dentro de campos, copia as linhas na
+    ordem original, sem grupos. Retorna a ordem das linhas gravadas (posições
+    em `source`, ou None quando a ordem original foi mantida) e os bytes
+    descomprimidos gravados.
+    """
+    directory = os.path.dirname(output)
+    offsets, size = line_offsets(source)
+    if columns is None:
+        columns = {column: [] for column in CLUSTER_COLUMNS}
+        for chunk in chunking.read_csv_chunks(source, sep=';', usecols=CLUSTER_COLUMNS,
+                                              dtype=str, keep_default_na=False):
+            for column in CLUSTER_COLUMNS:
+                columns[column].append(chunk[column].to_numpy(dtype=object))
+    ufs, municipios, cpfs = (columns[column] for column in CLUSTER_COLUMNS)
+    rows = sum(len(values) for values in ufs)
+
+    with open(source, 'rb') as f, GroupWriter(output, compression) as out:
+        if rows != len(offsets) or rows == 0:
+            _rewrite(f, out, appended)
+            remove(directory)
+            return None, out.raw_bytes
+
+        ufs = np.concatenate(ufs)
+        municipios = fold_values(np.concatenate(municipios))
+        keys = beneficiary_keys(np.concatenate(cpfs))
+        order = cluster_order(ufs, municipios, keys)
+        ufs, municipios, keys = ufs[order], municipios[order], keys[order]
+        starts = offsets[order].tolist()
+        ends = np.append(offsets[1:], size)[order].tolist()
+        suffixes = None
+        if appended is not None:
+            # a linha perde o '\n' final e recebe ';' + colunas acrescentadas + '\n'
+            ends = [end - 1 for end in ends]
+            suffixes = appended[1][order]
+
+        bounds = list(range(0, rows, ROW_GROUP_ROWS)) + [rows]
+        records, blooms = zones(ufs, municipios, keys, bounds)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if appended is None:
+                out.write_bytes(data[:int(offsets[0])])
+            else:
+                out.write_bytes(_extend_header(data[:int(offsets[0])], appended[0]))
+            header = out.end_group()
+            groups = []
+            for i, record in enumerate(records):
+                lines = range(bounds[i], bounds[i + 1])
+                if suffixes is None:
+                    out.write_bytes(b''.join([data[starts[j]:ends[j]] for j in lines]))
+                else:
+                    texts = [(';' + ';'.join(map(str, values)) + '\n').encode('ascii')
+                             for values in suffixes[bounds[i]:bounds[i + 1]].tolist()]
+                    out.write_bytes(b''.join([data[starts[j]:ends[j]] + texts[k]
+                                              for k, j in enumerate(lines)]))
+                groups.append(out.end_group(record))
+
+    save(directory, header, groups, blooms)
+    return order, out.raw_bytes
+
+
+def may_match(layout, position, uf=None, municipio=None, key=None):
+    """O grupo `position` pode conter linhas com estes valores?"""
+    group = layout['groups'][position]
+    if uf is not None and not group['uf'][0] <= uf <= group['uf'][1]:
+        return False
+    if municipio is not None and not group['municipio'][0] <= municipio <= group['municipio'][1]:
+        return False
+    if key is not None:
+        if not group['chave'][0] <= key <= group['chave'][1]:
+            return False
+        bits = layout['blooms'][position]
+        for bit in _bloom_positions([key])[0].tolist():
+            if not bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+    return True
+
+
+def select(layout, uf=None, municipio=None, cpf=None):
+    """Grupos que podem conter linhas com UF, Município (dobrado) e CPF pedidos"""
+    key = int(beneficiary_keys([cpf])[0]) if cpf is not None else None
+    return [group for position, group in enumerate(layout['groups'])
+            if may_match(layout, position, uf, municipio, key)]
+
+
+def read_groups(path, groups):
+    """Bytes descomprimidos de cada grupo (em ordem de posição no arquivo)"""
+    if not groups:
+        return
+    if groups[0]['file'] is not None:
+        with open(path, 'rb') as f:
+            for group in groups:
+                start, end = group['file']
+                f.seek(start)
+                data = f.read(end - start)
+                yield zlib.decompress(data, 31) if path.endswith('.gz') else data
+        return
+
+    with partition_store.open_binary(path) as f:
+        position = 0
+        for group in groups:
+            start, end = group['raw']
+            while position < start:
+                skipped = f.read(min(start - position, BUFFER_SIZE))
+                if not skipped:
+                    return
+                position += len(skipped)
+            parts = []
+            while position < end:
+                block = f.read(end - position)
+                if not block:
+                    break
+                parts.append(block)
+                position += len(block)
+            yield b''.join(parts)
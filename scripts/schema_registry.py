@@ -0,0 +1,282 @@
+"""
+Verificação prévia do esquema dos arquivos mensais do Portal
+
+Antes do parse completo, lê apenas o início de cada CSV (cabeçalho e algumas
+linhas), detecta codificação e separador, normaliza os nomes das colunas
+(acentos, caixa, '_'), calcula uma impressão digital do esquema e decide:
+
+  - aceitar, com o mapeamento das colunas do arquivo para os nomes canônicos;
+  - rejeitar, quando faltam colunas obrigatórias ou as linhas não batem com
+    o cabeçalho.
+
+As decisões ficam em cache (JSON) por impressão digital, de forma que um
+esquema já visto é aceito ou rejeitado sem recalcular o mapeamento.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from datetime import datetime
+
+import config
+
+HEAD_BYTES = 64 * 1024
+SAMPLE_ROWS = 20
+
+# Colunas publicadas pelo Portal (nome canônico)
+PORTAL_COLUMNS = [
+    'MÊS FOLHA', 'MÊS REFERÊNCIA', 'UF', 'CÓDIGO MUNICÍPIO SIAFI', 'NOME MUNICÍPIO',
+    'NIS BENEFICIÁRIO', 'CPF BENEFICIÁRIO', 'NOME BENEFICIÁRIO',
+    'NIS RESPONSÁVEL', 'CPF RESPONSÁVEL', 'NOME RESPONSÁVEL',
+    'CÓDIGO ETAPA ENSINO', 'ETAPA ENSINO', 'CÓDIGO TIPO INCENTIVO', 'TIPO INCENTIVO',
+    'DATA DO PAGAMENTO', 'VALOR PARCELA',
+]
+
+# Nomes alternativos já vistos em exportações antigas (forma normalizada)
+ALIASES = {
+    'MES REF': 'MÊS REFERÊNCIA',
+    'MESREFERENCIA': 'MÊS REFERÊNCIA',
+    'ESTADO': 'UF',
+    'MUNICIPIO': 'NOME MUNICÍPIO',
+    'BENEFICIARIO': 'NOME BENEFICIÁRIO',
+    'CPF': 'CPF BENEFICIÁRIO',
+    'REPRESENTANTE LEGAL': 'NOME RESPONSÁVEL',
+    'VALOR DISPONIBILIZADO': 'VALOR PARCELA',
+    'VALOR': 'VALOR PARCELA',
+}
+
+# Coluna do arquivo consolidado -> coluna canônica de origem
+CONSOLIDATED_SOURCES = {
+    'UF': 'UF',
+    'Município': 'NOME MUNICÍPIO',
+    'Beneficiário': 'NOME BENEFICIÁRIO',
+    'CPF do Beneficiário': 'CPF BENEFICIÁRIO',
+    'Representante Legal': 'NOME RESPONSÁVEL',
+    'Valor Disponibilizado': 'VALOR PARCELA',
+}
+REQUIRED_COLUMNS = list(CONSOLIDATED_SOURCES.values())
+
+# Colunas extras do armazenamento particionado (usadas se o arquivo as tiver)
+EXTRA_SOURCES = {
+    'Código Etapa Ensino': 'CÓDIGO ETAPA ENSINO',
+    'Código Tipo Incentivo': 'CÓDIGO TIPO INCENTIVO',
+    'Data do Pagamento': 'DATA DO PAGAMENTO',
+    'CPF do Representante': 'CPF RESPONSÁVEL',
+}
+
+_lock = threading.Lock()
+_cache = None
+_cache_path = None
+
+
+class SchemaRejected(ValueError):
+    """O esquema do arquivo não é compatível com o pipeline"""
+
+
+def fold(name):
+    """Forma normalizada: sem acentos, maiúsculas, '_' como espaço, espaços simples"""
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.replace('_', ' ').upper().split())
+
+
+def skeleton(name):
+    """
+    Forma normalizada sem as letras não-ASCII: casa nomes cujos acentos foram
+    descartados por uma decodificação errada ('NOME MUNICPIO')
+    """
+    text = ' '.join(str(name).replace('_', ' ').upper().split())
+    return ''.join(ch for ch in text if ord(ch) < 128)
+
+
+_BY_FOLD = {fold(c): c for c in PORTAL_COLUMNS}
+_BY_FOLD.update({fold(alias): c for alias, c in ALIASES.items()})
+_BY_SKELETON = {skeleton(c): c for c in PORTAL_COLUMNS}
+
+
+def canonical_name(name):
+    """Nome canônico de uma coluna do arquivo (None se desconhecida)"""
+    name = str(name).strip().lstrip('\ufeff')
+    return _BY_FOLD.get(fold(name)) or _BY_SKELETON.get(skeleton(name))
+
+
+def detect_encoding(head):
+    """utf-8 (com ou sem BOM) se o início decodifica sem erro, senão latin-1"""
+    if head.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    try:
+        head.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # Caractere multibyte cortado no fim do trecho lido não conta
+        if e.start >= len(head) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8'
+        return 'latin-1'
+
+
+def fingerprint(encoding, sep, header):
+    payload = json.dumps([encoding, sep, header], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def inspect_head(head):
+    """
+    Analisa o início de um CSV e devolve a decisão (dict) sem consultar o cache:
+    fingerprint, encoding, sep, header, rename (coluna do arquivo -> canônica),
+    missing, unknown, accepted, reason
+    """
+    encoding = detect_encoding(head)
+    text = head.decode(encoding, errors='replace')
+    lines = text.splitlines()
+    # A última linha pode estar cortada
+    if len(lines) > 1 and not text.endswith(('\n', '\r')):
+        lines = lines[:-1]
+    header_line = lines[0] if lines else ''
+    sep = ';' if header_line.count(';') >= header_line.count(',') else ','
+    rows = list(csv.reader(lines[:SAMPLE_ROWS + 1], delimiter=sep))
+    header = [h.strip() for h in rows[0]] if rows else []
+
+    rename = {}
+    unknown = []
+    for column in header:
+        canonical = canonical_name(column)
+        if canonical and canonical not in rename.values():
+            rename[column] = canonical
+        else:
+            unknown.append(column)
+    missing = [c for c in REQUIRED_COLUMNS if c not in rename.values()]
+
+    reason = None
+    bad_rows = [i for i, row in enumerate(rows[1:], 1) if row and len(row) != len(header)]
+    if not header:
+        reason = "arquivo vazio"
+    elif missing:
+        reason = f"colunas obrigatórias ausentes: {missing} (cabeçalho: {header})"
+    elif bad_rows:
+        reason = f"linhas com número de campos diferente do cabeçalho: {bad_rows[:5]}"
+
+    return {
+        'fingerprint': fingerprint(encoding, sep, header),
+        'encoding': encoding,
+        'sep': sep,
+        'header': header,
+        'rename': rename,
+        'missing': missing,
+        'unknown': unknown,
+        'accepted': reason is None,
+        'reason': reason,
+    }
+
+
+def _load_cache(path):
+    global _cache, _cache_path
+    if _cache is None or _cache_path != path:
+        _cache_path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save_cache(path):
+    """Grava o cache; se não for possível (ex.: diretório inexistente), segue só em memória"""
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_cache, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def default_cache_path():
+    return config.data_path("esquemas_conhecidos.json")
+
+
+def check_head(head, period=None, cache_path=None):
+    """
+    Decisão para o início de um CSV, usando o cache de impressões digitais.
+    O resultado traz 'cached' indicando se a decisão veio do cache.
+    """
+    cache_path = cache_path or default_cache_path()
+    encoding = detect_encoding(head)
+    # Impressão digital calculada só com o cabeçalho (barato); o resto da
+    # análise só roda para esquemas novos
+    header_line = head.decode(encoding, errors='replace').splitlines()[0] if head else ''
+    sep = ';' if header_line.count(';') >= header_line.count(',') else ','
+    header = [h.strip() for h in next(csv.reader([header_line], delimiter=sep), [])]
+    key = fingerprint(encoding, sep, header)
+
+    with _lock:
+        cache = _load_cache(cache_path)
+        known = cache.get(key)
+        if known is not None:
+            if period and period not in known['periods']:
+                known['periods'].append(period)
+                _save_cache(cache_path)
+            return dict(known, cached=True)
+
+        decision = inspect_head(head)
+        # Rejeições por linhas malformadas dependem do trecho, não do esquema
+        if decision['accepted'] or decision['missing'] or not decision['header']:
+            decision.update(first_seen=datetime.now().isoformat(timespec='seconds'),
+                            periods=[period] if period else [])
+            cache[key] = decision
+            _save_cache(cache_path)
+        return dict(decision, cached=False)
+
+
+def check_zip_member(zip_file, name, period=None, cache_path=None):
+    """Lê só os primeiros KB do membro (descomprimindo apenas esse trecho)"""
+    with zip_file.open(name) as f:
+        head = f.read(HEAD_BYTES)
+    decision = check_head(head, period, cache_path)
+    decision['member'] = name
+    return decision
+
+
+def require(decision, label=''):
+    """Lança SchemaRejected se a decisão for de rejeição"""
+    if not decision['accepted']:
+        raise SchemaRejected(f"esquema rejeitado{' para ' + label if label else ''}: "
+                             f"{decision['reason']} [{decision['fingerprint']}]")
+    return decision
+
+
+def consolidated_rename(decision, extras=False):
+    """
+    Coluna do arquivo -> coluna do arquivo consolidado (UF, Município, ...);
+    com `extras`, também as colunas de EXTRA_SOURCES presentes no arquivo
+    """
+    source_to_file = {canonical: column for column, canonical in decision['rename'].items()}
+    rename = {source_to_file[source]: target for target, source in CONSOLIDATED_SOURCES.items()}
+    if extras:
+        rename.update({source_to_file[source]: target for target, source in EXTRA_SOURCES.items()
+                       if source in source_to_file})
+    return rename
+
+
+def columns_rename(columns):
+    """Mapeamento para o consolidado a partir de colunas já lidas (ex.: df.columns)"""
+    rename = {}
+    for column in columns:
+        canonical = canonical_name(column)
+        for target, source in CONSOLIDATED_SOURCES.items():
+            if canonical == source and target not in rename.values():
+                rename[column] = target
+    return rename
+
+
+def describe(decision):
+    status = "aceito" if decision['accepted'] else "REJEITADO"
+    origin = "cache" if decision.get('cached') else "novo"
+    text = (f"esquema {decision['fingerprint']} ({origin}): {status}, "
+            f"{decision['encoding']}, sep '{decision['sep']}', {len(decision['header'])} colunas")
+    if decision['unknown']:
+        text += f", não mapeadas: {decision['unknown']}"
+    return text
@@ -1,11 +1,7 @@
-import requests
-import pandas as pd
-from bs4 import BeautifulSoup
 import time
-import re
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait, Select
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
@@ -165,6 +161,8 @@ def scrape_portal_transparencia():
                     # Truncar se houver colunas extras
                     cleaned_data.append(row[:len(headers)])
             
+            import pandas as pd  # importado só quando há dados para salvar
+            
             df = pd.DataFrame(cleaned_data, columns=headers)
             
             # Salvar em CSV
@@ -0,0 +1,347 @@
+"""
+Remoção de duplicatas em paralelo, com as linhas particionadas por hash da chave
+
+A chave de duplicata (CPF do Beneficiário no período) é distribuída por hash
+entre K shards: todas as ocorrências de uma chave caem no mesmo shard, então
+cada shard é deduplicado de forma independente, em um processo separado.
+
+    1. ShardWriter: recebe as linhas da coleta no lugar do arquivo
+       temporário (process_period_to_file) e grava cada linha no shard da
+       sua chave. K é escolhido antes da coleta (planned_shards), pelo
+       orçamento de memória e pelo tamanho esperado dos meses, com ao menos
+       um shard por processo. As linhas chegam a cada shard na ordem da
+       coleta, então a primeira ocorrência de uma chave no shard é a
+       primeira da coleta. remove_duplicates faz o mesmo a partir de um
+       arquivo temporário já gravado (uma leitura a mais);
+    2. dedup_shard (pool de processos): lê o shard em chunks, mantém a
+       primeira ocorrência de cada chave e grava, por período, uma parte sem
+       cabeçalho já no formato do arquivo intermediário da partição
+       (PartitionWriter.part_columns, sem as colunas codificadas), além das
+       colunas de agrupamento e dos dicionários dessas linhas. As chaves já
+       vistas ficam em um array ordenado de hashes (filtro) com a chave exata
+       ao lado, comparada sempre que o hash coincide: uma colisão de hash não
+       descarta a linha. Com o pré-filtro (dedup_prefilter), cada shard passa
+       antes pelo filtro de Bloom e só as chaves candidatas são comparadas;
+    3. as partes são acrescentadas às partições (PartitionWriter.append_part)
+       à medida que cada shard termina (no máximo um shard em andamento por
+       processo, e cada resultado é descartado depois de gravado), e no
+       close() são ordenadas pelo agrupamento (row_groups) como na remoção
+       serial, então os dados gravados são os mesmos.
+"""
+
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+import chunking
+import csv_writer
+import partition_store
+import row_groups
+
+KEY_COLUMNS = [partition_store.PERIOD_COLUMN, 'CPF do Beneficiário']
+SOURCE_COLUMNS = [partition_store.PERIOD_COLUMN] + partition_store.DATA_COLUMNS
+# Colunas coletadas pelo PartitionWriter padrão (agrupamento e dicionários)
+COLLECTED_COLUMNS = list(dict.fromkeys(partition_store.CLUSTER_COLUMNS
+                                       + partition_store.ENCODED_COLUMNS))
+MAX_SHARDS = 512
+SHARD_BUFFER = 256 * 1024  # buffer de escrita de cada shard (K arquivos abertos)
+# Tamanho esperado de um mês (~4 milhões de alunos do programa) e de uma linha
+# do arquivo temporário, para escolher K antes de conhecer os dados
+EXPECTED_PERIOD_ROWS = 4_000_000
+EXPECTED_ROW_BYTES = 160
+# Memória por linha de um shard além dos próprios caracteres: hash e chave
+# exata (8 + ~24 bytes) e, por coluna coletada, o objeto str
+KEY_BYTES = 32
+PY_STR_BYTES = 56
+
+
+def shard_workers(max_workers=None):
+    """Shards (e processos) a usar: um por núcleo, ou `max_workers`"""
+    return max(1, max_workers or os.cpu_count() or 1)
+
+
+def shard_count(rows, size, workers, collected, budget_mb=None):
+    """
+    Número de shards para que os `workers` shards processados ao mesmo tempo
+    caibam no orçamento de memória (chunking.budget_mb), estimando o custo de
+    cada linha pelo tamanho médio da linha e pelas colunas coletadas
+    """
+    if not rows:
+        return workers
+    budget_bytes = (budget_mb or chunking.budget_mb()) * 1e6
+    bytes_per_row = size / rows + KEY_BYTES + PY_STR_BYTES * len(collected)
+    per_shard_rows = max(1, int(budget_bytes / workers / bytes_per_row))
+    return max(workers, min(MAX_SHARDS, -(-rows // per_shard_rows)))
+
+
+def planned_shards(periods, workers, collected=COLLECTED_COLUMNS, budget_mb=None,
+                   period_rows=EXPECTED_PERIOD_ROWS):
+    """shard_count para `periods` meses do tamanho esperado, antes da coleta"""
+    rows = periods * period_rows
+    return shard_count(rows, rows * EXPECTED_ROW_BYTES, workers, collected, budget_mb)
+
+
+def key_hashes(chunk):
+    """Hash (uint64) da chave de duplicata de cada linha"""
+    return pd.util.hash_pandas_object(chunk[KEY_COLUMNS], index=False).to_numpy()
+
+
+def key_values(chunk):
+    """Chave exata ("período;CPF", bytes) de cada linha"""
+    keys = chunk[partition_store.PERIOD_COLUMN].astype(str) + ';' + \
+        chunk['CPF do Beneficiário'].astype(str)
+    return np.char.encode(keys.to_numpy(dtype=str), 'utf-8')
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        return f.readline()
+
+
+class ShardWriter:
+    """
+    Grava as linhas (SOURCE_COLUMNS) em `shards` CSVs no diretório `path`,
+    cada linha no shard do hash da sua chave. Tem a interface de escrita do
+    csv_writer.CsvWriter usada pelo coletor (write, append_file, path,
+    rows_written). Com `scanner` (anomalies.AnomalyScanner), cada chunk
+    também passa pela detecção de anomalias (tempo em `scan_seconds`).
+    """
+
+    def __init__(self, path, shards, scanner=None):
+        self.path = path
+        self.shards = shards
+        self.scanner = scanner
+        self.scan_seconds = 0.0
+        self.rows_written = 0
+        self.bytes_written = 0
+        os.makedirs(path, exist_ok=True)
+        self.paths = [os.path.join(path, f"shard_{i:04d}.csv") for i in range(shards)]
+        self._writers = [csv_writer.CsvWriter(shard_path, columns=SOURCE_COLUMNS,
+                                              buffer_size=SHARD_BUFFER)
+                         for shard_path in self.paths]
+
+    def write(self, df):
+        """Distribui um chunk entre os shards; retorna os bytes escritos"""
+        if self.scanner is not None:
+            scan_start = time.perf_counter()
+            self.scanner.update(df)
+            self.scan_seconds += time.perf_counter() - scan_start
+        if len(df) == 0:
+            return 0
+        df = df[SOURCE_COLUMNS]
+        shard = key_hashes(df) % np.uint64(self.shards)
+        columns = [csv_writer.format_column(csv_writer.column_values(df[column]))
+                   for column in SOURCE_COLUMNS]
+        lines = np.array([';'.join(values) + '\n' for values in zip(*columns)], dtype=object)
+        order = np.argsort(shard, kind='stable')
+        bounds = np.searchsorted(shard[order], np.arange(self.shards + 1))
+        nbytes = 0
+        for i in np.flatnonzero(np.diff(bounds)).tolist():
+            selected = order[bounds[i]:bounds[i + 1]]
+            nbytes += self._writers[i].write_text(''.join(lines[selected]), len(selected))
+        self.rows_written += len(df)
+        self.bytes_written += nbytes
+        return nbytes
+
+    def append_file(self, path, rows, columns=None):
+        """Distribui um CSV parcial sem cabeçalho (`columns`); retorna os bytes"""
+        nbytes = 0
+        for chunk in chunking.read_csv_chunks(path, sep=';', encoding='utf-8', header=None,
+                                              names=columns or SOURCE_COLUMNS, dtype=str):
+            nbytes += self.write(chunk)
+        return nbytes
+
+    def close(self):
+        for writer in self._writers:
+            writer.close()
+
+    def remove(self):
+        """Fecha e apaga os shards"""
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _first_seen(hashes, keys, seen, seen_keys):
+    """
+    Máscara das linhas cuja chave aparece pela primeira vez (nem no chunk
+    antes delas, nem nas já vistas) e os novos (`seen`, `seen_keys`): hashes
+    ordenados e, na mesma ordem, as chaves exatas. O hash só seleciona as
+    chaves a comparar; a decisão é sempre pela chave exata.
+    """
+    rows = np.flatnonzero(~pd.Series(keys).duplicated().to_numpy())
+    candidate_hashes, candidate_keys = hashes[rows], keys[rows]
+    low = np.searchsorted(seen, candidate_hashes, side='left')
+    high = np.searchsorted(seen, candidate_hashes, side='right')
+    new = low == high
+    hits = np.flatnonzero(~new)
+    if len(hits):
+        same = seen_keys[low[hits]] == candidate_keys[hits]
+        # Colisão: o hash já visto é de outra chave (mais de uma, se high - low > 1)
+        for i in hits[~same].tolist():
+            new[i] = candidate_keys[i] not in seen_keys[low[i]:high[i]].tolist()
+    kept = np.zeros(len(hashes), dtype=bool)
+    kept[rows[new]] = True
+
+    # Intercala as chaves novas (ordenadas pelo hash) sem reordenar o array inteiro
+    order = np.argsort(candidate_hashes[new], kind='stable')
+    new_hashes, new_keys = candidate_hashes[new][order], candidate_keys[new][order]
+    if new_keys.dtype.itemsize > seen_keys.dtype.itemsize:
+        seen_keys = seen_keys.astype(new_keys.dtype)
+    position = np.searchsorted(seen, new_hashes)
+    return kept, np.insert(seen, position, new_hashes), np.insert(seen_keys, position, new_keys)
+
+
+def dedup_shard(shard_path, part_dir, collected, columns, budget_mb=None, prefilter=False):
+    """
+    Worker: primeira ocorrência de cada chave do shard, gravada em uma parte
+    por período com as colunas `columns` (PartitionWriter.part_columns). O
+    shard é lido em chunks, comparando cada chave com as já vistas
+    (_first_seen). Com `prefilter`, as chaves do shard passam antes pelo
+    filtro de Bloom (dedup_prefilter.scan) e só as linhas com chave candidata
+    são comparadas; as demais são únicas no shard. Retorna {'rows', 'unique',
+    'parts': {período: {'path', 'rows', 'columns'}}, 'prefilter': resumo ou
+    None}; `columns` traz as colunas `collected` das linhas.
+    """
+    if budget_mb:
+        chunking.configure(budget_mb)
+    name = os.path.splitext(os.path.basename(shard_path))[0]
+    candidates = None
+    if prefilter:
+        import dedup_prefilter
+        candidates = dedup_prefilter.scan(shard_path)
+
+    seen = np.empty(0, dtype=np.uint64)
+    seen_keys = np.empty(0, dtype='S1')
+    parts = {}
+    files = {}
+    rows = unique = 0
+    try:
+        for chunk in chunking.read_csv_chunks(shard_path, sep=';', encoding='utf-8',
+                                              dtype=str, keep_default_na=False):
+            if candidates is None:
+                kept, seen, seen_keys = _first_seen(key_hashes(chunk), key_values(chunk),
+                                                    seen, seen_keys)
+            else:
+                # Só as chaves candidatas vão às chaves já vistas
+                kept = np.ones(len(chunk), dtype=bool)
+                checked = np.flatnonzero(candidates.probable(chunk))
+                kept[checked], seen, seen_keys = _first_seen(
+                    key_hashes(chunk.iloc[checked]), key_values(chunk.iloc[checked]),
+                    seen, seen_keys)
+            unique += int(kept.sum())
+            periods = chunk[partition_store.PERIOD_COLUMN].to_numpy(dtype=object)
+            for year_month in pd.unique(periods[kept]):
+                year_month = str(year_month)
+                selected = np.flatnonzero(kept & (periods == year_month))
+                part = parts.get(year_month)
+                if part is None:
+                    path = os.path.join(part_dir, f"{name}_{year_month}.csv")
+                    files[year_month] = open(path, 'wb')
+                    part = parts[year_month] = {'path': path, 'rows': 0,
+                                                'columns': {c: [] for c in collected}}
+                rows_selected = chunk.iloc[selected]
+                files[year_month].write(
+                    csv_writer.format_rows(rows_selected[columns]).encode('utf-8'))
+                part['rows'] += len(selected)
+                for column in collected:
+                    part['columns'][column].append(
+                        rows_selected[column].to_numpy(dtype=object, na_value=''))
+            rows += len(chunk)
+    finally:
+        for out in files.values():
+            out.close()
+
+    for part in parts.values():
+        part['columns'] = {column: np.concatenate(values)
+                           for column, values in part['columns'].items()}
+    summary = candidates.summary(rows - unique, len(seen)) if candidates is not None else None
+    return {'rows': rows, 'unique': unique, 'parts': parts, 'prefilter': summary}
+
+
+def dedup_shards(shards, writer, max_workers=None, log=None, prefilter=False):
+    """
+    Deduplica os shards de `shards` (ShardWriter, fechado ao final da coleta)
+    em paralelo e grava as linhas únicas em `writer` (PartitionWriter). Cada
+    shard é apagado depois de gravado. Com `prefilter`, cada shard usa o
+    filtro de Bloom (dedup_shard), e o resumo somado dos shards vai para o
+    `log`. Retorna (linhas lidas, linhas únicas).
+    """
+    shards.close()
+    workers = shard_workers(max_workers)
+    if log:
+        log(f"{shards.rows_written:,} linhas em {shards.shards} shards ({workers} processos)")
+
+    # spawn: os processos não herdam o estado de instrumentação/tracemalloc do pai.
+    # No máximo `workers` shards em andamento; cada resultado é gravado assim
+    # que o shard termina e descartado em seguida (a future sai de `running`)
+    context = multiprocessing.get_context('spawn')
+    unique = 0
+    summaries = []
+    queued = iter(shards.paths)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        running = {}  # future -> shard
+        for path in itertools.islice(queued, workers):
+            running[pool.submit(dedup_shard, path, shards.path, writer.collected_columns,
+                                writer.part_columns, chunking.budget_mb() / workers,
+                                prefilter)] = path
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                for year_month, part in sorted(result['parts'].items()):
+                    writer.append_part(year_month, part['path'], part['rows'], part['columns'])
+                    os.remove(part['path'])
+                os.remove(running.pop(future))
+                unique += result['unique']
+                if result['prefilter'] is not None:
+                    summaries.append(result['prefilter'])
+                del result
+                for path in itertools.islice(queued, 1):
+                    running[pool.submit(dedup_shard, path, shards.path,
+                                        writer.collected_columns, writer.part_columns,
+                                        chunking.budget_mb() / workers, prefilter)] = path
+            del done, future
+    if summaries and log:
+        import dedup_prefilter
+        log("Pré-filtro (shards): " + dedup_prefilter.describe(dedup_prefilter.combine(summaries)))
+    return shards.rows_written, unique
+
+
+def remove_duplicates(input_file, writer, max_workers=None, scanner=None, stats=None, log=None,
+                      prefilter=False):
+    """
+    Remove as duplicatas de um arquivo temporário já gravado: distribui as
+    linhas em shards (ShardWriter, K pelo tamanho do arquivo) e os deduplica
+    com dedup_shards (com o filtro de Bloom em cada shard, se `prefilter`). Retorna (linhas lidas, linhas únicas, segundos na
+    detecção de anomalias), ou None se o cabeçalho não for o layout do
+    coletor (`periodo` seguido das DATA_COLUMNS), antes de ler os dados.
+    """
+    if _read_header(input_file) != csv_writer.format_header(SOURCE_COLUMNS).encode('utf-8'):
+        return None
+    workers = shard_workers(max_workers)
+    rows = len(row_groups.line_offsets(input_file)[0])
+    count = shard_count(rows, os.path.getsize(input_file), workers, writer.collected_columns)
+    work_dir = tempfile.mkdtemp(prefix='shards_',
+                                dir=os.path.dirname(os.path.abspath(input_file)))
+    try:
+        with ShardWriter(work_dir, count, scanner) as shards:
+            for chunk in chunking.read_csv_chunks(input_file, stats=stats, sep=';',
+                                                  encoding='utf-8', dtype=str):
+                shards.write(chunk)
+        total, unique = dedup_shards(shards, writer, max_workers, log, prefilter)
+        return total, unique, shards.scan_seconds
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
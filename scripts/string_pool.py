@@ -0,0 +1,199 @@
+"""
+Dicionários globais de strings (nomes e municípios) com ids de 32 bits
+
+    pe_de_meia_particoes/
+      _dicionario/
+        nomes_chaves.npy ...     hash da string e ids estáveis
+        nomes.txt, nomes_pos.npy uma string por id (representative_index.IdentityTable)
+        municipios_*             o mesmo para os municípios
+
+Beneficiários e representantes legais compartilham o dicionário `nomes` (o
+mesmo nome costuma aparecer nos dois papéis e em vários meses). Os dicionários
+só crescem: uma string nova recebe o próximo id e os ids já atribuídos valem
+para todas as partições, então agrupamentos e junções entre meses comparam
+inteiros em vez de strings.
+
+dados.csv guarda os ids no lugar das strings (partition_store): PartitionWriter
+codifica as colunas no close(), partition_delta.revise codifica as linhas novas
+e partition_store.read_chunks/iter_rows decodificam na leitura. A decodificação
+(id -> string) abre o .txt via mmap e lê só as strings dos ids distintos
+pedidos. update() regrava no layout codificado as partições gravadas antes dos
+dicionários.
+"""
+
+import json
+import mmap
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import partition_store
+from representative_index import IdentityTable
+
+POOLS = {
+    'nomes': ['Beneficiário', 'Representante Legal'],
+    'municipios': ['Município'],
+}
+COLUMN_POOLS = {column: name for name, columns in POOLS.items() for column in columns}
+ID_FIELDS = {'Beneficiário': 'beneficiario', 'Representante Legal': 'representante',
+             'Município': 'municipio'}
+ENCODED_COLUMNS = partition_store.ENCODED_COLUMNS
+IDS_DTYPE = np.dtype([(field, np.int32) for field in ID_FIELDS.values()])
+DELTA_DIR = '_deltas'  # partition_delta.DELTA_DIR
+DICTIONARY_DIR = '_dicionario'
+MAX_IDS = np.iinfo(np.int32).max
+
+
+def dictionary_root(store_root):
+    return os.path.join(store_root, DICTIONARY_DIR)
+
+
+def string_keys(values):
+    """Chave de 64 bits de cada string"""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+class StringPool:
+    """
+    Dicionário string <-> id de um tipo de valor. Com `writable`, os arrays são
+    carregados em memória (encode reescreve os arquivos); sem ele, via memmap.
+    """
+
+    def __init__(self, root, name, writable=False):
+        self.root = root
+        self.name = name
+        self.writable = writable
+        self._open()
+
+    def _open(self):
+        self.table = IdentityTable(self.root, self.name, mmap=not self.writable)
+
+    def __len__(self):
+        return len(self.table.keys)
+
+    def text_bytes(self):
+        return int(self.table.positions[-1])
+
+    def lookup(self, values):
+        """ids (int32) das strings, -1 para as que não estão no dicionário"""
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        ids = self.table.find(string_keys(uniques)).astype(np.int32)
+        return ids[codes]
+
+    def encode(self, values):
+        """ids (int32) das strings, atribuindo os próximos ids às novas"""
+        if not self.writable:
+            raise ValueError(f"dicionário '{self.name}' aberto só para leitura")
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        keys = string_keys(uniques)
+        ids = self.table.find(keys)
+        new = np.flatnonzero(ids < 0)
+        if len(new):
+            start = len(self)
+            if start + len(new) > MAX_IDS:
+                raise ValueError(f"dicionário '{self.name}' excede {MAX_IDS} strings")
+            os.makedirs(self.root, exist_ok=True)
+            self.table.append(keys[new], uniques[new].tolist())
+            ids[new] = np.arange(start, start + len(new))
+            self._open()
+        return ids.astype(np.int32)[codes]
+
+    def decode(self, ids):
+        """Strings dos ids (array de objetos, na ordem de `ids`)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        unique, inverse = np.unique(ids, return_inverse=True)
+        if len(unique) and (unique[0] < 0 or unique[-1] >= len(self)):
+            raise KeyError(f"id fora do dicionário '{self.name}'")
+        starts = self.table.positions[unique].tolist()
+        ends = self.table.positions[unique + 1].tolist()
+        values = np.empty(len(unique), dtype=object)
+        if len(unique):
+            with open(os.path.join(self.root, f"{self.name}.txt"), 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+                values[:] = [text[s:e - 1].decode('utf-8') for s, e in zip(starts, ends)]
+        return values[inverse.reshape(ids.shape)]
+
+
+def open_pools(store_root, writable=False):
+    root = dictionary_root(store_root)
+    return {name: StringPool(root, name, writable) for name in POOLS}
+
+
+def encode_columns(pools, columns):
+    """Array IDS_DTYPE a partir de {coluna: array de strings} (ENCODED_COLUMNS)"""
+    rows = len(columns[ENCODED_COLUMNS[0]])
+    ids = np.empty(rows, dtype=IDS_DTYPE)
+    for name, pool_columns in POOLS.items():
+        values = np.concatenate([np.asarray(columns[c], dtype=object) for c in pool_columns])
+        encoded = pools[name].encode(values)
+        for i, column in enumerate(pool_columns):
+            ids[ID_FIELDS[column]] = encoded[i * rows:(i + 1) * rows]
+    return ids
+
+
+def encode_frame(pools, df):
+    return encode_columns(pools, {column: df[column].to_numpy(dtype=object, na_value='')
+                                  for column in ENCODED_COLUMNS})
+
+
+def update(store_root, periods=None, log=None):
+    """
+    Regrava com ids as partições ainda com as strings (sem 'string_pools' no
+    metadata), mantendo os deltas e o histórico de revisões; retorna um resumo
+    """
+    encoded = {}
+    for year_month in periods or partition_store.list_periods(store_root):
+        meta = partition_store.read_metadata(store_root, year_month)
+        if meta.get('string_pools') or not meta['rows']:
+            continue
+        encoded[year_month] = _encode_partition(store_root, year_month, meta)
+        if log:
+            log(f"Partição {year_month} codificada: {encoded[year_month]:,} linhas")
+    return {'encoded': encoded, **summary(store_root)}
+
+
+def _encode_partition(store_root, year_month, meta):
+    """Regrava a partição pelo PartitionWriter (ids, agrupamento); retorna as linhas"""
+    directory = partition_store.partition_dir(store_root, year_month)
+    # o close() substitui o diretório; os deltas ficam fora dele durante a regravação
+    deltas = os.path.join(directory, DELTA_DIR)
+    kept = os.path.join(store_root, f".deltas_{year_month}")
+    shutil.rmtree(kept, ignore_errors=True)
+    if os.path.isdir(deltas):
+        os.replace(deltas, kept)
+    try:
+        with partition_store.PartitionWriter(
+                store_root, partition_store.compression_of(meta['data_file'])) as writer:
+            for chunk in partition_store.read_chunks(store_root, year_month, meta=meta):
+                chunk = chunk.reindex(columns=partition_store.DATA_COLUMNS, fill_value='')
+                writer.write(chunk.assign(**{partition_store.PERIOD_COLUMN: year_month}))
+    finally:
+        if os.path.isdir(kept):
+            os.replace(kept, deltas)
+    if meta.get('revisions'):
+        new_meta = partition_store.read_metadata(store_root, year_month)
+        new_meta['revisions'] = meta['revisions']
+        path = os.path.join(directory, partition_store.METADATA_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(new_meta, f, indent=2, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+    return meta['rows']
+
+
+def summary(store_root):
+    """Tamanho dos dicionários e linhas das partições codificadas"""
+    pools = open_pools(store_root)
+    periods = partition_store.list_periods(store_root)
+    rows = 0
+    for year_month in periods:
+        meta = partition_store.read_metadata(store_root, year_month)
+        if meta.get('string_pools'):
+            rows += meta['rows']
+    return {
+        'pools': {name: {'strings': len(pool), 'bytes': pool.text_bytes()}
+                  for name, pool in pools.items()},
+        'periods': len(periods),
+        'encoded_rows': rows,
+    }
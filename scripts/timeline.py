@@ -0,0 +1,300 @@
+"""
+Linha do tempo dos pagamentos por beneficiário
+
+Agrupa os pagamentos de todas as partições do armazenamento por beneficiário
+(CPF mascarado + nome) em um registro por estudante:
+
+    <raiz>/
+      beneficiarios.csv   chave, CPF, nome, UF e município da 1ª aparição,
+                          quantidade de pagamentos e total
+      chaves.npy          chave (hash de 64 bits) de cada beneficiário, crescente
+      inicios.npy         posição do 1º pagamento de cada beneficiário (n + 1)
+      pagamentos.npy      (periodo, etapa, incentivo, centavos, data) em ordem
+                          de beneficiário e, dentro dele, de período
+      _metadata.json
+
+O agrupamento é uma ordenação externa por hash com memória limitada: os
+chunks lidos são distribuídos em baldes por faixa de chave (bits mais altos
+do hash), com tamanho calculado pelo orçamento de memória do chunking; cada
+balde é ordenado em memória (np.lexsort) e gravado em sequência. Como os
+baldes cobrem faixas consecutivas, a saída sai ordenada pela chave sem merge.
+"""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import chunking
+import config
+import csv_writer
+import partition_store
+import validation
+
+PAYMENT_DTYPE = np.dtype([
+    ('periodo', '<i4'), ('etapa', 'i1'), ('incentivo', 'i1'), ('centavos', '<i4'), ('data', '<i4'),
+])
+RECORD_DTYPE = np.dtype([('chave', '<u8')] + PAYMENT_DTYPE.descr)
+
+IDENTITY_COLUMNS = ['CPF do Beneficiário', 'Beneficiário', 'UF', 'Município']
+SOURCE_COLUMNS = IDENTITY_COLUMNS + ['Valor Disponibilizado', 'Código Etapa Ensino',
+                                    'Código Tipo Incentivo', 'Data do Pagamento']
+BENEFICIARY_COLUMNS = ['chave'] + IDENTITY_COLUMNS + ['pagamentos', 'total']
+
+INCENTIVES = {1: 'matrícula', 2: 'frequência', 3: 'conclusão', 4: 'ENEM'}
+
+# Memória do balde em relação aos dados: registros + índices do lexsort + cópia ordenada
+SORT_FACTOR = 4
+# Dois arquivos abertos por balde na distribuição
+MAX_BUCKET_BITS = 8
+
+BENEFICIARIES_FILE = 'beneficiarios.csv'
+KEYS_FILE = 'chaves.npy'
+OFFSETS_FILE = 'inicios.npy'
+PAYMENTS_FILE = 'pagamentos.npy'
+METADATA_FILE = '_metadata.json'
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def default_root():
+    return config.data_path("pe_de_meia_linha_do_tempo")
+
+
+def beneficiary_keys(cpfs, names):
+    """Chave de 64 bits de (CPF mascarado, nome); mesma função na escrita e na busca"""
+    cpfs = np.asarray(cpfs, dtype=object)
+    names = np.asarray(names, dtype=object)
+    return pd.util.hash_array(cpfs) ^ (pd.util.hash_array(names) * _MIX)
+
+
+def _small_codes(series):
+    """'2' -> 2 (int8; -1 se vazio ou não numérico), calculado por valor distinto"""
+    codes, uniques = pd.factorize(series)
+    values = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce')
+    values = values.where((values >= -1) & (values <= 127)).fillna(-1).to_numpy(dtype=np.int8)
+    return np.append(values, np.int8(-1))[codes]
+
+
+def bucket_bits(rows, budget_mb=None):
+    """Bits de hash por balde para que cada um caiba no orçamento de memória"""
+    budget_bytes = (budget_mb or chunking.budget_mb()) * 1024 * 1024
+    buckets = rows * RECORD_DTYPE.itemsize * SORT_FACTOR / budget_bytes
+    bits = 0
+    while (1 << bits) < buckets and bits < MAX_BUCKET_BITS:
+        bits += 1
+    return bits
+
+
+def _bucket_of(keys, bits):
+    if bits == 0:
+        return np.zeros(len(keys), dtype=np.int64)
+    return (keys >> np.uint64(64 - bits)).astype(np.int64)
+
+
+def _records(chunk, year_month):
+    """Registros binários (chave + pagamento) de um chunk de uma partição"""
+    records = np.empty(len(chunk), dtype=RECORD_DTYPE)
+    records['chave'] = beneficiary_keys(chunk['CPF do Beneficiário'].to_numpy(object, na_value=''),
+                                        chunk['Beneficiário'].to_numpy(object, na_value=''))
+    records['periodo'] = int(year_month)
+    records['centavos'] = np.nan_to_num(
+        np.rint(validation.parse_amounts(chunk['Valor Disponibilizado']) * 100))
+    for field, column in (('etapa', 'Código Etapa Ensino'),
+                          ('incentivo', 'Código Tipo Incentivo')):
+        records[field] = _small_codes(chunk[column]) if column in chunk else -1
+    records['data'] = (validation.parse_dates(chunk['Data do Pagamento'])
+                       if 'Data do Pagamento' in chunk else 0)
+    return records
+
+
+def _distribute(store_root, periods, work_dir, bits, stats):
+    """Fase 1: lê as partições e espalha registros e identidades nos baldes"""
+    buckets = 1 << bits
+    # Arquivos com o buffer padrão: um buffer grande por balde estouraria o orçamento
+    record_files = [open(os.path.join(work_dir, f"registros_{b:04d}.bin"), 'wb')
+                    for b in range(buckets)]
+    identity_files = [open(os.path.join(work_dir, f"identidades_{b:04d}.csv"), 'w',
+                           encoding='utf-8', newline='') for b in range(buckets)]
+    header = csv_writer.format_header(['chave'] + IDENTITY_COLUMNS)
+    try:
+        for f in identity_files:
+            f.write(header)
+        for year_month in periods:
+            for chunk in partition_store.read_chunks(store_root, year_month, SOURCE_COLUMNS,
+                                                     stats=stats):
+                records = _records(chunk, year_month)
+                bucket = _bucket_of(records['chave'], bits)
+                order = np.argsort(bucket, kind='stable')
+                bounds = np.searchsorted(bucket[order], np.arange(buckets + 1))
+
+                # Identidade: só a 1ª linha de cada chave no chunk
+                first = ~pd.Series(records['chave']).duplicated().to_numpy()
+                identities = chunk.loc[first, IDENTITY_COLUMNS]
+                identities.insert(0, 'chave', records['chave'][first].astype(str))
+                identity_order = np.argsort(bucket[first], kind='stable')
+                identity_bounds = np.searchsorted(bucket[first][identity_order],
+                                                  np.arange(buckets + 1))
+
+                for b in np.flatnonzero(np.diff(bounds)):
+                    record_files[b].write(records[order[bounds[b]:bounds[b + 1]]].tobytes())
+                    rows = identity_order[identity_bounds[b]:identity_bounds[b + 1]]
+                    identity_files[b].write(csv_writer.format_rows(identities.iloc[rows]))
+    finally:
+        for f in record_files + identity_files:
+            f.close()
+
+
+def _format_cents(cents):
+    cents = pd.Series(cents, dtype='int64')
+    return (cents // 100).astype(str) + ',' + (cents % 100).astype(str).str.zfill(2)
+
+
+def build(store_root=None, output_root=None, periods=None, log=None):
+    """
+    Constrói a linha do tempo a partir do armazenamento particionado.
+    Retorna o resumo gravado em _metadata.json.
+    """
+    store_root = store_root or partition_store.default_root()
+    output_root = output_root or default_root()
+    periods = periods if periods is not None else partition_store.list_periods(store_root)
+    total_rows = sum(partition_store.read_metadata(store_root, ym)['rows'] for ym in periods)
+    bits = bucket_bits(total_rows)
+    if log:
+        log(f"Linha do tempo: {total_rows:,} pagamentos de {len(periods)} período(s) "
+            f"em {1 << bits} balde(s)")
+
+    tmp_root = output_root + '.tmp'
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    os.makedirs(tmp_root)
+    work_dir = tempfile.mkdtemp(prefix='baldes_', dir=tmp_root)
+    read_stats = {}
+
+    try:
+        _distribute(store_root, periods, work_dir, bits, read_stats)
+
+        # Fase 2: ordenar cada balde e gravar em sequência
+        payment_count = sum(os.path.getsize(os.path.join(work_dir, f"registros_{b:04d}.bin"))
+                            for b in range(1 << bits)) // RECORD_DTYPE.itemsize
+        payments = np.lib.format.open_memmap(os.path.join(tmp_root, PAYMENTS_FILE), mode='w+',
+                                             dtype=PAYMENT_DTYPE, shape=(payment_count,))
+        keys_path = os.path.join(work_dir, 'chaves.bin')
+        offsets_path = os.path.join(work_dir, 'inicios.bin')
+        position = 0
+        beneficiaries = 0
+        with csv_writer.CsvWriter(os.path.join(tmp_root, BENEFICIARIES_FILE),
+                                  columns=BENEFICIARY_COLUMNS) as writer, \
+                open(keys_path, 'wb') as keys_file, open(offsets_path, 'wb') as offsets_file:
+            for b in range(1 << bits):
+                records_path = os.path.join(work_dir, f"registros_{b:04d}.bin")
+                records = np.fromfile(records_path, dtype=RECORD_DTYPE)
+                os.remove(records_path)
+                if not len(records):
+                    continue
+                records = records[np.lexsort((records['data'], records['periodo'],
+                                              records['chave']))]
+                keys, starts, counts = np.unique(records['chave'], return_index=True,
+                                                 return_counts=True)
+                totals = np.add.reduceat(records['centavos'].astype(np.int64), starts)
+
+                identities = pd.read_csv(os.path.join(work_dir, f"identidades_{b:04d}.csv"),
+                                         sep=';', dtype=str, keep_default_na=False)
+                identities.index = identities.pop('chave').astype('uint64')
+                identities = identities[~identities.index.duplicated()].reindex(keys)
+
+                block = identities.reset_index(drop=True)
+                block.insert(0, 'chave', pd.Series(keys).map('{:016x}'.format))
+                block['pagamentos'] = counts
+                block['total'] = _format_cents(totals)
+                writer.write(block)
+
+                payments[position:position + len(records)] = \
+                    records[list(PAYMENT_DTYPE.names)].astype(PAYMENT_DTYPE)
+                keys_file.write(keys.tobytes())
+                offsets_file.write((starts + position).astype(np.int64).tobytes())
+                position += len(records)
+                beneficiaries += len(keys)
+        payments.flush()
+        del payments
+
+        np.save(os.path.join(tmp_root, KEYS_FILE), np.fromfile(keys_path, dtype=np.uint64))
+        offsets = np.append(np.fromfile(offsets_path, dtype=np.int64), np.int64(position))
+        np.save(os.path.join(tmp_root, OFFSETS_FILE), offsets)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    meta = {
+        'periods': list(periods),
+        'payments': int(position),
+        'beneficiaries': int(beneficiaries),
+        'buckets': 1 << bits,
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    with open(os.path.join(tmp_root, METADATA_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    shutil.rmtree(output_root, ignore_errors=True)
+    os.replace(tmp_root, output_root)
+
+    if log:
+        log(f"Linha do tempo: {beneficiaries:,} beneficiários, {position:,} pagamentos "
+            f"- {chunking.describe(read_stats)}")
+    return meta
+
+
+def read_metadata(root):
+    with open(os.path.join(root, METADATA_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def payments_of(root, index):
+    """Pagamentos do beneficiário na posição `index` (leitura via memmap)"""
+    offsets = np.load(os.path.join(root, OFFSETS_FILE), mmap_mode='r')
+    payments = np.load(os.path.join(root, PAYMENTS_FILE), mmap_mode='r')
+    return np.array(payments[offsets[index]:offsets[index + 1]])
+
+
+def lookup(root, cpf, name):
+    """
+    Posição do beneficiário com CPF mascarado e nome exatos (busca binária
+    nas chaves), ou None
+    """
+    keys = np.load(os.path.join(root, KEYS_FILE), mmap_mode='r')
+    key = beneficiary_keys([cpf], [name])[0]
+    index = int(np.searchsorted(keys, key))
+    if index < len(keys) and keys[index] == key:
+        return index
+    return None
+
+
+def find(root, cpf=None, name=None, limit=20):
+    """
+    Beneficiários pelo CPF mascarado exato e/ou trecho do nome, varrendo
+    beneficiarios.csv: lista de (posição, linha como dict)
+    """
+    matches = []
+    needle = name.upper() if name else None
+    with open(os.path.join(root, BENEFICIARIES_FILE), 'r', encoding='utf-8', newline='') as f:
+        for index, row in enumerate(csv.DictReader(f, delimiter=';')):
+            if cpf and row['CPF do Beneficiário'] != cpf:
+                continue
+            if needle and needle not in row['Beneficiário'].upper():
+                continue
+            matches.append((index, row))
+            if len(matches) >= limit:
+                break
+    return matches
+
+
+def describe_payment(payment):
+    """Linha legível de um pagamento"""
+    period = f"{payment['periodo'] % 100:02d}/{payment['periodo'] // 100}"
+    incentive = INCENTIVES.get(int(payment['incentivo']), str(payment['incentivo']))
+    value = f"{payment['centavos'] // 100},{payment['centavos'] % 100:02d}"
+    date = payment['data']
+    paid = f"{date % 100:02d}/{date // 100 % 100:02d}/{date // 10000}" if date else '-'
+    return f"{period}  {incentive:<11} etapa {payment['etapa']}  R$ {value:>8}  pago em {paid}"
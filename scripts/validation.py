@@ -0,0 +1,322 @@
+"""
+Validação vetorizada das linhas dos arquivos do Portal
+
+Cada verificação produz uma máscara NumPy para o chunk inteiro (nada de
+laço por linha em Python):
+
+  UF          UF fora das 27 unidades da federação
+  SIAFI       código de município fora do formato (4 dígitos) ou ausente da
+              tabela de municípios, quando fornecida
+  SIAFI_UF    município da tabela pertence a outra UF
+  VALOR       valor ausente ou não numérico
+  VALOR_FAIXA valor fora da faixa esperada
+  CPF         CPF fora do padrão mascarado do Portal (***.000.000-**)
+  DATA        data de pagamento fora do formato DD/MM/AAAA ou inexistente
+  NOME        beneficiário vazio
+
+Formatos fixos (CPF, data, código SIAFI) são verificados sobre a matriz de
+caracteres das strings; valor, data e município são verificados uma vez por
+valor distinto do chunk. As linhas rejeitadas seguem para um arquivo à parte
+com os códigos dos motivos (ex.: "UF|CPF").
+"""
+
+import numpy as np
+import pandas as pd
+
+UFS = frozenset([
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO',
+])
+
+REASONS = ['UF', 'SIAFI', 'SIAFI_UF', 'VALOR', 'VALOR_FAIXA', 'CPF', 'DATA', 'NOME']
+_BITS = {code: np.uint16(1 << i) for i, code in enumerate(REASONS)}
+
+# Parcelas do programa: R$ 200 (matrícula, frequência, ENEM) e R$ 1.000 (conclusão)
+VALUE_MIN = 1.0
+VALUE_MAX = 3000.0
+YEAR_MIN = 2023
+YEAR_MAX = 2100
+
+# Campo validado -> coluna canônica do Portal (schema_registry)
+FIELD_SOURCES = {
+    'uf': 'UF',
+    'siafi': 'CÓDIGO MUNICÍPIO SIAFI',
+    'nome': 'NOME BENEFICIÁRIO',
+    'cpf': 'CPF BENEFICIÁRIO',
+    'data': 'DATA DO PAGAMENTO',
+    'valor': 'VALOR PARCELA',
+}
+
+# Arquivo de rejeitados: período, motivos e as colunas de origem (nomes canônicos)
+REJECT_SOURCES = [
+    'UF', 'CÓDIGO MUNICÍPIO SIAFI', 'NOME MUNICÍPIO', 'NOME BENEFICIÁRIO', 'CPF BENEFICIÁRIO',
+    'NOME RESPONSÁVEL', 'DATA DO PAGAMENTO', 'VALOR PARCELA',
+]
+REJECT_COLUMNS = ['periodo', 'motivos'] + REJECT_SOURCES
+
+_ZERO, _NINE = ord('0'), ord('9')
+
+_enabled = True
+_municipios_path = None
+_municipios = None
+
+
+def configure(enabled=True, municipios_path=None):
+    """Liga/desliga a validação e define a tabela de municípios (opcional)"""
+    global _enabled, _municipios_path, _municipios
+    _enabled = enabled
+    _municipios_path = municipios_path
+    _municipios = load_municipios(municipios_path) if enabled and municipios_path else None
+
+
+def settings():
+    """(habilitada, tabela de municípios) para repassar aos processos do pool"""
+    return _enabled, _municipios_path
+
+
+def is_enabled():
+    return _enabled
+
+
+def municipios():
+    return _municipios
+
+
+def fields_from_schema(schema):
+    """Campo validado -> coluna do arquivo, para as colunas presentes no esquema"""
+    file_columns = {canonical: column for column, canonical in schema['rename'].items()}
+    return {field: file_columns[source] for field, source in FIELD_SOURCES.items()
+            if source in file_columns}
+
+
+def load_municipios(path):
+    """
+    Tabela de municípios (CSV com código SIAFI e UF nas duas primeiras
+    colunas, ';' ou ','). Retorna uma Series UF indexada pelo código.
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        sep = ';' if ';' in f.readline() else ','
+    table = pd.read_csv(path, sep=sep, dtype=str, usecols=[0, 1], encoding='utf-8-sig')
+    table.columns = ['codigo', 'uf']
+    table['codigo'] = table['codigo'].str.strip().str.zfill(4)
+    return table.drop_duplicates('codigo').set_index('codigo')['uf'].str.strip().str.upper()
+
+
+def _values(series):
+    return series.to_numpy(dtype=object, na_value='')
+
+
+def _per_unique(series, check):
+    """
+    Aplica `check` só aos valores distintos (valor, data e município se
+    repetem muito em um mês) e expande o resultado para todas as linhas
+    """
+    codes, uniques = pd.factorize(series)
+    result = check(np.append(np.asarray(uniques, dtype=object), ''))
+    return result[codes]  # código -1 (ausente) aponta para o '' acrescentado
+
+
+def _chars(values, width):
+    """Matriz (linhas x width) com os códigos dos caracteres (0 = fim da string)"""
+    return np.asarray(values, dtype=f'U{width}').view(np.uint32).reshape(len(values), width)
+
+
+def _is_digit(column):
+    return (column >= _ZERO) & (column <= _NINE)
+
+
+def _number(chars, start, end):
+    result = np.zeros(len(chars), dtype=np.int32)
+    for i in range(start, end):
+        result = result * 10 + (chars[:, i].astype(np.int32) - _ZERO)
+    return result
+
+
+def check_masked_cpf(values):
+    """***.000.000-** (14 caracteres)"""
+    c = _chars(values, 15)
+    ok = c[:, 14] == 0
+    for i in (0, 1, 2, 12, 13):
+        ok &= c[:, i] == ord('*')
+    ok &= (c[:, 3] == ord('.')) & (c[:, 7] == ord('.')) & (c[:, 11] == ord('-'))
+    for i in (4, 5, 6, 8, 9, 10):
+        ok &= _is_digit(c[:, i])
+    return ok
+
+
+def _date_fields(values):
+    """(máscara de validade, dia, mês, ano) de datas DD/MM/AAAA"""
+    c = _chars(values, 11)
+    ok = (c[:, 10] == 0) & (c[:, 2] == ord('/')) & (c[:, 5] == ord('/'))
+    for i in (0, 1, 3, 4, 6, 7, 8, 9):
+        ok &= _is_digit(c[:, i])
+    day, month, year = _number(c, 0, 2), _number(c, 3, 5), _number(c, 6, 10)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int32)
+    last_day = month_days[np.clip(month, 0, 12)] + ((month == 2) & leap)
+    ok &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= last_day)
+    ok &= (year >= YEAR_MIN) & (year <= YEAR_MAX)
+    return ok, day, month, year
+
+
+def check_date(values):
+    """DD/MM/AAAA com dia existente no mês"""
+    return _date_fields(values)[0]
+
+
+def date_number(values):
+    """DD/MM/AAAA -> AAAAMMDD (int32; 0 se inválida)"""
+    ok, day, month, year = _date_fields(values)
+    return np.where(ok, year * 10000 + month * 100 + day, 0).astype(np.int32)
+
+
+def check_siafi(values):
+    """Quatro dígitos"""
+    c = _chars(values, 5)
+    ok = c[:, 4] == 0
+    for i in range(4):
+        ok &= _is_digit(c[:, i])
+    return ok
+
+
+def parse_value(values, width=14):
+    """
+    '1.000,00' -> 1000.0 (NaN se não numérico), coluna a coluna sobre a
+    matriz de caracteres: dígitos, '.' de milhar e no máximo uma vírgula
+    """
+    c = _chars(values, width).astype(np.int64)
+    digit = _is_digit(c)
+    comma = c == ord(',')
+    ok = (c[:, -1] == 0) & (comma.sum(axis=1) <= 1) & digit.any(axis=1)
+    ok &= (digit | comma | (c == ord('.')) | (c == 0)).all(axis=1)
+
+    in_fraction = digit & (np.cumsum(comma, axis=1) > 0)
+    in_integer = digit & ~in_fraction
+    d = np.where(digit, c - _ZERO, 0)
+    integer = np.zeros(len(c), dtype=np.int64)
+    fraction = np.zeros(len(c), dtype=np.int64)
+    for i in range(width - 1):
+        integer = np.where(in_integer[:, i], integer * 10 + d[:, i], integer)
+        fraction = np.where(in_fraction[:, i], fraction * 10 + d[:, i], fraction)
+    scale = 10.0 ** in_fraction.sum(axis=1)
+    return np.where(ok, integer + fraction / scale, np.nan)
+
+
+def parse_amounts(series):
+    """Valores no formato do Portal ('200,00') como float (NaN se inválidos)"""
+    return _per_unique(series, parse_value)
+
+
+def parse_dates(series):
+    """Datas DD/MM/AAAA como int32 AAAAMMDD (0 se inválidas)"""
+    return _per_unique(series, date_number)
+
+
+def blank(values):
+    """Strings vazias ou só com espaços (strip apenas onde o 1º caractere é espaço)"""
+    first = _chars(values, 1)[:, 0]
+    result = first == 0
+    spaced = np.flatnonzero(first == ord(' '))
+    if len(spaced):
+        result[spaced] = np.char.strip(np.asarray(values[spaced], dtype=str)) == ''
+    return result
+
+
+def validate(chunk, fields, municipios=None, value_min=VALUE_MIN, value_max=VALUE_MAX):
+    """
+    Valida um chunk. `fields` mapeia campo ('uf', 'siafi', 'nome', 'cpf',
+    'data', 'valor') -> coluna do chunk; campos ausentes não são verificados.
+    Retorna (máscara das linhas válidas, bitmask dos motivos por linha).
+    """
+    n = len(chunk)
+    flags = np.zeros(n, dtype=np.uint16)
+
+    def flag(code, bad):
+        flags[bad] |= _BITS[code]
+
+    if 'uf' in fields:
+        uf = chunk[fields['uf']]
+        flag('UF', ~uf.isin(UFS).to_numpy())
+
+    if 'siafi' in fields:
+        siafi = chunk[fields['siafi']]
+        flag('SIAFI', ~_per_unique(siafi, check_siafi))
+        if municipios is not None:
+            expected_uf = siafi.map(municipios)
+            flag('SIAFI', expected_uf.isna().to_numpy())
+            if 'uf' in fields:
+                flag('SIAFI_UF', (expected_uf.notna() & (expected_uf != chunk[fields['uf']]))
+                     .to_numpy(dtype=bool, na_value=False))
+
+    if 'valor' in fields:
+        value = parse_amounts(chunk[fields['valor']])
+        missing = np.isnan(value)
+        flag('VALOR', missing)
+        flag('VALOR_FAIXA', ~missing & ((value < value_min) | (value > value_max)))
+
+    if 'cpf' in fields:
+        flag('CPF', ~check_masked_cpf(_values(chunk[fields['cpf']])))
+
+    if 'data' in fields:
+        flag('DATA', ~_per_unique(chunk[fields['data']], check_date))
+
+    if 'nome' in fields:
+        flag('NOME', blank(_values(chunk[fields['nome']])))
+
+    return flags == 0, flags
+
+
+def reason_labels(flags):
+    """Bitmask -> 'UF|CPF' (calculado uma vez por combinação distinta)"""
+    unique, inverse = np.unique(flags, return_inverse=True)
+    labels = np.array(['|'.join(code for code in REASONS if mask & _BITS[code])
+                       for mask in unique], dtype=object)
+    return labels[inverse]
+
+
+def count_reasons(flags):
+    """Quantidade de linhas por motivo"""
+    return {code: int(np.count_nonzero(flags & _BITS[code])) for code in REASONS
+            if np.any(flags & _BITS[code])}
+
+
+def new_summary():
+    return {'checked': 0, 'rejected': 0, 'reasons': {}}
+
+
+def update_summary(summary, flags):
+    """Acumula um chunk (ou o resumo de outro processo, se for dict)"""
+    if isinstance(flags, dict):
+        summary['checked'] += flags['checked']
+        summary['rejected'] += flags['rejected']
+        counts = flags['reasons']
+    else:
+        summary['checked'] += len(flags)
+        summary['rejected'] += int(np.count_nonzero(flags))
+        counts = count_reasons(flags)
+    for code, count in counts.items():
+        summary['reasons'][code] = summary['reasons'].get(code, 0) + count
+    return summary
+
+
+def reject_frame(chunk, flags, period, rename):
+    """
+    Linhas rejeitadas no layout REJECT_COLUMNS; `rename` mapeia coluna do
+    arquivo -> nome canônico (colunas não lidas ficam vazias)
+    """
+    rejected = pd.DataFrame(index=chunk.index)
+    rejected['periodo'] = period
+    rejected['motivos'] = reason_labels(flags)
+    sources = {canonical: column for column, canonical in rename.items() if column in chunk}
+    for column in REJECT_SOURCES:
+        rejected[column] = chunk[sources[column]] if column in sources else ''
+    return rejected
+
+
+def describe(summary):
+    if not summary['rejected']:
+        return f"{summary['checked']:,} registros verificados, nenhum rejeitado"
+    reasons = ", ".join(f"{code}={summary['reasons'][code]:,}" for code in REASONS
+                        if code in summary['reasons'])
+    return (f"{summary['rejected']:,} de {summary['checked']:,} registros rejeitados "
+            f"({reasons})")